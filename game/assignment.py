@@ -0,0 +1,249 @@
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+
+from .models import Player
+from .quote_pool import quote_pool
+
+logger = logging.getLogger(__name__)
+
+PART_INDEX = {"A": 0, "B": 1}
+OTHER_PART = {"A": "B", "B": "A"}
+
+
+class AssignmentEngine:
+    """
+    Hands out quote halves so that every registered half has a reachable partner.
+
+    For every quote we keep how many A and B halves are out. A quote whose
+    counts differ has an "open" half waiting for a partner; those are filled
+    first, oldest first, from a deque. When nothing is open, a new half is
+    opened on the quote with the fewest halves out, taken from a min-heap keyed
+    by max(a, b). Both paths are O(1)/O(log n) and work on the in-memory
+    counts only.
+
+    Heap and deque entries are validated lazily against the counts when they
+    are popped, so release() and reloads never have to search them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._open = deque()
+        self._heap = []
+
+    def load(self, quote_ids, assigned=()):
+        """
+        Reset the engine to a catalogue and the halves already handed out.
+        `assigned` is an iterable of (quote_id, part, count) rows.
+        """
+        counts = {quote_id: [0, 0] for quote_id in quote_ids}
+        for quote_id, part, count in assigned:
+            if quote_id in counts and part in PART_INDEX:
+                counts[quote_id][PART_INDEX[part]] += count
+
+        open_halves = deque()
+        for quote_id, (a, b) in counts.items():
+            if a != b:
+                missing = "B" if a > b else "A"
+                open_halves.extend([(quote_id, missing)] * abs(a - b))
+
+        heap = [(max(c), quote_id) for quote_id, c in counts.items()]
+        heapq.heapify(heap)
+
+        with self._lock:
+            self._counts = counts
+            self._open = open_halves
+            self._heap = heap
+
+    def assign(self):
+        """Return (quote_id, part) for the next registration, or None without quotes."""
+        with self._lock:
+            counts = self._counts
+
+            # 1. Complete a quote that already has a half waiting.
+            while self._open:
+                quote_id, part = self._open.popleft()
+                c = counts.get(quote_id)
+                if c is None:
+                    continue
+                i = PART_INDEX[part]
+                if c[i] < c[1 - i]:
+                    c[i] += 1
+                    return quote_id, part
+
+            # 2. Open a half on the least used quote.
+            while self._heap:
+                load, quote_id = heapq.heappop(self._heap)
+                c = counts.get(quote_id)
+                if c is None or max(c) != load:
+                    continue
+                part = "A" if c[0] <= c[1] else "B"
+                i = PART_INDEX[part]
+                c[i] += 1
+                if c[i] > c[1 - i]:
+                    self._open.append((quote_id, OTHER_PART[part]))
+                self._push(quote_id, c)
+                return quote_id, part
+
+            return None
+
+    def snapshot(self):
+        """Copy of the counts, as {quote_id: (a, b)}."""
+        with self._lock:
+            return {quote_id: tuple(c) for quote_id, c in self._counts.items()}
+
+    def add_assigned(self, seen, assigned):
+        """
+        Count halves handed out elsewhere: whatever `assigned` holds beyond
+        `seen`, a snapshot() taken before `assigned` was read. Halves this
+        engine handed out meanwhile, or that are not stored yet, are kept.
+        """
+        totals = {}
+        for quote_id, part, count in assigned:
+            if part in PART_INDEX:
+                totals[quote_id, part] = totals.get((quote_id, part), 0) + count
+
+        with self._lock:
+            for (quote_id, part), count in totals.items():
+                c = self._counts.get(quote_id)
+                i = PART_INDEX[part]
+                extra = count - seen.get(quote_id, (0, 0))[i]
+                if c is None or extra <= 0:
+                    continue
+                c[i] += extra
+                if c[i] > c[1 - i]:
+                    # Entries are validated when popped; surplus ones are skipped.
+                    self._open.extend([(quote_id, OTHER_PART[part])] * min(extra, c[i] - c[1 - i]))
+                self._push(quote_id, c)
+
+    def update_catalogue(self, quote_ids):
+        """Start counting quotes new to the catalogue and forget removed ones, keeping the other counts."""
+        quote_ids = set(quote_ids)
+        with self._lock:
+            for quote_id in self._counts.keys() - quote_ids:
+                del self._counts[quote_id]
+            for quote_id in quote_ids - self._counts.keys():
+                c = self._counts[quote_id] = [0, 0]
+                self._push(quote_id, c)
+
+    def release(self, quote_id, part):
+        """Give back a half that was assigned but never persisted, or whose player was deleted."""
+        with self._lock:
+            c = self._counts.get(quote_id)
+            i = PART_INDEX.get(part)
+            if c is None or i is None or c[i] == 0:
+                return
+            c[i] -= 1
+            if c[i] < c[1 - i]:
+                self._open.appendleft((quote_id, part))
+            self._push(quote_id, c)
+
+    def _push(self, quote_id, c):
+        heapq.heappush(self._heap, (max(c), quote_id))
+        # Stale entries pile up as loads change; rebuild once they dominate.
+        if len(self._heap) > 4 * len(self._counts) + 64:
+            self._heap = [(max(v), k) for k, v in self._counts.items()]
+            heapq.heapify(self._heap)
+
+    def stats(self):
+        with self._lock:
+            halves = paired = 0
+            for a, b in self._counts.values():
+                halves += a + b
+                paired += 2 * min(a, b)
+        return {
+            "halves": halves,
+            "paired_halves": paired,
+            "pairable_rate": paired / halves if halves else 1.0,
+        }
+
+
+class PlayerAssignmentEngine(AssignmentEngine):
+    """
+    AssignmentEngine seeded from the Player table with one GROUP BY query.
+
+    The seed runs once, on the first assignment. After that the counts move
+    with this process's registrations, with Player deletions (see
+    game/signals.py) and with the quote pool's catalogue, none of which read
+    Player. Halves handed out by other worker processes are added by a
+    re-sync every GAME_ASSIGNMENT_RESYNC_SECONDS, run in a background thread
+    so registrations keep assigning from the current counts meanwhile. The
+    re-sync only adds what Player holds beyond the counts it started from:
+    replacing the counts would drop the halves handed out during the read,
+    and those not committed yet, and hand the same open half out twice.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._sync_lock = threading.Lock()
+        self._loaded_at = None
+        self._pool_generation = None
+        self._resyncing = False
+
+    def assigned(self):
+        return (
+            Player.objects.using("default")
+            .values_list("quote_id", "quote_part")
+            .annotate(n=Count("id"))
+            .order_by()
+        )
+
+    def sync(self):
+        pool_generation = quote_pool.generation()
+        quote_ids = [row[0] for row in quote_pool.all()]
+        self.load(quote_ids, self.assigned())
+        self._pool_generation = pool_generation
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Re-seed from Player on the next assignment."""
+        self._loaded_at = None
+
+    def resync(self):
+        seen = self.snapshot()
+        self.add_assigned(seen, list(self.assigned()))
+        self._loaded_at = time.monotonic()
+
+    def _resync(self):
+        try:
+            self.resync()
+        except Exception:
+            logger.exception("Re-syncing the assignment engine failed; keeping the current counts")
+            self._loaded_at = time.monotonic()
+        finally:
+            self._resyncing = False
+            connection.close()
+
+    def _resync_in_background(self):
+        with self._sync_lock:
+            if self._resyncing:
+                return
+            self._resyncing = True
+        threading.Thread(target=self._resync, name="assignment-resync", daemon=True).start()
+
+    def assign(self):
+        if self._loaded_at is None:
+            # One thread seeds; the others must not reset the counts again
+            # with a read taken before that thread's halves were handed out.
+            with self._sync_lock:
+                if self._loaded_at is None:
+                    self.sync()
+        else:
+            generation = quote_pool.generation()
+            if generation != self._pool_generation:
+                self._pool_generation = generation
+                self.update_catalogue(row[0] for row in quote_pool.all())
+            resync = getattr(settings, "GAME_ASSIGNMENT_RESYNC_SECONDS", 30)
+            if time.monotonic() - self._loaded_at > resync:
+                self._resync_in_background()
+        return super().assign()
+
+
+assignment_engine = PlayerAssignmentEngine()
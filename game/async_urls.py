@@ -0,0 +1,12 @@
+from django.urls import path
+from .async_views import get_active_flips, get_quote_part, group_points, verify_quote_pair
+
+app_name = 'async'
+
+# Same url names as game/urls.py, so GAME_REPLICA_READ_VIEWS applies to both
+urlpatterns = [
+    path('get-quote-part', get_quote_part, name='get-quote-part'),
+    path('verify-quote-pair', verify_quote_pair, name='verify-quote-pair'),
+    path('active-flips', get_active_flips, name='active-flips'),
+    path('group-points', group_points, name='group-points'),
+]
@@ -0,0 +1,116 @@
+"""
+Async versions of the hot read endpoints and verify-quote-pair, mounted
+under game/async/ (see game/async_urls.py).
+
+Under an ASGI server sync views each hold a worker thread for the whole
+request; these run on the event loop and only leave it for the database
+(async ORM) or for the pairing transaction, which Django can only run in
+sync code. Responses are the same as the sync views'.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .idempotency import idempotent
+from .leaderboard import leaderboard
+from .models import GridFlipLog, Player
+from .payloads import quote_part_body
+from .quote_cache import quote_part_cache
+from .quote_pool import quote_pool
+from .ratelimit import rate_limited
+from .views import (
+    ACTIVE_FLIPS_PAGE_SIZE, pair_diaries, pair_key, pair_players, quote_part_diaries, request_data,
+)
+
+
+@rate_limited("get-quote-part", quote_part_diaries)
+@require_GET
+async def get_quote_part(request):
+    diary_number = request.GET.get("diary_number")
+
+    if not diary_number:
+        return JsonResponse({"error": "Missing diary_number"}, status=400)
+
+    async def load():
+        # Cached for every later request, so not built from a replica (see views.get_quote_part)
+        player = await (
+            Player.objects.using("default").filter(diary_id=diary_number).values_list("quote_id", "quote_part").afirst()
+        )
+        if player is None:
+            return None
+
+        quote_id, part_type = player
+        return quote_part_body(diary_number, await quote_pool.apayload(quote_id), part_type)
+
+    body = await quote_part_cache.aget_or_load(diary_number, load)
+    if body is None:
+        return JsonResponse({"error": "Player not found"}, status=404)
+
+    return HttpResponse(body, content_type="application/json")
+
+
+@require_GET
+async def get_active_flips(request):
+    since = request.GET.get("since")
+    if since is None:
+        flips = [flip async for flip in GridFlipLog.objects.filter(is_status=True).values()]
+        return JsonResponse(flips, safe=False)
+
+    if not since.isdigit():
+        return JsonResponse({"error": "since must be a non-negative integer"}, status=400)
+
+    cursor = int(since)
+    flips = [
+        flip async for flip in
+        GridFlipLog.objects.filter(version__gt=cursor).order_by("version").values()[:ACTIVE_FLIPS_PAGE_SIZE]
+    ]
+    if flips:
+        cursor = flips[-1]["version"]
+
+    return JsonResponse({"flips": flips, "cursor": cursor})
+
+
+@require_GET
+async def group_points(request):
+    etag = await leaderboard.aetag()
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponse(status=304)
+        response["ETag"] = etag
+        return response
+
+    group_name = request.GET.get("group")
+    top = request.GET.get("top")
+
+    if group_name:
+        standing = await leaderboard.arank(group_name)
+        if standing is None:
+            return JsonResponse({"error": "Group not found."}, status=404)
+        points, rank = standing
+        data = {"name": group_name, "points": points, "rank": rank}
+    elif top:
+        if not top.isdigit():
+            return JsonResponse({"error": "top must be a positive integer."}, status=400)
+        data = await leaderboard.atop(int(top))
+    else:
+        data = await leaderboard.aall()
+
+    response = JsonResponse(data, safe=False)
+    response["ETag"] = etag
+    return response
+
+
+@csrf_exempt
+@rate_limited("verify-quote-pair", pair_diaries)
+@idempotent(pair_key)
+@require_POST
+async def verify_quote_pair(request):
+    data = request_data(request)
+    if data is None:
+        return JsonResponse({"error": "Invalid JSON body."}, status=400)
+
+    # The claim transaction is sync-only in Django; it runs in the thread-sensitive worker
+    body, code = await sync_to_async(pair_players)(
+        data.get("diary_id_1"), data.get("diary_id_2"), sender=verify_quote_pair
+    )
+    return JsonResponse(body, status=code)
@@ -0,0 +1,54 @@
+"""
+Shared helpers for the bench_* management commands.
+
+Benchmarks that need rows run against a throwaway test database created from
+the configured one, so they can be pointed at a real PostgreSQL server
+without touching its data.
+"""
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test import Client
+
+
+@contextmanager
+def scratch_database(using="default", keepdb=False):
+    connection = connections[using]
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def bench_client():
+    """A test Client that passes ALLOWED_HOSTS outside the test runner."""
+    return Client(SERVER_NAME="localhost")
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    return {
+        "n": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import threading
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .leaderboard import leaderboard
+from .models import GridFlipLog
+
+KEEPALIVE_SECONDS = 15
+QUEUE_SIZE = 256
+
+
+def encode_event(event, data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return f"event: {event}\ndata: {body}\n\n".encode()
+
+
+class Subscription:
+    __slots__ = ("loop", "queue")
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+
+class EventBroadcaster:
+    """
+    Fans Server-Sent Events out to every open /events connection of this process.
+
+    Each event is encoded once. Publishing from a sync view thread costs one
+    call_soon_threadsafe per event loop, not per connection; the loop then
+    hands the same bytes to every queue. A connection whose queue is full is
+    sent None and closed, and the client reconnects for a fresh snapshot.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # loop -> set of Subscription
+
+    def subscribe(self):
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(subscription.loop, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.loop)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.loop]
+
+    def connections(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, event, data):
+        payload = encode_event(event, data)
+        with self._lock:
+            targets = [(loop, tuple(subscribers)) for loop, subscribers in self._subscribers.items()]
+
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+
+        for loop, subscribers in targets:
+            if loop is current:
+                self._deliver(subscribers, payload)
+            elif not loop.is_closed():
+                loop.call_soon_threadsafe(self._deliver, subscribers, payload)
+
+    def _deliver(self, subscribers, payload):
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                self.unsubscribe(subscription)
+                subscription.queue.get_nowait()
+                subscription.queue.put_nowait(None)
+
+
+broadcaster = EventBroadcaster()
+
+
+def snapshot():
+    return {
+        "flips": list(GridFlipLog.objects.filter(is_status=True).values("flip_number", "player1", "player2")),
+        "groups": leaderboard.all(),
+    }
+
+
+def publish_pairing(flip_number, diary_ids, deltas):
+    broadcaster.publish("flip", {"flip_number": flip_number, "players": list(diary_ids)})
+    if deltas:
+        broadcaster.publish("points", leaderboard.standings(deltas))
+
+
+async def stream_events(subscription, initial):
+    """Body of an /events response: the snapshot, then deltas as they are published."""
+    try:
+        yield initial
+        while True:
+            # Not wait_for: before Python 3.12 it drops a cancel that lands as the get
+            # completes, and the ASGI handler cancels this task to end the stream
+            getter = asyncio.ensure_future(subscription.queue.get())
+            try:
+                done, _ = await asyncio.wait((getter,), timeout=KEEPALIVE_SECONDS)
+            finally:
+                getter.cancel()
+            if not done:
+                yield b": keepalive\n\n"
+                continue
+            payload = getter.result()
+            if payload is None:
+                return
+            yield payload
+    finally:
+        broadcaster.unsubscribe(subscription)
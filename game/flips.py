@@ -0,0 +1,169 @@
+from contextlib import contextmanager
+
+from django.db import connections, transaction
+
+from .models import GridFlipLog, Player
+
+
+VERSION_SEQUENCE = "game_gridfliplog_version_seq"
+# Advisory lock keys: claims hold CLAIM_LOCK shared, hold_claims() exclusively.
+# VERSION_LOCK is held from a transaction's last version draw to its commit.
+CLAIM_LOCK = 0x67726964
+VERSION_LOCK = 0x76657273
+
+
+def _next_version_sql(connection, table):
+    if connection.vendor == "postgresql":
+        return f"nextval('{VERSION_SEQUENCE}')"
+    return f"(SELECT COALESCE(MAX(version), 0) + 1 FROM {table})"
+
+
+def _claim_sql(connection):
+    table = connection.ops.quote_name(GridFlipLog._meta.db_table)
+    # PostgreSQL: concurrent claimers skip rows another transaction is taking
+    # instead of queueing behind it. SQLite runs one writer at a time, so the
+    # plain sub-select is already atomic there. The is_status predicates are
+    # spelled like the partial indexes on GridFlipLog so the planner uses them.
+    skip_locked = " FOR UPDATE SKIP LOCKED" if connection.features.has_select_for_update_skip_locked else ""
+    return (
+        f"UPDATE {table} SET player1 = %s, player2 = %s, is_status = %s, "
+        f"version = {_next_version_sql(connection, table)} "
+        f"WHERE id = (SELECT id FROM {table} WHERE NOT is_status ORDER BY flip_number LIMIT 1{skip_locked}) "
+        f"AND NOT EXISTS (SELECT 1 FROM {table} WHERE is_status AND player1 IN (%s, %s)) "
+        f"AND NOT EXISTS (SELECT 1 FROM {table} WHERE is_status AND player2 IN (%s, %s)) "
+        f"RETURNING flip_number"
+    )
+
+
+def next_versions(count, using="default"):
+    """
+    `count` fresh GridFlipLog versions, ascending, for rows rewritten outside
+    claim_flip_slot(). On PostgreSQL they are drawn under VERSION_LOCK, like
+    stamp_version(), so write the rows and commit promptly.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [VERSION_LOCK])
+            cursor.execute(f"SELECT nextval('{VERSION_SEQUENCE}') FROM generate_series(1, %s)", [count])
+            return sorted(row[0] for row in cursor.fetchall())
+        table = connection.ops.quote_name(GridFlipLog._meta.db_table)
+        cursor.execute(f"SELECT COALESCE(MAX(version), 0) FROM {table}")
+        base = cursor.fetchone()[0]
+    return list(range(base + 1, base + count + 1))
+
+
+def hold_claims(using="default"):
+    """
+    Make claim_flip_slot() wait until the current transaction ends.
+
+    PostgreSQL claims take CLAIM_LOCK shared, so this waits for the claims
+    in flight and keeps new ones out. SQLite has a single writer, so taking
+    the write lock with an empty UPDATE does the same.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [CLAIM_LOCK])
+        else:
+            table = connection.ops.quote_name(GridFlipLog._meta.db_table)
+            cursor.execute(f"UPDATE {table} SET version = version WHERE 0 = 1")
+
+
+def stamp_version(flip_number, using="default"):
+    """
+    Give a slot claimed in this transaction a version in commit order; run it
+    as the transaction's last statement.
+
+    Sequence values are handed out as claims run, not as they commit, so an
+    active-flips poller could see version 8 before version 7 commits and
+    move its cursor past it. On PostgreSQL the slot draws a new value under
+    VERSION_LOCK, which is held until commit, so versions become visible in
+    order. SQLite commits one writer at a time, so there the claim's version
+    already is in order.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+    table = connection.ops.quote_name(GridFlipLog._meta.db_table)
+    with connection.cursor() as cursor:
+        # The lock is joined in, so it is taken before nextval() runs
+        cursor.execute(
+            f"WITH version_lock AS (SELECT pg_advisory_xact_lock(%s)) "
+            f"UPDATE {table} SET version = nextval('{VERSION_SEQUENCE}') FROM version_lock "
+            f"WHERE flip_number = %s AND is_status",
+            [VERSION_LOCK, flip_number],
+        )
+
+
+def find_active_flip(*diary_ids, using="default"):
+    # A UNION of two index searches rather than one OR, which SQLite cannot
+    # serve from the partial player1/player2 indexes.
+    active = GridFlipLog.objects.using(using).filter(is_status=True)
+    flips = active.filter(player1__in=diary_ids).union(active.filter(player2__in=diary_ids))[:1]
+    return next(iter(flips), None)
+
+
+@contextmanager
+def pairing_transaction(diary_id_1, diary_id_2, using="default"):
+    """
+    Open the pairing transaction and yield {diary_id: Player} for both players.
+
+    The players come back in one query, with their quote's digest. On backends with row locks that query
+    also locks both rows (in a fixed order), so two requests involving the
+    same player cannot both claim a slot. SQLite has no row locks and a
+    transaction that reads before it writes cannot upgrade its lock while
+    another writer waits, so there the players are read just before BEGIN.
+    """
+    # The quote digest comes along in the same query for halves_match()
+    players = (
+        Player.objects.using(using)
+        .filter(diary_id__in=[diary_id_1, diary_id_2])
+        .select_related("quote")
+        .only("diary_id", "group_id", "quote_part", "quote__digest")
+    )
+    if connections[using].features.has_select_for_update:
+        with transaction.atomic(using=using):
+            locked = players.select_for_update(of=("self",)).order_by("diary_id")
+            yield {player.diary_id: player for player in locked}
+    else:
+        players = {player.diary_id: player for player in players}
+        with transaction.atomic(using=using):
+            yield players
+
+
+def halves_match(player1, player2):
+    """
+    True when two players fetched by pairing_transaction() hold opposite
+    halves of one quote, or of two catalogue rows with the same digest.
+    """
+    if player1.quote_part == player2.quote_part:
+        return False
+    if player1.quote_id == player2.quote_id:
+        return True
+    digest = player1.quote.digest
+    return bool(digest) and digest == player2.quote.digest
+
+
+def claim_flip_slot(diary_id_1, diary_id_2, using="default"):
+    """
+    Claim the lowest free flip slot for a pair in a single UPDATE ... RETURNING.
+
+    Returns the flip number, or None when no slot is free or either player
+    already holds an active flip. Run it inside pairing_transaction(); it
+    waits while another transaction holds hold_claims(). Finish the
+    transaction with stamp_version().
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT pg_advisory_xact_lock_shared(%s)", [CLAIM_LOCK])
+        cursor.execute(
+            _claim_sql(connection),
+            [
+                diary_id_1, diary_id_2, True,
+                diary_id_1, diary_id_2, diary_id_1, diary_id_2,
+            ],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
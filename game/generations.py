@@ -0,0 +1,31 @@
+"""
+Helpers for the process-level snapshots (leaderboard, quote pool) whose
+generation counters live in the default cache.
+
+With a shared cache (Redis, memcached) a bump in one worker reaches every
+worker. LocMemCache lives inside one process, so bumps made elsewhere
+(another worker, a management command) never arrive; there snapshots are
+also re-checked against the database every GAME_LOCAL_CACHE_RECHECK seconds,
+and values derived from a generation, such as ETags, carry PROCESS_TOKEN so
+two processes at the same generation cannot vouch for each other.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+PROCESS_TOKEN = uuid.uuid4().hex[:8]
+
+
+def cache_is_local():
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def needs_recheck(loaded_at):
+    """True when a snapshot loaded at `loaded_at` (monotonic) cannot rely on the cache to hear of changes."""
+    if loaded_at is None or not cache_is_local():
+        return False
+    return time.monotonic() - loaded_at >= getattr(settings, "GAME_LOCAL_CACHE_RECHECK", 5)
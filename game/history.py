@@ -0,0 +1,211 @@
+"""
+Pairing history: the PairingEvent log, snapshots of it, replay and
+time-windowed stats.
+
+pair_players() appends one PairingEvent per claim in the claiming
+transaction, so the log holds exactly the committed claims. replay() folds
+the events after the latest FlipSnapshot into that snapshot's state, and
+rebuild() writes the result back over GridFlipLog and Group.points when a
+row has been damaged. take_snapshot() keeps replays short. Stats are range
+scans over the event table's time index and never touch the live tables.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
+
+from .flips import hold_claims, next_versions
+from .leaderboard import leaderboard
+from .models import FlipOutbox, FlipSnapshot, GridFlipLog, Group, GroupPointShard, PairingEvent
+from .partners import partner_index
+from .replication import replica_database
+from .scoring import group_totals_by_id
+
+REPLAY_BATCH = 5000
+REWRITE_BATCH = 500
+# Events newer than this may still have uncommitted neighbours with lower ids,
+# so snapshots stop short of them
+SNAPSHOT_SETTLE = 60
+
+
+def record_pairing(flip_number, player1, player2, deltas, using="default"):
+    """Append the event for a claim; call inside the claiming transaction."""
+    group1, group2 = player1.group_id, player2.group_id
+    PairingEvent.objects.using(using).create(
+        flip_number=flip_number,
+        player1=player1.diary_id,
+        player2=player2.diary_id,
+        group1_id=group1,
+        group2_id=group2,
+        points1=deltas.get(group1, 0) if group1 else 0,
+        points2=deltas.get(group2, 0) if group2 and group2 != group1 else 0,
+    )
+
+
+class GridState:
+    """Active flips ({flip_number: (player1, player2)}) and points per group id."""
+
+    __slots__ = ("flips", "points", "last_event")
+
+    def __init__(self, flips=(), points=None, last_event=0):
+        self.flips = {flip_number: (player1, player2) for flip_number, player1, player2 in flips}
+        self.points = {int(group_id): total for group_id, total in (points or {}).items()}
+        self.last_event = last_event
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        if snapshot is None:
+            return cls()
+        return cls(snapshot.flips, snapshot.points, snapshot.last_event)
+
+    def apply(self, event_id, flip_number, player1, player2, group1, points1, group2, points2):
+        self.flips[flip_number] = (player1, player2)
+        if group1 and points1:
+            self.points[group1] = self.points.get(group1, 0) + points1
+        if group2 and points2:
+            self.points[group2] = self.points.get(group2, 0) + points2
+        self.last_event = event_id
+
+
+def replay(until=None, using="default"):
+    """GridState after every event up to id `until` (all by default), from the latest snapshot before it."""
+    snapshots = FlipSnapshot.objects.using(using).order_by("-last_event")
+    if until is not None:
+        snapshots = snapshots.filter(last_event__lte=until)
+    state = GridState.from_snapshot(snapshots.first())
+
+    events = PairingEvent.objects.using(using).filter(id__gt=state.last_event)
+    if until is not None:
+        events = events.filter(id__lte=until)
+    rows = events.order_by("id").values_list(
+        "id", "flip_number", "player1", "player2", "group1", "points1", "group2", "points2"
+    )
+    for row in rows.iterator(chunk_size=REPLAY_BATCH):
+        state.apply(*row)
+    return state
+
+
+def take_snapshot(settle=SNAPSHOT_SETTLE, using="default"):
+    """Fold the settled events into a new FlipSnapshot; returns it, or None when there is nothing new."""
+    cutoff = timezone.now() - timedelta(seconds=settle)
+    until = PairingEvent.objects.using(using).filter(occurred_at__lte=cutoff).aggregate(last=Max("id"))["last"]
+    latest = FlipSnapshot.objects.using(using).aggregate(last=Max("last_event"))["last"] or 0
+    if until is None or until <= latest:
+        return None
+
+    state = replay(until, using=using)
+    return FlipSnapshot.objects.using(using).create(
+        last_event=state.last_event,
+        flips=[[flip_number, *players] for flip_number, players in sorted(state.flips.items())],
+        points={str(group_id): total for group_id, total in state.points.items()},
+    )
+
+
+def rebuild(dry_run=False, using="default"):
+    """
+    Make GridFlipLog and group points match the replayed history.
+
+    Only rows that differ are written; they get fresh versions so
+    active-flips pollers pick them up. Claims wait on hold_claims() until
+    the rebuild commits, so the replay and the slots it is compared with
+    stay in step; rewritten slots go through the replica outbox.
+    Group totals are written to Group.points and the group's shard counters
+    are dropped. Returns a summary of what changed
+    (or would change, with dry_run).
+    """
+    with transaction.atomic(using=using):
+        hold_claims(using)
+        slots = list(GridFlipLog.objects.using(using).order_by("flip_number", "id"))
+        state = replay(using=using)
+
+        changed, seen = [], set()
+        for slot in slots:
+            players = state.flips.get(slot.flip_number) if slot.flip_number not in seen else None
+            seen.add(slot.flip_number)
+            wanted = (*players, True) if players else ("", "", False)
+            if (slot.player1, slot.player2, slot.is_status) != wanted:
+                slot.player1, slot.player2, slot.is_status = wanted
+                changed.append(slot)
+        created = [
+            GridFlipLog(flip_number=flip_number, player1=player1, player2=player2, is_status=True)
+            for flip_number, (player1, player2) in sorted(state.flips.items())
+            if flip_number not in seen
+        ]
+
+        regrouped = [
+            (group_id, state.points.get(group_id, 0))
+            for group_id, _, total in group_totals_by_id(using)
+            if total != state.points.get(group_id, 0)
+        ]
+
+        if not dry_run:
+            # Replaced rather than updated: a slot is its flip_number, and bulk_update's
+            # CASE statements are far slower than delete + insert for a full rebuild
+            replaced = [flip.id for flip in changed]
+            for start in range(0, len(replaced), REWRITE_BATCH):
+                GridFlipLog.objects.using(using).filter(id__in=replaced[start:start + REWRITE_BATCH]).delete()
+            rewritten = changed + created
+            for flip, version in zip(rewritten, next_versions(len(rewritten), using)):
+                flip.pk, flip.version = None, version
+            GridFlipLog.objects.using(using).bulk_create(rewritten, batch_size=REWRITE_BATCH)
+            if replica_database():
+                # Mirrored like claims, including the slots freed
+                FlipOutbox.objects.using(using).bulk_create(
+                    FlipOutbox(flip_number=flip.flip_number, player1=flip.player1, player2=flip.player2,
+                               is_status=flip.is_status)
+                    for flip in rewritten
+                )
+
+            GroupPointShard.objects.using(using).filter(group_id__in=[group_id for group_id, _ in regrouped]).delete()
+            Group.objects.using(using).bulk_update(
+                [Group(id=group_id, points=points) for group_id, points in regrouped], ["points"]
+            )
+            if changed or created or regrouped:
+                transaction.on_commit(invalidate_views, using=using)
+
+    return {
+        "last_event": state.last_event,
+        "flips_changed": len(changed),
+        "flips_created": len(created),
+        "groups_changed": len(regrouped),
+    }
+
+
+def invalidate_views():
+    leaderboard.invalidate()
+    partner_index.invalidate()
+
+
+def window(start, end=None, using="default"):
+    events = PairingEvent.objects.using(using).filter(occurred_at__gte=start)
+    return events.filter(occurred_at__lt=end) if end is not None else events
+
+
+def flips_per_minute(start, end=None, using="default"):
+    """[(minute, flips)] for the minutes in [start, end) that had any, oldest first."""
+    return list(
+        window(start, end, using)
+        .annotate(minute=TruncMinute("occurred_at"))
+        .values_list("minute")
+        .annotate(flips=Count("id"))
+        .order_by("minute")
+    )
+
+
+def group_activity(start, end=None, using="default"):
+    """{group_id: {"flips": n, "points": p}} for [start, end); a same-group pair counts once."""
+    events = window(start, end, using)
+    activity = {}
+    for group_id, flips, points in events.exclude(group1=None).values_list("group1").annotate(
+        flips=Count("id"), points=Sum("points1")
+    ).order_by():
+        activity[group_id] = {"flips": flips, "points": points}
+    for group_id, flips, points in events.exclude(group2=None).values_list("group2").annotate(
+        flips=Count("id", filter=Q(group1=None) | ~Q(group1=F("group2"))), points=Sum("points2")
+    ).order_by():
+        totals = activity.setdefault(group_id, {"flips": 0, "points": 0})
+        totals["flips"] += flips
+        totals["points"] += points
+    return activity
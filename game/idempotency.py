@@ -0,0 +1,341 @@
+"""
+Idempotency-Key replay and single-flight coalescing for retried POSTs.
+
+A response to a request carrying an Idempotency-Key header is kept for
+GAME_IDEMPOTENCY_STORE's ttl, keyed by path and key, and handed back for any
+repeat without running the view (422 if the key comes back with a different
+body). Requests that are in flight at the same time and share a key, or the
+view's own coalescing key such as the diary pair, run the view once; the
+others wait and get a copy of its response. Async views get the same
+behaviour, with their duplicates coalesced per event loop.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+from django.utils.module_loading import import_string
+
+DEFAULT_SETTINGS = {
+    "BACKEND": "game.idempotency.LocalTTLStore",
+    "OPTIONS": {"max_entries": 100_000, "ttl": 600},
+}
+MAX_KEY_LENGTH = 255
+
+
+class StoredResponse:
+    __slots__ = ("fingerprint", "status", "content", "headers")
+
+    def __init__(self, fingerprint, status, content, headers):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.content = content
+        self.headers = headers
+
+    @classmethod
+    def capture(cls, fingerprint, response):
+        if hasattr(response, "render") and not response.is_rendered:
+            response.render()
+        return cls(fingerprint, response.status_code, response.content, list(response.headers.items()))
+
+    def response(self, replayed=False):
+        response = HttpResponse(self.content, status=self.status, headers=dict(self.headers))
+        if replayed:
+            response["Idempotent-Replayed"] = "true"
+        return response
+
+
+class LocalTTLStore:
+    """Per-process store, bounded to max_entries, oldest entries evicted first."""
+
+    def __init__(self, max_entries=100_000, ttl=600):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value), in expiry order
+        self._max_entries = max_entries
+        self._ttl = ttl
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            return entry[1]
+
+    def set(self, key, value):
+        now = time.monotonic()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (now + self._ttl, value)
+            # The TTL is fixed, so expired entries are all at the front
+            while self._entries:
+                oldest_key, (expires_at, _) = next(iter(self._entries.items()))
+                if expires_at >= now and len(self._entries) <= self._max_entries:
+                    break
+                del self._entries[oldest_key]
+
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aset(self, key, value):
+        self.set(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class CacheStore:
+    """Keeps responses in a Django cache alias so a retry landing on another worker is replayed too."""
+
+    def __init__(self, alias="default", prefix="game:idempotency", ttl=600):
+        self._cache = caches[alias]
+        self._prefix = prefix
+        self._ttl = ttl
+
+    def get(self, key):
+        return self._cache.get(f"{self._prefix}:{key}")
+
+    def set(self, key, value):
+        self._cache.set(f"{self._prefix}:{key}", value, timeout=self._ttl)
+
+    async def aget(self, key):
+        return await self._cache.aget(f"{self._prefix}:{key}")
+
+    async def aset(self, key, value):
+        await self._cache.aset(f"{self._prefix}:{key}", value, timeout=self._ttl)
+
+    def clear(self):
+        # Entries expire on their own; there is no prefix delete in the cache API
+        pass
+
+
+class IdempotencyStore:
+    def __init__(self):
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            config = getattr(settings, "GAME_IDEMPOTENCY_STORE", DEFAULT_SETTINGS)
+            self._backend = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+        return self._backend
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    async def aget(self, key):
+        return await self.backend.aget(key)
+
+    async def aset(self, key, value):
+        await self.backend.aset(key, value)
+
+    def clear(self):
+        self.backend.clear()
+
+
+idempotency_store = IdempotencyStore()
+
+
+class _Call:
+    __slots__ = ("done", "result", "failed")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class SingleFlight:
+    """
+    Runs func once per key among concurrent callers in this process.
+    Returns (result, shared): shared is True for callers that waited on
+    another caller's run. If that run raised, or took longer than `timeout`,
+    the waiter runs func itself.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.done.wait(timeout) and not call.failed:
+                return call.result, True
+            return func(), False
+
+        try:
+            call.result = func()
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+single_flight = SingleFlight()
+
+_FAILED = object()
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines. Callers are coalesced per event loop, which
+    is single-threaded, so a future per key is all the bookkeeping needed.
+    """
+
+    def __init__(self):
+        self._calls = {}  # (loop, key) -> Future
+
+    async def do(self, key, func, timeout=None):
+        loop = asyncio.get_running_loop()
+        call_key = (loop, key)
+        call = self._calls.get(call_key)
+        if call is not None:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(call), timeout)
+            except asyncio.TimeoutError:
+                result = _FAILED
+            if result is not _FAILED:
+                return result, True
+            return await func(), False
+
+        call = self._calls[call_key] = loop.create_future()
+        result = _FAILED
+        try:
+            result = await func()
+        finally:
+            # Raised or cancelled (the client went away): waiters run func themselves
+            del self._calls[call_key]
+            call.set_result(result)
+        return result, False
+
+
+async_single_flight = AsyncSingleFlight()
+
+
+def idempotent(coalesce_key=None):
+    """
+    Decorate a view (or an APIView's dispatch) with Idempotency-Key replay
+    and single-flight. coalesce_key(request) may return a key that identifies
+    duplicates of the request without a header, or None.
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def awrapped(request, *args, **kwargs):
+                if request.method != "POST":
+                    return await view(request, *args, **kwargs)
+
+                invalid, fingerprint, idempotency_key = read_key(request)
+                if invalid is not None:
+                    return invalid
+                if idempotency_key:
+                    store_key = f"{request.path}:{idempotency_key}"
+                    stored = await idempotency_store.aget(store_key)
+                    if stored is not None:
+                        return replay(stored, fingerprint)
+
+                async def run():
+                    stored = StoredResponse.capture(fingerprint, await view(request, *args, **kwargs))
+                    if idempotency_key and stored.status < 500:
+                        await idempotency_store.aset(store_key, stored)
+                    return stored
+
+                flight_key = flight_key_for(request, idempotency_key, coalesce_key)
+                if flight_key is None:
+                    return (await run()).response()
+                stored, shared = await async_single_flight.do(flight_key, run, single_flight_timeout())
+                if shared and stored.fingerprint != fingerprint:
+                    if idempotency_key:
+                        return key_reused()
+                    return (await run()).response()
+                return stored.response(replayed=shared)
+
+            return awrapped
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method != "POST":
+                return view(request, *args, **kwargs)
+
+            invalid, fingerprint, idempotency_key = read_key(request)
+            if invalid is not None:
+                return invalid
+            if idempotency_key:
+                store_key = f"{request.path}:{idempotency_key}"
+                stored = idempotency_store.get(store_key)
+                if stored is not None:
+                    return replay(stored, fingerprint)
+
+            def run():
+                stored = StoredResponse.capture(fingerprint, view(request, *args, **kwargs))
+                if idempotency_key and stored.status < 500:
+                    idempotency_store.set(store_key, stored)
+                return stored
+
+            flight_key = flight_key_for(request, idempotency_key, coalesce_key)
+            if flight_key is None:
+                return run().response()
+            stored, shared = single_flight.do(flight_key, run, single_flight_timeout())
+            if shared and stored.fingerprint != fingerprint:
+                if idempotency_key:
+                    return key_reused()
+                # Same diaries but a different body (e.g. the pair scanned the other way
+                # round): run it now, after the first one has committed, instead of racing it
+                return run().response()
+            return stored.response(replayed=shared)
+
+        return wrapped
+
+    return decorator
+
+
+def read_key(request):
+    """(error response or None, body fingerprint, Idempotency-Key header) for a POST."""
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= MAX_KEY_LENGTH:
+        return JsonResponse({"error": "Invalid Idempotency-Key."}, status=400), None, None
+    return None, hashlib.blake2b(request.body, digest_size=16).hexdigest(), idempotency_key
+
+
+def replay(stored, fingerprint):
+    if stored.fingerprint != fingerprint:
+        return key_reused()
+    return stored.response(replayed=True)
+
+
+def flight_key_for(request, idempotency_key, coalesce_key):
+    if idempotency_key:
+        return f"{request.path}:key:{idempotency_key}"
+    key = coalesce_key(request) if coalesce_key else None
+    return f"{request.path}:{key}" if key is not None else None
+
+
+def single_flight_timeout():
+    return getattr(settings, "GAME_SINGLE_FLIGHT_TIMEOUT", 10)
+
+
+def key_reused():
+    return JsonResponse({"error": "Idempotency-Key was already used with a different request."}, status=422)
@@ -0,0 +1,174 @@
+import bisect
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from .generations import PROCESS_TOKEN, cache_is_local, needs_recheck
+from .scoring import group_totals_by_id
+
+GENERATION_KEY = "game:leaderboard:generation"
+
+
+class Leaderboard:
+    """
+    Group standings kept sorted by points in process memory.
+
+    A generation counter in the Django cache identifies the current standings:
+    every award bumps it, and the bumping process re-reads the awarded groups'
+    totals in place. A process that finds the shared generation ahead of its
+    own reloads with one query, so several workers sharing a cache backend
+    stay consistent.
+    The generation doubles as the ETag of GroupPointsView. With a per-process
+    cache (see game/generations.py) the standings are also re-read on a
+    timer and bumped when they moved, and the ETag names the process.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._generation = None
+        self._entries = []  # (-points, name, group_id), ascending = best first
+        self._groups = {}  # group_id -> (name, points)
+        self._ids_by_name = {}
+        self._rows = None
+        self._loaded_at = None
+
+    def _shared_generation(self):
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            cache.add(GENERATION_KEY, 1, timeout=None)
+            generation = cache.get(GENERATION_KEY, 1)
+        return generation
+
+    def _reload(self, generation):
+        # Served to every request of the process, so read from the primary even
+        # when the request that triggers the reload may read from a replica
+        totals = group_totals_by_id(using="default")
+        self._groups = {group_id: (name, points) for group_id, name, points in totals}
+        self._ids_by_name = {name: group_id for group_id, name, _ in totals}
+        self._entries = sorted((-points, name, group_id) for group_id, name, points in totals)
+        self._rows = None
+        self._generation = generation
+        self._loaded_at = time.monotonic()
+
+    def _fresh(self):
+        generation = self._shared_generation()
+        with self._lock:
+            if generation != self._generation:
+                self._reload(generation)
+            elif needs_recheck(self._loaded_at):
+                entries = self._entries
+                self._reload(generation)
+                if self._entries != entries:
+                    # Another process awarded points; a new generation keeps ETags honest
+                    self._generation = self._bump()
+            return self._generation
+
+    async def _afresh(self):
+        # Async views only leave the event loop when the standings must be reloaded
+        generation = await cache.aget(GENERATION_KEY)
+        if generation is None or generation != self._generation or needs_recheck(self._loaded_at):
+            return await sync_to_async(self._fresh)()
+        return generation
+
+    def etag(self):
+        return self._etag(self._fresh())
+
+    async def aetag(self):
+        return self._etag(await self._afresh())
+
+    def all(self):
+        self._fresh()
+        return self._all()
+
+    async def aall(self):
+        await self._afresh()
+        return self._all()
+
+    def top(self, n):
+        return self.all()[:n]
+
+    async def atop(self, n):
+        return (await self.aall())[:n]
+
+    def rank(self, name):
+        """(points, rank) for a group, ties sharing the better rank, or None."""
+        self._fresh()
+        return self._rank(name)
+
+    async def arank(self, name):
+        await self._afresh()
+        return self._rank(name)
+
+    def standings(self, group_ids):
+        """Current [{"name": ..., "points": ...}] for the given groups."""
+        self._fresh()
+        with self._lock:
+            return [
+                {"name": self._groups[group_id][0], "points": self._groups[group_id][1]}
+                for group_id in group_ids
+                if group_id in self._groups
+            ]
+
+    def _etag(self, generation):
+        if cache_is_local():
+            return f'"lb-{PROCESS_TOKEN}-{generation}"'
+        return f'"lb-{generation}"'
+
+    def _all(self):
+        with self._lock:
+            if self._rows is None:
+                self._rows = [{"name": name, "points": -neg} for neg, name, _ in self._entries]
+            return self._rows
+
+    def _rank(self, name):
+        with self._lock:
+            group_id = self._ids_by_name.get(name)
+            if group_id is None:
+                return None
+            points = self._groups[group_id][1]
+            return points, bisect.bisect_left(self._entries, (-points,)) + 1
+
+    def apply(self, deltas):
+        """Refresh the groups of {group_id: points} in the standings after the award committed."""
+        if not deltas:
+            return
+        try:
+            generation = cache.incr(GENERATION_KEY)
+        except ValueError:
+            self.invalidate()
+            return
+        # Re-read the totals instead of adding the deltas: a reload that ran
+        # between the commit and the bump has already counted the award.
+        totals = group_totals_by_id(using="default", group_ids=deltas)
+        with self._lock:
+            if self._generation is None or generation != self._generation + 1 or len(totals) != len(deltas):
+                # Missed someone else's update, or a group went away; reload on next read.
+                self._generation = None
+                return
+            for group_id, _, total in totals:
+                if group_id not in self._groups:
+                    self._generation = None
+                    return
+                name, points = self._groups[group_id]
+                del self._entries[bisect.bisect_left(self._entries, (-points, name, group_id))]
+                bisect.insort(self._entries, (-total, name, group_id))
+                self._groups[group_id] = (name, total)
+            self._rows = None
+            self._generation = generation
+
+    def _bump(self):
+        try:
+            return cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.add(GENERATION_KEY, 1, timeout=None)
+            return cache.get(GENERATION_KEY, 1)
+
+    def invalidate(self):
+        self._bump()
+        with self._lock:
+            self._generation = None
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, override_settings
+
+from game.benchmarks import bench_client, scratch_database, summarize
+from game.leaderboard import leaderboard
+from game.models import GridFlipLog, Group, Player, Quote
+from game.quote_pool import quote_pool
+
+MODES = {
+    "wsgi, sync views": ("threads", "/game/"),
+    "asgi, sync views": ("asgi", "/game/"),
+    "asgi, async views": ("asgi", "/game/async/"),
+}
+
+
+class Load:
+    """
+    One virtual client's cycle: read its quote part, poll active-flips and
+    group-points like a screen, then pair with its partner.
+    """
+
+    def __init__(self, prefix, offset):
+        self.prefix = prefix
+        self.offset = offset
+        self.samples = []
+        self.errors = 0
+        self.peak_threads = threading.active_count()
+
+    def plan(self, client_index, cycle, cycles):
+        diary = self.offset + 2 * (client_index * cycles + cycle)
+        return [
+            ("get", "get-quote-part", {"diary_number": f"D{diary}"}),
+            ("get", "active-flips", {"since": "0"}),
+            ("get", "group-points", {}),
+            ("post", "verify-quote-pair", {"diary_id_1": f"D{diary}", "diary_id_2": f"D{diary + 1}"}),
+        ]
+
+    def record(self, elapsed, status_code):
+        self.samples.append(elapsed)
+        if status_code >= 500:
+            self.errors += 1
+        self.peak_threads = max(self.peak_threads, threading.active_count())
+
+
+def run_threads(load, concurrency, cycles):
+    def worker(client_index):
+        client = bench_client()
+        client.raise_request_exception = False
+        try:
+            for cycle in range(cycles):
+                for method, path, data in load.plan(client_index, cycle, cycles):
+                    start = time.perf_counter()
+                    if method == "get":
+                        response = client.get(load.prefix + path, data)
+                    else:
+                        response = client.post(load.prefix + path, data, content_type="application/json")
+                    load.record(time.perf_counter() - start, response.status_code)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+
+
+async def run_asgi(load, concurrency, cycles):
+    async def worker(client_index):
+        client = AsyncClient(raise_request_exception=False)
+        for cycle in range(cycles):
+            for method, path, data in load.plan(client_index, cycle, cycles):
+                start = time.perf_counter()
+                if method == "get":
+                    response = await client.get(load.prefix + path, data)
+                else:
+                    response = await client.post(load.prefix + path, data, content_type="application/json")
+                load.record(time.perf_counter() - start, response.status_code)
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+
+
+class Command(BaseCommand):
+    help = (
+        "In-process load test of the sync views under WSGI threads and ASGI, and the async views "
+        "under ASGI: throughput and latency per concurrency level."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 10, 50, 200])
+        parser.add_argument("--cycles", type=int, default=5, help="request cycles per virtual client")
+        parser.add_argument("--p99-budget", type=float, default=100.0, help="ms; capacity is the highest level within it")
+
+    def handle(self, *args, **options):
+        levels = options["concurrency"]
+        cycles = options["cycles"]
+        pairs_per_run = max(levels) * cycles
+
+        # AsyncClient always sends Host: testserver; every virtual client shares one IP, so no rate limits
+        with scratch_database(), override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"], GAME_RATE_LIMITS={}
+        ):
+            group = Group.objects.create(name="Bench")
+            quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+            players = 2 * pairs_per_run * len(MODES) * len(levels)
+            Player.objects.bulk_create(
+                Player(diary_id=f"D{i}", quote=quote, quote_part="AB"[i % 2], group=group) for i in range(players)
+            )
+            quote_pool.invalidate()
+            leaderboard.invalidate()
+            self.stdout.write(f"{len(levels)} levels x {cycles} cycles of 4 requests per client")
+
+            offset = 0
+            for label, (runner, prefix) in MODES.items():
+                self.stdout.write(f"\n== {label}")
+                self.stdout.write(
+                    f"{'clients':>7}  {'req/s':>8}  {'p50 ms':>8}  {'p99 ms':>8}  {'errors':>6}  {'threads':>7}"
+                )
+                capacity = 0
+                for concurrency in levels:
+                    # Fresh flips each run, so active-flips polls cost the same across modes
+                    GridFlipLog.objects.all().delete()
+                    GridFlipLog.objects.bulk_create(
+                        GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, pairs_per_run + 1)
+                    )
+                    connections.close_all()
+
+                    load = Load(prefix, offset)
+                    offset += 2 * pairs_per_run
+                    start = time.perf_counter()
+                    if runner == "threads":
+                        run_threads(load, concurrency, cycles)
+                    else:
+                        asyncio.run(run_asgi(load, concurrency, cycles))
+                    elapsed = time.perf_counter() - start
+
+                    stats = summarize(load.samples)
+                    if stats["p99_ms"] <= options["p99_budget"] and not load.errors:
+                        capacity = concurrency
+                    self.stdout.write(
+                        f"{concurrency:>7}  {len(load.samples) / elapsed:>8.0f}  {stats['p50_ms']:>8.2f}  "
+                        f"{stats['p99_ms']:>8.2f}  {load.errors:>6}  {load.peak_threads:>7}"
+                    )
+                self.stdout.write(f"capacity within p99 {options['p99_budget']:.0f} ms: {capacity} clients")
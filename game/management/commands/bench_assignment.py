@@ -0,0 +1,49 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from game.assignment import AssignmentEngine
+
+
+def simulate_legacy(registrations, quote_ids):
+    # The old DiaryEntryView: random quote, part from the diary number's parity.
+    counts = {quote_id: [0, 0] for quote_id in quote_ids}
+    start = time.perf_counter()
+    for diary_number in range(registrations):
+        quote_id = random.choice(quote_ids)
+        counts[quote_id][0 if diary_number % 2 else 1] += 1
+    elapsed = time.perf_counter() - start
+    paired = sum(2 * min(a, b) for a, b in counts.values())
+    return paired / registrations, elapsed
+
+
+def simulate_engine(registrations, quote_ids):
+    engine = AssignmentEngine()
+    engine.load(quote_ids)
+    start = time.perf_counter()
+    for _ in range(registrations):
+        engine.assign()
+    elapsed = time.perf_counter() - start
+    return engine.stats()["pairable_rate"], elapsed
+
+
+class Command(BaseCommand):
+    help = "Simulate registrations and report the pairable rate and assignment cost."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+        parser.add_argument("--quotes", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+        quote_ids = list(range(1, options["quotes"] + 1))
+
+        self.stdout.write(f"{'registrations':>13}  {'mode':<7}  {'pairable':>8}  {'us/assign':>9}")
+        for size in options["sizes"]:
+            for mode, simulate in (("legacy", simulate_legacy), ("engine", simulate_engine)):
+                rate, elapsed = simulate(size, quote_ids)
+                self.stdout.write(
+                    f"{size:>13}  {mode:<7}  {rate:>8.2%}  {elapsed / size * 1e6:>9.2f}"
+                )
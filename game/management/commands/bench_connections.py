@@ -0,0 +1,91 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.test import override_settings
+
+from game.benchmarks import bench_client, scratch_database, summarize
+from game.models import GridFlipLog, Group, Player, Quote
+from game.quote_cache import quote_part_cache
+
+MODES = {
+    "new connection per request": {"CONN_MAX_AGE": 0, "pool": None},
+    "persistent (CONN_MAX_AGE)": {"CONN_MAX_AGE": None, "pool": None},
+    "psycopg pool": {"CONN_MAX_AGE": 0, "pool": {"min_size": 2, "max_size": 4}},
+}
+
+
+def configure(mode):
+    connection.close()
+    if hasattr(connection, "close_pool"):
+        connection.close_pool()
+    connection.settings_dict["CONN_MAX_AGE"] = mode["CONN_MAX_AGE"]
+    connection.settings_dict["CONN_HEALTH_CHECKS"] = True
+    options = connection.settings_dict.setdefault("OPTIONS", {})
+    options.pop("pool", None)
+    if mode["pool"]:
+        options["pool"] = mode["pool"]
+
+
+class Command(BaseCommand):
+    help = "Compare per-request latency of get-quote-part and verify-quote-pair across connection modes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+
+    def handle(self, *args, **options):
+        requests = options["requests"]
+        client = bench_client()
+
+        # Measures connection handling, not rate limits
+        with scratch_database(), override_settings(GAME_RATE_LIMITS={}):
+            modes = dict(MODES)
+            if connection.vendor != "postgresql":
+                modes.pop("psycopg pool")
+            self.stdout.write(f"backend: {connection.vendor}, {requests} requests per endpoint")
+
+            group = Group.objects.create(name="Bench")
+            quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+            Player.objects.bulk_create(
+                Player(diary_id=f"D{i}", quote=quote, quote_part="AB"[i % 2], group=group)
+                for i in range(2 * requests * len(modes))
+            )
+
+            pair_offset = 0
+            for label, mode in modes.items():
+                configure(mode)
+                GridFlipLog.objects.all().delete()
+                GridFlipLog.objects.bulk_create(
+                    GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, requests + 1)
+                )
+                close_old_connections()
+
+                timings = {"get-quote-part": [], "verify-quote-pair": []}
+                for i in range(requests):
+                    # Cold path: drop the cached body so the request reaches the database
+                    quote_part_cache.clear()
+                    start = time.perf_counter()
+                    client.get("/game/get-quote-part", {"diary_number": f"D{i}"})
+                    close_old_connections()  # what request_finished does in a real server
+                    timings["get-quote-part"].append(time.perf_counter() - start)
+
+                    diary = pair_offset + 2 * i
+                    start = time.perf_counter()
+                    client.post(
+                        "/game/verify-quote-pair",
+                        {"diary_id_1": f"D{diary}", "diary_id_2": f"D{diary + 1}"},
+                        content_type="application/json",
+                    )
+                    close_old_connections()
+                    timings["verify-quote-pair"].append(time.perf_counter() - start)
+                pair_offset += 2 * requests
+
+                self.stdout.write(f"\n== {label}")
+                for endpoint, samples in timings.items():
+                    stats = summarize(samples)
+                    self.stdout.write(
+                        f"{endpoint:<18} mean {stats['mean_ms']:7.3f} ms  p50 {stats['p50_ms']:7.3f} ms  "
+                        f"p99 {stats['p99_ms']:7.3f} ms"
+                    )
+
+            configure(MODES["new connection per request"])
@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, override_settings
+
+from game.assignment import assignment_engine
+from game.benchmarks import bench_client, scratch_database, summarize
+from game.leaderboard import leaderboard
+from game.models import GridFlipLog, Group, Quote
+from game.quote_pool import quote_pool
+
+# Endpoints that have an async version under game/async/
+ASYNC_ENDPOINTS = {"get-quote-part", "verify-quote-pair", "active-flips", "group-points"}
+
+_endpoint = contextvars.ContextVar("bench_endpoint", default=None)
+
+
+class EventStats:
+    """Per-endpoint latencies, status codes and database queries."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.queries = Counter()
+        self.connections = []
+
+    def record(self, endpoint, elapsed, status_code):
+        with self.lock:
+            self.samples[endpoint].append(elapsed)
+            self.statuses[endpoint][status_code] += 1
+
+    def count_query(self, execute, sql, params, many, context):
+        endpoint = _endpoint.get()
+        if endpoint is not None:
+            with self.lock:
+                self.queries[endpoint] += 1
+        return execute(sql, params, many, context)
+
+    def watch(self, sender, connection, **kwargs):
+        # Every connection opened during the run counts its queries, whatever thread opened it
+        if self.count_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self.count_query)
+        with self.lock:
+            self.connections.append(connection)
+
+    def close_connections(self):
+        """
+        Close the connections request threads opened. The test clients keep
+        them past the request, and Django only closes a connection from its
+        own thread, so they are closed at the driver level once those threads
+        are done; left open, they keep the scratch database from being dropped.
+        """
+        for connection in self.connections:
+            if connection.connection is not None:
+                connection.connection.close()
+
+
+class WSGITransport:
+    """Sync views through a thread pool, one thread per in-flight request as under a threaded WSGI server."""
+
+    def __init__(self, workers):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.local = threading.local()
+
+    def _call(self, method, path, data, headers):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = bench_client()
+            client.raise_request_exception = False
+        if method == "get":
+            return client.get(path, data, headers=headers)
+        return client.post(path, data, content_type="application/json", headers=headers)
+
+    async def request(self, method, path, data=None, headers=None):
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, context.run, self._call, method, path, data, headers)
+
+    def close(self):
+        self.executor.shutdown()
+        connections.close_all()
+
+
+class ASGITransport:
+    """The ASGI handler on the benchmark's event loop, as under an ASGI server."""
+
+    def __init__(self):
+        self.client = AsyncClient(raise_request_exception=False)
+
+    async def request(self, method, path, data=None, headers=None):
+        if method == "get":
+            return await self.client.get(path, data, headers=headers)
+        return await self.client.post(path, data, content_type="application/json", headers=headers)
+
+    def close(self):
+        pass
+
+
+class EventDay:
+    """
+    Players register, read their half, find the holder of the other half and
+    both scan the pair; a few pair with the wrong person. Screens poll
+    active-flips with a cursor and group-points with an ETag until every
+    player is done.
+    """
+
+    def __init__(self, transport, stats, options):
+        self.transport = transport
+        self.stats = stats
+        self.options = options
+        self.async_views = options["async_views"]
+        self.rng = random.Random(options["seed"])
+        self.waiting = {}  # quote_id -> (diary, asyncio.Event set when the partner arrives)
+        self.partners = {}
+        self.paired = []
+        self.players_done = False
+
+    def path(self, endpoint):
+        if self.async_views and endpoint in ASYNC_ENDPOINTS:
+            return f"/game/async/{endpoint}"
+        return f"/game/{endpoint}"
+
+    async def call(self, method, endpoint, data=None, headers=None):
+        token = _endpoint.set(endpoint)
+        start = time.perf_counter()
+        try:
+            response = await self.transport.request(method, self.path(endpoint), data, headers)
+        except Exception:
+            self.stats.record(endpoint, time.perf_counter() - start, 599)
+            return None
+        finally:
+            _endpoint.reset(token)
+        self.stats.record(endpoint, time.perf_counter() - start, response.status_code)
+        return response
+
+    async def pair(self, diary, partner):
+        await self.call("post", "verify-quote-pair", {"diary_id_1": diary, "diary_id_2": partner})
+
+    async def player(self, index, groups):
+        diary = f"E{index}"
+        response = await self.call(
+            "post", "diary-entry", {"diary_number": diary, "group_name": groups[index % len(groups)]}
+        )
+        if response is None or response.status_code not in (200, 201):
+            return
+
+        response = await self.call("get", "get-quote-part", {"diary_number": diary})
+        if response is None or response.status_code != 200:
+            return
+        quote_id = response.json()["quote_id"]
+
+        if self.paired and self.rng.random() < self.options["wrong_partner_rate"]:
+            # Scans someone already paired: refused as a mismatch (400) or a conflict (409)
+            await self.pair(diary, self.rng.choice(self.paired))
+
+        waiting = self.waiting.pop(quote_id, None)
+        if waiting is None:
+            found = asyncio.Event()
+            self.waiting[quote_id] = (diary, found)
+            try:
+                await asyncio.wait_for(found.wait(), self.options["partner_timeout"])
+            except asyncio.TimeoutError:
+                # The other half never showed up (its holder hit an error)
+                self.waiting.pop(quote_id, None)
+                return
+            partner = self.partners.pop(diary)
+        else:
+            partner, found = waiting
+            self.partners[partner] = diary
+            found.set()
+
+        # Both holders scan; the second scan is answered with "already paired"
+        await self.pair(diary, partner)
+        self.paired.append(diary)
+
+    async def screen(self):
+        cursor, etag = 0, None
+        while not self.players_done:
+            response = await self.call("get", "active-flips", {"since": cursor})
+            if response is not None and response.status_code == 200:
+                cursor = response.json()["cursor"]
+            headers = {"If-None-Match": etag} if etag else None
+            response = await self.call("get", "group-points", headers=headers)
+            if response is not None and response.status_code == 200:
+                etag = response.get("ETag")
+            await asyncio.sleep(self.options["poll_interval"])
+
+    async def run(self, groups):
+        semaphore = asyncio.Semaphore(self.options["concurrency"])
+
+        async def admitted(index):
+            async with semaphore:
+                await asyncio.sleep(self.rng.random() * self.options["ramp"])
+                await self.player(index, groups)
+
+        screens = [asyncio.create_task(self.screen()) for _ in range(self.options["screens"])]
+        await asyncio.gather(*(admitted(index) for index in range(self.options["players"])))
+        self.players_done = True
+        await asyncio.gather(*screens)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay an event day in process: players register, read their half, find partners and pair "
+        "while screens poll. Reports throughput, latency percentiles, error and conflict rates and "
+        "queries per request for every endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--players", type=int, default=1000, help="even, so every quote gets both halves taken")
+        parser.add_argument("--screens", type=int, default=20)
+        parser.add_argument("--groups", type=int, default=10)
+        parser.add_argument("--concurrency", type=int, default=100, help="players in flight at once")
+        parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which each player's arrival is spread")
+        parser.add_argument("--poll-interval", type=float, default=0.5)
+        parser.add_argument("--wrong-partner-rate", type=float, default=0.02)
+        parser.add_argument("--partner-timeout", type=float, default=30.0)
+        parser.add_argument("--server", choices=["wsgi", "asgi"], default="wsgi")
+        parser.add_argument("--async-views", action="store_true", help="use the game/async/ views (with --server asgi)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--scratch", action=argparse.BooleanOptionalAction, default=True,
+            help="run in a throwaway copy of the database; --no-scratch uses the configured (empty) one, "
+                 "e.g. the test database under the test runner",
+        )
+
+    def handle(self, *args, **options):
+        players = options["players"] + options["players"] % 2
+        options["players"] = players
+
+        stats = EventStats()
+        # AsyncClient always sends Host: testserver; every player shares one IP, so no rate limits
+        database = scratch_database() if options["scratch"] else contextlib.nullcontext()
+        with database, override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"], GAME_RATE_LIMITS={}
+        ):
+            group_names = [f"Group {n}" for n in range(options["groups"])]
+            Group.objects.bulk_create(Group(name=name) for name in group_names)
+            Quote.objects.bulk_create(
+                Quote(text=f"First half {n} second half {n}", part_a=f"First half {n}", part_b=f"second half {n}")
+                for n in range(players // 2)
+            )
+            GridFlipLog.objects.bulk_create(
+                GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, players // 2 + 1)
+            )
+            quote_pool.invalidate()
+            assignment_engine.invalidate()
+            leaderboard.invalidate()
+            connections.close_all()
+
+            if options["server"] == "wsgi":
+                transport = WSGITransport(options["concurrency"] + options["screens"])
+            else:
+                transport = ASGITransport()
+
+            connection_created.connect(stats.watch)
+            start = time.perf_counter()
+            try:
+                asyncio.run(EventDay(transport, stats, options).run(group_names))
+            finally:
+                elapsed = time.perf_counter() - start
+                connection_created.disconnect(stats.watch)
+                transport.close()
+                stats.close_connections()
+
+            paired = GridFlipLog.objects.filter(is_status=True).count()
+
+        self.report(stats, elapsed, options, paired)
+
+    def report(self, stats, elapsed, options, paired):
+        views = "async views" if options["async_views"] else "sync views"
+        total = sum(len(samples) for samples in stats.samples.values())
+        self.stdout.write(
+            f"{options['players']} players, {options['screens']} screens, {options['server']} / {views}: "
+            f"{total} requests in {elapsed:.1f}s ({total / elapsed:.0f} req/s), {paired} flips claimed"
+        )
+        self.stdout.write(
+            f"\n{'endpoint':<18} {'n':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'errors':>7} {'refused':>7} {'queries':>7}"
+        )
+        for endpoint in sorted(stats.samples):
+            samples = stats.samples[endpoint]
+            summary = summarize(samples)
+            statuses = stats.statuses[endpoint]
+            # 304s and "already paired" 200s are expected, and wrong-partner scans are
+            # refused with 400/409; any other 4xx and every 5xx is an error
+            refused = statuses[409] + (statuses[400] if endpoint == "verify-quote-pair" else 0)
+            errors = sum(n for code, n in statuses.items() if code >= 400) - refused
+            self.stdout.write(
+                f"{endpoint:<18} {len(samples):>6} {len(samples) / elapsed:>7.0f} {summary['p50_ms']:>8.2f} "
+                f"{summary['p95_ms']:>8.2f} {summary['p99_ms']:>8.2f} {errors / len(samples):>7.1%} "
+                f"{refused / len(samples):>7.1%} {stats.queries[endpoint] / len(samples):>7.2f}"
+            )
+        for endpoint in sorted(stats.statuses):
+            codes = ", ".join(f"{code}: {n}" for code, n in sorted(stats.statuses[endpoint].items()))
+            self.stdout.write(f"  {endpoint}: {codes}")
@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from game.events import broadcaster, encode_event, stream_events
+
+
+async def run(connections, events):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    initial = encode_event("snapshot", {"flips": [], "groups": []})
+    done = asyncio.Event()
+    finished = 0
+
+    async def client():
+        nonlocal finished
+        received = 0
+        body = stream_events(broadcaster.subscribe(), initial)
+        async for chunk in body:
+            if chunk.startswith(b"event: flip"):
+                received += 1
+                if received == events:
+                    break
+        await body.aclose()
+        finished += 1
+        if finished == connections:
+            done.set()
+
+    tasks = [asyncio.create_task(client()) for _ in range(connections)]
+    while broadcaster.connections() < connections:
+        await asyncio.sleep(0.01)
+
+    after = tracemalloc.take_snapshot()
+    per_connection = sum(stat.size_diff for stat in after.compare_to(before, "filename")) / connections
+    tracemalloc.stop()
+
+    def publisher():
+        # Published from a worker thread, the way sync views do.
+        for n in range(events):
+            broadcaster.publish("flip", {"flip_number": n, "players": ["D1", "D2"]})
+
+    start = time.perf_counter()
+    threading.Thread(target=publisher).start()
+    await done.wait()
+    elapsed = time.perf_counter() - start
+    await asyncio.gather(*tasks)
+    return per_connection, elapsed
+
+
+class Command(BaseCommand):
+    help = "Fan flip events out to many in-process SSE connections and measure delivery rate and memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", nargs="+", type=int, default=[100, 1000, 5000])
+        parser.add_argument("--events", type=int, default=100)
+
+    def handle(self, *args, **options):
+        events = options["events"]
+        self.stdout.write(f"{'connections':>11}  {'deliveries/s':>12}  {'KiB/conn':>8}")
+        for connections in options["connections"]:
+            per_connection, elapsed = asyncio.run(run(connections, events))
+            self.stdout.write(
+                f"{connections:>11}  {connections * events / elapsed:>12.0f}  {per_connection / 1024:>8.1f}"
+            )
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from game.benchmarks import scratch_database
+from game.flips import claim_flip_slot
+from game.models import GridFlipLog
+
+
+def run_workers(workers, pairs):
+    lock = threading.Lock()
+    pending = iter(pairs)
+    claimed = []
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    pair = next(pending, None)
+                if pair is None:
+                    return
+                with transaction.atomic():
+                    flip_number = claim_flip_slot(*pair)
+                if flip_number is not None:
+                    with lock:
+                        claimed.append(flip_number)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return claimed, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = "Claim flip slots from many threads and report throughput and duplicates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--slots", type=int, default=2000)
+        parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4, 8, 16])
+
+    def handle(self, *args, **options):
+        slots = options["slots"]
+        pairs = [(f"D{2 * i}", f"D{2 * i + 1}") for i in range(slots)]
+
+        with scratch_database():
+            self.stdout.write(f"backend: {connection.vendor}")
+            self.stdout.write(f"{'workers':>7}  {'claims':>6}  {'claims/s':>9}  {'duplicates':>10}")
+            for workers in options["workers"]:
+                GridFlipLog.objects.all().delete()
+                GridFlipLog.objects.bulk_create(
+                    GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, slots + 1)
+                )
+                claimed, elapsed = run_workers(workers, pairs)
+                duplicates = sum(n - 1 for n in Counter(claimed).values() if n > 1)
+                self.stdout.write(
+                    f"{workers:>7}  {len(claimed):>6}  {len(claimed) / elapsed:>9.0f}  {duplicates:>10}"
+                )
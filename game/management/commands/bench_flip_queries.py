@@ -0,0 +1,91 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from game.benchmarks import scratch_database, summarize
+from game.flips import _claim_sql, find_active_flip
+from game.models import GridFlipLog
+
+
+def free_slot_query():
+    return list(GridFlipLog.objects.filter(is_status=False).order_by("flip_number").values_list("id")[:1])
+
+
+def claim_query(diary_ids):
+    # Run the real claim statement and roll it back so the grid stays the same.
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(_claim_sql(connection), ["X1", "X2", True, *diary_ids, *diary_ids])
+        transaction.set_rollback(True)
+
+
+class Command(BaseCommand):
+    help = "Seed flip rows and compare hot GridFlipLog lookups with and without the partial indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100_000)
+        parser.add_argument("--active", type=float, default=0.9, help="Fraction of slots already claimed.")
+        parser.add_argument("--iterations", type=int, default=300)
+
+    def handle(self, *args, **options):
+        rows, iterations = options["rows"], options["iterations"]
+        active = int(rows * options["active"])
+
+        with scratch_database():
+            flips = (
+                GridFlipLog(
+                    flip_number=n,
+                    player1=f"D{2 * n}" if n <= active else "",
+                    player2=f"D{2 * n + 1}" if n <= active else "",
+                    is_status=n <= active,
+                    version=n if n <= active else 0,
+                )
+                for n in range(1, rows + 1)
+            )
+            GridFlipLog.objects.bulk_create(flips, batch_size=5000)
+            self.stdout.write(f"backend: {connection.vendor}, {rows} rows, {active} active")
+
+            indexes = GridFlipLog._meta.indexes
+            for label in ("without indexes", "with indexes"):
+                with connection.schema_editor() as editor:
+                    for index in indexes:
+                        if label == "with indexes":
+                            editor.add_index(GridFlipLog, index)
+                        else:
+                            editor.remove_index(GridFlipLog, index)
+
+                lookups = {
+                    "first free slot": free_slot_query,
+                    "active flip for players": lambda: find_active_flip(
+                        f"D{random.randrange(2 * rows)}", f"D{random.randrange(2 * rows)}"
+                    ),
+                    "claim statement": lambda: claim_query(
+                        [f"D{random.randrange(2 * rows)}", f"D{random.randrange(2 * rows)}"]
+                    ),
+                }
+
+                self.stdout.write(f"\n== {label}")
+                active_flips = GridFlipLog.objects.filter(is_status=True)
+                self.stdout.write(
+                    "plan (active flip): "
+                    + active_flips.filter(player1__in=["D1"])
+                    .union(active_flips.filter(player2__in=["D1"]))[:1]
+                    .explain()
+                    .replace("\n", " | ")
+                )
+                self.stdout.write(
+                    "plan (free slot): "
+                    + GridFlipLog.objects.filter(is_status=False).order_by("flip_number")[:1].explain().replace("\n", " | ")
+                )
+                for name, lookup in lookups.items():
+                    samples = []
+                    for _ in range(iterations):
+                        start = time.perf_counter()
+                        lookup()
+                        samples.append(time.perf_counter() - start)
+                    stats = summarize(samples)
+                    self.stdout.write(
+                        f"{name:<24} p50 {stats['p50_ms']:7.3f} ms  p99 {stats['p99_ms']:7.3f} ms"
+                    )
@@ -0,0 +1,84 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
+
+from game.benchmarks import scratch_database, timed
+from game.history import flips_per_minute, group_activity, rebuild, take_snapshot, window
+from game.management.commands.provision_grid import chunked
+from game.models import FlipSnapshot, GridFlipLog, Group, PairingEvent
+from game.scoring import pair_points
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay, rebuild and snapshot cost over a large pairing history, and time-windowed stats "
+        "from the event table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=200_000)
+        parser.add_argument("--groups", type=int, default=50)
+        parser.add_argument("--hours", type=float, default=8.0, help="span the events are spread over")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        count = options["events"]
+        with scratch_database():
+            FlipSnapshot.objects.all().delete()
+            groups = [group.id for group in Group.objects.bulk_create(
+                Group(name=f"Group {n}") for n in range(options["groups"])
+            )]
+            end = timezone.now()
+            start = end - timedelta(hours=options["hours"])
+            step = (end - start) / count
+
+            def events():
+                for n in range(count):
+                    group1, group2 = rng.choice(groups), rng.choice(groups)
+                    deltas = pair_points(group1, group2)
+                    yield PairingEvent(
+                        occurred_at=start + step * n, flip_number=n + 1, player1=f"D{2 * n}", player2=f"D{2 * n + 1}",
+                        group1_id=group1, group2_id=group2,
+                        points1=deltas.get(group1, 0), points2=deltas.get(group2, 0) if group2 != group1 else 0,
+                    )
+
+            for chunk in chunked(events(), 5000):
+                PairingEvent.objects.bulk_create(chunk)
+            # An empty grid: the first rebuild writes every slot
+            GridFlipLog.objects.bulk_create(
+                GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, count + 1)
+            )
+            self.stdout.write(f"{count} events over {options['hours']:.0f}h, {options['groups']} groups")
+
+            summary, elapsed = timed(rebuild)
+            self.stdout.write(f"rebuild from events, empty grid   {elapsed:8.2f}s  ({summary['flips_changed']} slots)")
+            GridFlipLog.objects.filter(flip_number__lte=100).update(player1="", player2="", is_status=False)
+            summary, elapsed = timed(rebuild)
+            self.stdout.write(f"rebuild, 100 damaged slots        {elapsed:8.2f}s  ({summary['flips_changed']} slots)")
+            _, elapsed = timed(take_snapshot, 0)
+            self.stdout.write(f"snapshot                          {elapsed:8.2f}s")
+            _, elapsed = timed(rebuild, True)
+            self.stdout.write(f"check from snapshot (dry run)     {elapsed:8.2f}s")
+
+            self.stdout.write("\ntime-windowed stats, mean of 20 runs")
+            for minutes in (5, 60, 24 * 60):
+                since = end - timedelta(minutes=minutes)
+                for label, query in [("per minute", flips_per_minute), ("per group", group_activity)]:
+                    samples = []
+                    for _ in range(20):
+                        began = time.perf_counter()
+                        query(since)
+                        samples.append(time.perf_counter() - began)
+                    self.stdout.write(f"  last {minutes:>4} min {label:<11} {sum(samples) / len(samples) * 1000:8.2f} ms")
+
+            plan = (
+                window(end - timedelta(minutes=60)).annotate(minute=TruncMinute("occurred_at"))
+                .values_list("minute").annotate(flips=Count("id")).explain()
+            )
+            self.stdout.write(f"\nper-minute plan: {plan.replace(chr(10), ' | ')}")
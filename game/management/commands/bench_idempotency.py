@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from game.benchmarks import bench_client, scratch_database, summarize
+from game.idempotency import idempotency_store
+from game.models import GridFlipLog, Group, Player, Quote
+from game.quote_pool import quote_pool
+
+
+class Command(BaseCommand):
+    help = (
+        "Cost of a retried verify-quote-pair with and without an Idempotency-Key, and how many "
+        "transactions a burst of concurrent duplicates runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pairs", type=int, default=500)
+        parser.add_argument("--retries", type=int, default=3, help="repeats of each scan")
+        parser.add_argument("--burst", type=int, default=8, help="concurrent duplicates per pair")
+
+    def handle(self, *args, **options):
+        pairs = options["pairs"]
+        # Measures retries, not rate limits
+        with scratch_database(), override_settings(GAME_RATE_LIMITS={}):
+            group = Group.objects.create(name="Bench")
+            quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+            # Three disjoint sets of pairs: retries without a key, with a key, and bursts
+            Player.objects.bulk_create(
+                Player(diary_id=f"D{i}", quote=quote, quote_part="AB"[i % 2], group=group)
+                for i in range(6 * pairs)
+            )
+            GridFlipLog.objects.bulk_create(
+                GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, 3 * pairs + 1)
+            )
+            quote_pool.invalidate()
+            idempotency_store.clear()
+
+            client = bench_client()
+            self.stdout.write(f"{pairs} pairs, {options['retries']} retries each")
+            self.stdout.write(f"{'retries':<16} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'queries':>8}")
+            for label, offset, keyed in [("no key", 0, False), ("Idempotency-Key", 2 * pairs, True)]:
+                samples, queries = [], 0
+                for n in range(pairs):
+                    diary = offset + 2 * n
+                    payload = {"diary_id_1": f"D{diary}", "diary_id_2": f"D{diary + 1}"}
+                    headers = {"Idempotency-Key": f"scan-{diary}"} if keyed else {}
+                    client.post("/game/verify-quote-pair", payload, content_type="application/json", headers=headers)
+                    for _ in range(options["retries"]):
+                        with CaptureQueriesContext(connection) as captured:
+                            start = time.perf_counter()
+                            client.post(
+                                "/game/verify-quote-pair", payload, content_type="application/json", headers=headers
+                            )
+                            samples.append(time.perf_counter() - start)
+                        queries += len(captured)
+                stats = summarize(samples)
+                self.stdout.write(
+                    f"{label:<16} {stats['mean_ms']:>8.3f} {stats['p50_ms']:>8.3f} {stats['p99_ms']:>8.3f} "
+                    f"{queries / len(samples):>8.2f}"
+                )
+
+            self.stdout.write(f"\n{options['burst']} concurrent duplicates of each of {pairs} scans, no key")
+            statuses = Counter()
+            lock = threading.Lock()
+            for n in range(pairs):
+                diary = 4 * pairs + 2 * n
+                payload = {"diary_id_1": f"D{diary}", "diary_id_2": f"D{diary + 1}"}
+                barrier = threading.Barrier(options["burst"])
+
+                def scan():
+                    burst_client = bench_client()
+                    barrier.wait()
+                    response = burst_client.post("/game/verify-quote-pair", payload, content_type="application/json")
+                    shared = response.has_header("Idempotent-Replayed")
+                    with lock:
+                        statuses[(response.status_code, shared)] += 1
+                    connections.close_all()
+
+                threads = [threading.Thread(target=scan) for _ in range(options["burst"])]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+            executed = sum(n for (_, shared), n in statuses.items() if not shared)
+            self.stdout.write(
+                f"{executed} of {sum(statuses.values())} requests ran the view "
+                f"({executed / pairs:.2f} per scan); "
+                + ", ".join(
+                    f"{code}{' shared' if shared else ''}: {n}" for (code, shared), n in sorted(statuses.items())
+                )
+            )
@@ -0,0 +1,69 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from game.benchmarks import scratch_database, summarize
+from game.flips import halves_match
+from game.models import Player, Quote, quote_digest
+from game.management.commands.provision_grid import chunked
+
+
+def text_scan_validation(diary_id_1, diary_id_2):
+    # What the old commented-out VerifyQuotePairView did: rebuild the text and scan for it
+    players = {player.diary_id: player for player in Player.objects.filter(
+        diary_id__in=[diary_id_1, diary_id_2]
+    ).select_related("quote")}
+    player1, player2 = players[diary_id_1], players[diary_id_2]
+    a, b = (player1, player2) if player1.quote_part == "A" else (player2, player1)
+    return Quote.objects.filter(text=f"{a.quote.part_a} {b.quote.part_b}").exists()
+
+
+def digest_validation(diary_id_1, diary_id_2):
+    # The pairing_transaction() fetch plus halves_match()
+    players = {player.diary_id: player for player in Player.objects.filter(
+        diary_id__in=[diary_id_1, diary_id_2]
+    ).select_related("quote").only("diary_id", "group_id", "quote_part", "quote__digest")}
+    return halves_match(players[diary_id_1], players[diary_id_2])
+
+
+class Command(BaseCommand):
+    help = "Compare pair validation by quote text scan with the digest check over a large quote catalogue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--quotes", type=int, default=200_000)
+        parser.add_argument("--pairs", type=int, default=200)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with scratch_database():
+            rows = (
+                Quote(text=f"Part A {n} part B {n}", part_a=f"Part A {n}", part_b=f"part B {n}",
+                      digest=quote_digest(f"Part A {n}", f"part B {n}"))
+                for n in range(options["quotes"])
+            )
+            for chunk in chunked(rows, 5000):
+                Quote.objects.bulk_create(chunk)
+            quote_ids = list(Quote.objects.values_list("id", flat=True))
+
+            players = []
+            for n in range(options["pairs"]):
+                quote_id = rng.choice(quote_ids)
+                players += [
+                    Player(diary_id=f"A{n}", quote_id=quote_id, quote_part="A"),
+                    Player(diary_id=f"B{n}", quote_id=quote_id, quote_part="B"),
+                ]
+            Player.objects.bulk_create(players)
+
+            self.stdout.write(f"{options['quotes']} quotes, {options['pairs']} pairs validated")
+            for label, validate in [("text scan", text_scan_validation), ("digest", digest_validation)]:
+                samples = []
+                for n in range(options["pairs"]):
+                    start = time.perf_counter()
+                    assert validate(f"A{n}", f"B{n}")
+                    samples.append(time.perf_counter() - start)
+                stats = summarize(samples)
+                self.stdout.write(
+                    f"{label:<10} mean {stats['mean_ms']:8.3f} ms  p50 {stats['p50_ms']:8.3f} ms  "
+                    f"p99 {stats['p99_ms']:8.3f} ms"
+                )
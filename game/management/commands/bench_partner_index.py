@@ -0,0 +1,56 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from game.partners import partner_index
+
+
+class Command(BaseCommand):
+    help = "Measure find-partner index lookups and memory as registrations grow to 1M."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[1_000, 10_000, 100_000, 1_000_000])
+        parser.add_argument("--lookups", type=int, default=100_000)
+        parser.add_argument("--quotes", type=int, default=1_000, help="catalogue size; holders per half grow with players")
+        parser.add_argument("--paired", type=float, default=0.5, help="share of players already paired")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        self.stdout.write(f"{'players':>9}  {'build s':>8}  {'MiB':>7}  {'lookup ns':>9}  {'add+pair ns':>11}")
+
+        for size in options["sizes"]:
+            # A fixed catalogue, as on event day, so each half has size / (2 * quotes)
+            # holders. No digests: quotes are told apart by id, without the quote pool.
+            quotes = options["quotes"]
+            rows = [(f"D{n}", n // 2 % quotes, "AB"[n % 2], "") for n in range(size)]
+            paired = {f"D{n}" for n in range(0, int(size * options["paired"]) // 2 * 2)}
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            partner_index.load_rows(rows, paired)
+            build = time.perf_counter() - start
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            probes = [f"D{rng.randrange(size)}" for _ in range(options["lookups"])]
+            start = time.perf_counter()
+            for diary_id in probes:
+                partner_index.lookup(diary_id)
+            lookup = (time.perf_counter() - start) / len(probes)
+
+            # Incremental maintenance: a registration plus its pairing
+            extra = min(options["lookups"], 10_000)
+            start = time.perf_counter()
+            for n in range(size, size + extra, 2):
+                partner_index.add(f"D{n}", n // 2 % quotes, "A", "")
+                partner_index.add(f"D{n + 1}", n // 2 % quotes, "B", "")
+                partner_index.mark_paired((f"D{n}", f"D{n + 1}"))
+            maintain = (time.perf_counter() - start) / extra
+
+            self.stdout.write(
+                f"{size:>9}  {build:>8.2f}  {memory / 2**20:>7.1f}  {lookup * 1e9:>9.0f}  {maintain * 1e9:>11.0f}"
+            )
+
+        partner_index.invalidate()
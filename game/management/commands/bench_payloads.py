@@ -0,0 +1,52 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from game.models import Quote
+from game.payloads import QuotePayload, quote_part_body
+from game.serializers import QuoteSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare DRF serialization with the pre-encoded quote payloads, per response."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=20_000)
+
+    def handle(self, *args, **options):
+        number = options["number"]
+        quote = Quote(
+            id=4821,
+            text="The only way to do great work is to love what you do.",
+            part_a="The only way to do great work",
+            part_b="is to love what you do.",
+        )
+        payload = QuotePayload(quote.id, quote.text, quote.part_a, quote.part_b)
+        renderer = JSONRenderer()
+
+        def drf_quote():
+            return renderer.render(QuoteSerializer(quote).data)
+
+        def drf_quote_part():
+            return renderer.render({
+                "diary_number": "240117",
+                "quote_id": quote.id,
+                "quote_text": quote.text,
+                "quote_part": "B",
+                "part_text": quote.part_b,
+                "part_a": quote.part_a,
+                "part_b": quote.part_b,
+            })
+
+        cases = [
+            ("quote: QuoteSerializer + JSONRenderer", drf_quote),
+            ("quote: pre-encoded", lambda: payload.public),
+            ("get-quote-part: JSONRenderer(dict)", drf_quote_part),
+            ("get-quote-part: spliced", lambda: quote_part_body("240117", payload, "B")),
+        ]
+        assert drf_quote() == payload.public
+
+        for label, func in cases:
+            per_call = min(timeit.repeat(func, number=number, repeat=3)) / number
+            self.stdout.write(f"{label:<40} {per_call * 1e6:8.2f} us/response")
@@ -0,0 +1,134 @@
+import random
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory, override_settings
+
+from game.benchmarks import bench_client, scratch_database
+from game.models import GridFlipLog, Group, Player, Quote
+from game.quote_cache import quote_part_cache
+from game.ratelimit import RateLimiter, rate_limiter
+from game.views import pair_diaries
+
+STORES = {
+    "local": {"BACKEND": "game.ratelimit.LocalBucketStore"},
+    "shared (default cache)": {"BACKEND": "game.ratelimit.CacheBucketStore"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Per-request overhead of the rate limiter, and the database load it sheds when one client "
+        "brute-forces verify-quote-pair and scrapes get-quote-part alongside normal players."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--checks", type=int, default=50_000)
+        parser.add_argument("--players", type=int, default=200)
+        parser.add_argument("--attempts", type=int, default=5000, help="abusive requests")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.overhead(options["checks"])
+        with scratch_database():
+            self.abuse(options)
+
+    def overhead(self, checks):
+        factory = RequestFactory()
+        requests = [
+            factory.post(
+                "/game/verify-quote-pair",
+                {"diary_id_1": f"D{n}", "diary_id_2": f"D{n + 1}"},
+                content_type="application/json",
+                REMOTE_ADDR=f"10.0.{n // 250 % 250}.{n % 250}",
+            )
+            for n in range(1000)
+        ]
+        self.stdout.write(f"limiter overhead, verify-quote-pair (ip + 2 diary buckets), {checks} checks")
+        for label, store in STORES.items():
+            with override_settings(GAME_RATE_LIMIT_STORE=store):
+                # A fresh limiter builds its store from the overridden setting
+                limiter = RateLimiter()
+                start = time.perf_counter()
+                for n in range(checks):
+                    limiter.check("verify-quote-pair", requests[n % len(requests)], pair_diaries)
+                elapsed = time.perf_counter() - start
+            self.stdout.write(f"  {label:<24} {elapsed / checks * 1e6:7.2f} us per request")
+
+    def abuse(self, options):
+        rng = random.Random(options["seed"])
+        group = Group.objects.create(name="Bench")
+        quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+        players = options["players"]
+        Player.objects.bulk_create(
+            Player(diary_id=f"D{i}", quote=quote, quote_part="AB"[i % 2], group=group) for i in range(players)
+        )
+        Player.objects.create(diary_id="Z0", quote=quote, quote_part="A", group=group)
+        GridFlipLog.objects.bulk_create(
+            GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, players // 2 + 1)
+        )
+
+        # Normal players, each from their own address, interleaved with one abusive client
+        # guessing partners for its own diary (Z0) and reading every diary's half
+        plan = [("player", n) for n in range(players)] + [("abuser", n) for n in range(options["attempts"])]
+        rng.shuffle(plan)
+
+        self.stdout.write(
+            f"\n{players} players and {options['attempts']} abusive requests "
+            f"(half partner guesses, half get-quote-part scrapes) from one address"
+        )
+        self.stdout.write(
+            f"{'limits':<8} {'seconds':>8} {'queries':>8} {'abuser q':>9} {'refused':>8} {'players ok':>10}"
+        )
+        for label, limits in [("off", {}), ("on", settings.GAME_RATE_LIMITS)]:
+            GridFlipLog.objects.update(player1="", player2="", is_status=False)
+            quote_part_cache.clear()
+            client = bench_client()
+            statuses = Counter()
+            queries = Counter()
+            role = None
+
+            def count(execute, sql, params, many, context):
+                queries[role] += 1
+                return execute(sql, params, many, context)
+
+            with override_settings(GAME_RATE_LIMITS=limits), connection.execute_wrapper(count):
+                rate_limiter.clear()
+                start = time.perf_counter()
+                for role, n in plan:
+                    if role == "player":
+                        if n % 2:
+                            response = client.post(
+                                "/game/verify-quote-pair",
+                                {"diary_id_1": f"D{n}", "diary_id_2": f"D{n - 1}"},
+                                content_type="application/json",
+                                REMOTE_ADDR=f"10.1.{n // 250}.{n % 250}",
+                            )
+                        else:
+                            response = client.get(
+                                "/game/get-quote-part", {"diary_number": f"D{n}"}, REMOTE_ADDR=f"10.1.{n // 250}.{n % 250}"
+                            )
+                        statuses[("player", response.status_code < 400)] += 1
+                        continue
+                    if n % 2:
+                        response = client.post(
+                            "/game/verify-quote-pair",
+                            {"diary_id_1": "Z0", "diary_id_2": f"X{rng.randrange(10 ** 6)}"},
+                            content_type="application/json",
+                            REMOTE_ADDR="10.9.9.9",
+                        )
+                    else:
+                        response = client.get(
+                            "/game/get-quote-part", {"diary_number": f"D{n % players}"}, REMOTE_ADDR="10.9.9.9"
+                        )
+                    statuses[("refused", response.status_code == 429)] += 1
+                elapsed = time.perf_counter() - start
+
+            self.stdout.write(
+                f"{label:<8} {elapsed:>8.2f} {sum(queries.values()):>8} {queries['abuser']:>9} "
+                f"{statuses[('refused', True)] / options['attempts']:>8.1%} "
+                f"{statuses[('player', True)] / players:>10.1%}"
+            )
@@ -0,0 +1,55 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from game.benchmarks import scratch_database
+from game.models import Group, GroupPointShard
+from game.scoring import award_points, group_totals
+
+
+def run_awards(group_id, workers, awards_per_worker):
+    def worker():
+        try:
+            for _ in range(awards_per_worker):
+                with transaction.atomic():
+                    award_points({group_id: 1})
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = "Award points to one hot group from many threads, with and without sharded counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--awards", type=int, default=200, help="Awards per worker.")
+        parser.add_argument("--shards", type=int, default=16)
+
+    def handle(self, *args, **options):
+        workers, awards = options["workers"], options["awards"]
+        expected = workers * awards
+
+        with scratch_database():
+            self.stdout.write(f"backend: {connection.vendor}, {workers} workers x {awards} awards")
+            self.stdout.write(f"{'shards':>6}  {'updates/s':>9}  {'total':>7}  {'exact':>5}")
+            for shards in (0, options["shards"]):
+                GroupPointShard.objects.all().delete()
+                Group.objects.all().delete()
+                group = Group.objects.create(name="Hot")
+                with override_settings(GAME_POINT_SHARDS=shards):
+                    elapsed = run_awards(group.id, workers, awards)
+                total = group_totals()[0]["points"]
+                self.stdout.write(
+                    f"{shards:>6}  {expected / elapsed:>9.0f}  {total:>7}  {str(total == expected):>5}"
+                )
@@ -0,0 +1,92 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILES = ["quote_game.settings", "quote_game.settings_production"]
+
+# Runs in a fresh interpreter per sample so startup is measured cold. The
+# request is a get-quote-part call without a diary number: it goes through
+# the whole middleware stack and DRF but never touches the database, so what
+# is left is per-request framework overhead. Rate limits are off, so no
+# sample is a 429 cut short by the limiter.
+PROBE = """
+import json, resource, sys, time
+
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns  # urls.py imports are part of startup too
+startup = time.perf_counter() - start
+
+from django.conf import settings
+from django.test.utils import override_settings
+from game.benchmarks import bench_client
+
+client = bench_client()
+requests = int(sys.argv[1])
+with override_settings(GAME_RATE_LIMITS={}):
+    for _ in range(min(requests, 50)):
+        client.get("/game/get-quote-part")
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get("/game/get-quote-part")
+    per_request = (time.perf_counter() - start) / requests
+
+print(json.dumps({
+    "startup": startup,
+    "per_request": per_request,
+    "modules": len(sys.modules),
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "debug": settings.DEBUG,
+    "apps": len(settings.INSTALLED_APPS),
+    "middleware": len(settings.MIDDLEWARE),
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Compare startup time, memory and per-request overhead of the development and production settings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="fresh processes per profile")
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument(
+            "--settings-module", action="append", dest="profiles",
+            help=f"settings module to measure (repeatable, default: {', '.join(PROFILES)})",
+        )
+
+    def probe(self, module, requests):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": module}
+        env.pop("DJANGO_DEBUG", None)  # let each profile pick its own default
+        env.setdefault("DJANGO_SECRET_KEY", "bench-settings-probe")  # required by settings_production
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE, str(requests)],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"{module} failed:\n{result.stderr}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        profiles = options["profiles"] or PROFILES
+        self.stdout.write(f"{options['runs']} processes per profile, {options['requests']} requests each")
+
+        for module in profiles:
+            samples = [self.probe(module, options["requests"]) for _ in range(options["runs"])]
+            first = samples[0]
+            startup = statistics.median(s["startup"] for s in samples)
+            per_request = statistics.median(s["per_request"] for s in samples)
+            rss = statistics.median(s["max_rss_kb"] for s in samples)
+
+            self.stdout.write(
+                f"\n== {module} (DEBUG={first['debug']}, {first['apps']} apps, {first['middleware']} middleware)"
+            )
+            self.stdout.write(f"startup      {startup * 1000:8.1f} ms  ({first['modules']} modules imported)")
+            self.stdout.write(f"per request  {per_request * 1e6:8.1f} us")
+            self.stdout.write(f"max RSS      {rss / 1024:8.1f} MB")
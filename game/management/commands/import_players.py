@@ -0,0 +1,35 @@
+import csv
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from game.registration import register_players
+
+
+class Command(BaseCommand):
+    help = "Pre-register players from a CSV with diary_number and group_name columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=Path)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        counts = {"created": 0, "existing": 0, "error": 0}
+        start = time.perf_counter()
+
+        with open(options["path"], newline="", encoding="utf-8") as handle:
+            rows = ((row.get("diary_number"), row.get("group_name")) for row in csv.DictReader(handle))
+            while chunk := list(islice(rows, options["chunk_size"])):
+                for result in register_players(chunk):
+                    counts[result["status"]] += 1
+                    if result["status"] == "error":
+                        self.stderr.write(f"{result['diary_number'] or '<blank>'}: {result['error']}")
+
+        elapsed = time.perf_counter() - start
+        total = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['created']} created, {counts['existing']} existing, {counts['error']} errors "
+            f"in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f} registrations/s)"
+        ))
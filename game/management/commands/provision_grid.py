@@ -0,0 +1,134 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from game.models import GridFlipLog, Quote, quote_digest
+from game.quote_pool import quote_pool
+
+QUOTE_FIELDS = ["text", "part_a", "part_b", "digest", "updated_at"]
+
+
+def read_quotes(path):
+    """Yield quote dicts from a .csv (with a header row) or .jsonl file, one row at a time."""
+    with open(path, newline="", encoding="utf-8") as handle:
+        if path.suffix == ".csv":
+            yield from csv.DictReader(handle)
+        else:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def build_quote(row):
+    part_a, part_b = row["part_a"].strip(), row["part_b"].strip()
+    quote = Quote(
+        text=row.get("text") or f"{part_a} {part_b}", part_a=part_a, part_b=part_b,
+        # bulk_create does not call save(), which sets it for single saves
+        digest=quote_digest(part_a, part_b),
+    )
+    if row.get("id"):
+        quote.id = int(row["id"])
+    return quote
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-load the quote catalogue from CSV/JSONL and create flip slots, in chunks. "
+        "With --upsert, quotes are updated in place (matched on id, or on their halves' digest when the row "
+        "has no id) and existing flip numbers are skipped, so the command can be re-run safely."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--quotes", type=Path, help="CSV or JSONL file with text, part_a, part_b and optional id.")
+        parser.add_argument("--slots", type=int, default=0, help="Number of flip slots to provision.")
+        parser.add_argument("--first-slot", type=int, default=1)
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--upsert", action="store_true")
+
+    def handle(self, *args, **options):
+        if not options["quotes"] and not options["slots"]:
+            raise CommandError("Nothing to do: pass --quotes and/or --slots.")
+
+        if options["quotes"]:
+            if options["quotes"].suffix not in (".csv", ".jsonl"):
+                raise CommandError("Quotes file must be .csv or .jsonl.")
+            start = time.perf_counter()
+            loaded = self.load_quotes(options["quotes"], options["chunk_size"], options["upsert"])
+            # bulk_create skips the post_save signal, so drop the cached catalogue here.
+            quote_pool.invalidate()
+            self.report("quotes", loaded, time.perf_counter() - start)
+
+        if options["slots"]:
+            start = time.perf_counter()
+            created = self.create_slots(
+                options["first_slot"], options["slots"], options["chunk_size"], options["upsert"]
+            )
+            self.report("flip slots", created, time.perf_counter() - start)
+
+    def report(self, label, count, elapsed):
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"Loaded {count} {label} in {elapsed:.2f}s ({rate:.0f}/s)"))
+
+    def load_quotes(self, path, chunk_size, upsert):
+        loaded = 0
+        for chunk in chunked(read_quotes(path), chunk_size):
+            quotes = [build_quote(row) for row in chunk]
+            with transaction.atomic():
+                if upsert:
+                    keyed = [quote for quote in quotes if quote.id is not None]
+                    Quote.objects.bulk_create(
+                        keyed, update_conflicts=True, unique_fields=["id"], update_fields=QUOTE_FIELDS
+                    )
+                    self.upsert_by_digest([quote for quote in quotes if quote.id is None])
+                else:
+                    Quote.objects.bulk_create(quotes)
+            loaded += len(quotes)
+
+        # Rows inserted with explicit ids leave PostgreSQL's id sequence behind.
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Quote]):
+                cursor.execute(sql)
+        return loaded
+
+    def upsert_by_digest(self, quotes):
+        # digest is not unique (the catalogue may hold a quote twice), so no ON CONFLICT:
+        # one lookup per chunk, then update the oldest match or insert
+        by_digest = {quote.digest: quote for quote in quotes}
+        stored = Quote.objects.filter(digest__in=by_digest).order_by("-id").values_list("digest", "id")
+        now = timezone.now()
+        for digest, quote_id in dict(stored).items():
+            by_digest[digest].id = quote_id
+            by_digest[digest].updated_at = now
+        Quote.objects.bulk_update(
+            [quote for quote in by_digest.values() if quote.id is not None], ["text", "part_a", "part_b", "updated_at"]
+        )
+        Quote.objects.bulk_create([quote for quote in by_digest.values() if quote.id is None])
+
+    def create_slots(self, first, count, chunk_size, upsert):
+        created = 0
+        for low in range(first, first + count, chunk_size):
+            numbers = range(low, min(low + chunk_size, first + count))
+            if upsert:
+                existing = set(
+                    GridFlipLog.objects.filter(flip_number__range=(numbers[0], numbers[-1]))
+                    .values_list("flip_number", flat=True)
+                )
+                numbers = [n for n in numbers if n not in existing]
+            GridFlipLog.objects.bulk_create(
+                GridFlipLog(flip_number=n, player1="", player2="") for n in numbers
+            )
+            created += len(numbers)
+        return created
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from game.history import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild GridFlipLog and group points from the latest flip snapshot and the pairing events after it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report the differences without writing them.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        summary = rebuild(dry_run=options["dry_run"])
+        prefix = "would have " if options["dry_run"] else ""
+        self.stdout.write(
+            f"replayed through event {summary['last_event']} in {time.perf_counter() - start:.2f}s; "
+            f"{prefix}rewritten {summary['flips_changed']} flip slots, {prefix}created {summary['flips_created']}, "
+            f"{prefix}reset {summary['groups_changed']} group totals"
+        )
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections
+
+from game.replication import drain_outbox, outbox_lag, replica_database
+
+
+class Command(BaseCommand):
+    help = "Drain the flip outbox into the replica database in batches, with retries and lag reporting."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--interval", type=float, default=0.5, help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument("--max-backoff", type=float, default=30.0)
+        parser.add_argument("--once", action="store_true", help="Drain what is queued now and exit.")
+
+    def handle(self, *args, **options):
+        replica = replica_database()
+        if not replica:
+            raise CommandError("GAME_REPLICA_DATABASE is not set.")
+
+        backoff = options["interval"]
+        while True:
+            try:
+                shipped = drain_outbox(options["batch_size"], replica=replica)
+            except DatabaseError as exc:
+                pending, lag = self.lag()
+                self.stderr.write(f"replica write failed ({exc}); {pending} pending, lag {lag:.1f}s, retry in {backoff:.1f}s")
+                close_old_connections()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, options["max_backoff"])
+                continue
+
+            backoff = options["interval"]
+            if shipped:
+                pending, lag = self.lag()
+                self.stdout.write(f"shipped {shipped}; {pending} pending, lag {lag:.1f}s")
+                continue
+
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
+
+    def lag(self):
+        try:
+            return outbox_lag()
+        except DatabaseError:
+            return -1, float("nan")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from game.history import SNAPSHOT_SETTLE, take_snapshot
+
+
+class Command(BaseCommand):
+    help = "Fold settled pairing events into a new flip snapshot, so replays start from it."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--settle", type=float, default=SNAPSHOT_SETTLE,
+            help="Seconds an event must be old before it goes into a snapshot.",
+        )
+
+    def handle(self, *args, **options):
+        snapshot = take_snapshot(options["settle"])
+        if snapshot is None:
+            self.stdout.write("no settled events since the last snapshot")
+            return
+        self.stdout.write(
+            f"snapshot #{snapshot.id}: {len(snapshot.flips)} active flips, "
+            f"{len(snapshot.points)} groups, through event {snapshot.last_event}"
+        )
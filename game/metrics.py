@@ -0,0 +1,191 @@
+"""
+In-process request metrics, rendered in the Prometheus text format by the
+metrics view.
+
+MetricsMiddleware times every request and reads the per-request query count
+and DB time that record_query collects. record_query is installed as an
+execute wrapper on each connection as it is opened (game/signals.py), so it
+also sees the queries async views run in sync_to_async threads. Each worker
+process keeps its own histograms; scrape every worker, or sum them in
+Prometheus.
+"""
+import bisect
+import contextvars
+import cProfile
+import io
+import logging
+import pstats
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+BYTES_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = (
+    # name, help, buckets, RequestMetrics attribute
+    ("game_request_seconds", "Wall time of the request through the whole middleware stack.", SECONDS_BUCKETS, "elapsed"),
+    ("game_request_db_seconds", "Time spent executing SQL during the request.", SECONDS_BUCKETS, "db_time"),
+    ("game_request_queries", "SQL statements executed during the request.", QUERY_BUCKETS, "queries"),
+    ("game_response_bytes", "Response body size; 0 for streaming responses.", BYTES_BUCKETS, "size"),
+)
+
+_current = contextvars.ContextVar("game_request_metrics", default=None)
+
+
+class RequestMetrics:
+    __slots__ = ("queries", "db_time", "elapsed", "size")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.elapsed = 0.0
+        self.size = 0
+
+
+def record_query(execute, sql, params, many, context):
+    current = _current.get()
+    if current is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        current.db_time += time.perf_counter() - start
+        current.queries += 1
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is a bisect and three additions."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}  # view -> {histogram name: Histogram}
+        self._responses = {}  # (view, status) -> count
+
+    def begin(self):
+        metrics = RequestMetrics()
+        return metrics, _current.set(metrics)
+
+    def end(self, token):
+        _current.reset(token)
+
+    def observe(self, view, status_code, metrics):
+        with self._lock:
+            histograms = self._views.get(view)
+            if histograms is None:
+                histograms = self._views[view] = {
+                    name: Histogram(buckets) for name, _, buckets, _ in HISTOGRAMS
+                }
+            for name, _, _, attribute in HISTOGRAMS:
+                histograms[name].observe(getattr(metrics, attribute))
+            key = (view, status_code)
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+            self._responses.clear()
+
+    def render(self):
+        with self._lock:
+            views = sorted(self._views.items())
+            responses = sorted(self._responses.items())
+            lines = []
+            for name, help_text, _, _ in HISTOGRAMS:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for view, histograms in views:
+                    histogram = histograms[name]
+                    for bound, total in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {total}')
+                    lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+
+            lines.append("# HELP game_responses_total Responses by view and status code.")
+            lines.append("# TYPE game_responses_total counter")
+            for (view, status_code), count in responses:
+                lines.append(f'game_responses_total{{view="{view}",status="{status_code}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class SlowRequestProfiler:
+    """
+    Profiles a GAME_METRICS_PROFILE_RATE share of sync requests with cProfile
+    and keeps the profile when the request took longer than
+    GAME_METRICS_PROFILE_THRESHOLD seconds: dumped as a .prof file under
+    GAME_METRICS_PROFILE_DIR, or logged as the top functions by cumulative
+    time. One request is profiled at a time per process. Off by default.
+    """
+
+    def __init__(self):
+        self._busy = threading.Lock()
+        self._counter = 0
+
+    def start(self):
+        rate = getattr(settings, "GAME_METRICS_PROFILE_RATE", 0)
+        if not rate:
+            return None
+        # Every 1/rate-th request, without a random draw per request
+        self._counter += 1
+        if self._counter % max(1, round(1 / rate)):
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is active
+            self._busy.release()
+            return None
+        return profiler
+
+    def finish(self, profiler, view, elapsed):
+        profiler.disable()
+        try:
+            if elapsed < getattr(settings, "GAME_METRICS_PROFILE_THRESHOLD", 0.25):
+                return
+            directory = getattr(settings, "GAME_METRICS_PROFILE_DIR", None)
+            if directory:
+                path = Path(directory) / f"{view.replace(':', '-')}-{time.time():.0f}-{id(profiler):x}.prof"
+                profiler.dump_stats(path)
+                logger.warning("Slow request to %s (%.0f ms), profile written to %s", view, elapsed * 1000, path)
+            else:
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+                logger.warning("Slow request to %s (%.0f ms):\n%s", view, elapsed * 1000, out.getvalue())
+        finally:
+            self._busy.release()
+
+
+slow_request_profiler = SlowRequestProfiler()
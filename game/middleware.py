@@ -0,0 +1,97 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import metrics, slow_request_profiler
+from .routers import allow_replica_reads, begin_request, end_request
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Opens the per-request routing state for ReadReplicaRouter and marks GET/HEAD
+    requests to the views named in GAME_REPLICA_READ_VIEWS as replica-safe.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = begin_request()
+        try:
+            return self.get_response(request)
+        finally:
+            end_request(token)
+
+    async def __acall__(self, request):
+        token = begin_request()
+        try:
+            return await self.get_response(request)
+        finally:
+            end_request(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in SAFE_METHODS and request.resolver_match is not None:
+            if request.resolver_match.url_name in getattr(settings, "GAME_REPLICA_READ_VIEWS", ()):
+                allow_replica_reads()
+
+
+class MetricsMiddleware:
+    """
+    Records wall time, DB time, query count and response size per view into
+    game.metrics. Put it first in MIDDLEWARE so the time covers the whole
+    stack. Sync requests may also be sampled by the slow-request profiler.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        current, token = metrics.begin()
+        profiler = slow_request_profiler.start()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current.elapsed = time.perf_counter() - start
+            metrics.end(token)
+            if profiler is not None:
+                slow_request_profiler.finish(profiler, view_label(request), current.elapsed)
+        self.observe(request, response, current)
+        return response
+
+    async def __acall__(self, request):
+        current, token = metrics.begin()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.elapsed = time.perf_counter() - start
+            metrics.end(token)
+        self.observe(request, response, current)
+        return response
+
+    def observe(self, request, response, current):
+        current.size = 0 if response.streaming else len(response.content)
+        metrics.observe(view_label(request), response.status_code, current)
+
+
+def view_label(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "unresolved"
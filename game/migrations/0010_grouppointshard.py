@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0009_alter_gridfliplog_flip_number_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupPointShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('points', models.IntegerField(default=0)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='point_shards', to='game.group')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('group', 'shard'), name='unique_group_point_shard')],
+            },
+        ),
+    ]
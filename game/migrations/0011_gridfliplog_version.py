@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:25
+
+from django.db import migrations, models
+from django.db.models import F
+
+VERSION_SEQUENCE = 'game_gridfliplog_version_seq'
+
+
+def create_version_sequence(apps, schema_editor):
+    GridFlipLog = apps.get_model('game', 'GridFlipLog')
+    GridFlipLog.objects.using(schema_editor.connection.alias).filter(is_status=True).update(version=F('id'))
+
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'CREATE SEQUENCE IF NOT EXISTS {VERSION_SEQUENCE}')
+        schema_editor.execute(
+            f"SELECT setval('{VERSION_SEQUENCE}', GREATEST(COALESCE(MAX(version), 0), 1)) FROM game_gridfliplog"
+        )
+
+
+def drop_version_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP SEQUENCE IF EXISTS {VERSION_SEQUENCE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0010_grouppointshard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gridfliplog',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(create_version_sequence, drop_version_sequence),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0011_gridfliplog_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gridfliplog',
+            index=models.Index(condition=models.Q(('is_status', False)), fields=['flip_number'], name='gridfliplog_free_slot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gridfliplog',
+            index=models.Index(condition=models.Q(('is_status', True)), fields=['player1'], name='gridfliplog_active_p1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gridfliplog',
+            index=models.Index(condition=models.Q(('is_status', True)), fields=['player2'], name='gridfliplog_active_p2_idx'),
+        ),
+    ]
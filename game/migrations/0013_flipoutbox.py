@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0012_gridfliplog_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlipOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('flip_number', models.IntegerField()),
+                ('player1', models.CharField(max_length=50)),
+                ('player2', models.CharField(max_length=50)),
+                ('is_status', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+        ),
+    ]
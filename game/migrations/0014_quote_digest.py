@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+from game.models import quote_digest
+
+
+def backfill_digests(apps, schema_editor):
+    Quote = apps.get_model('game', 'Quote')
+    db = schema_editor.connection.alias
+    batch = []
+    for quote in Quote.objects.using(db).only('id', 'part_a', 'part_b').iterator(chunk_size=2000):
+        quote.digest = quote_digest(quote.part_a, quote.part_b)
+        batch.append(quote)
+        if len(batch) == 2000:
+            Quote.objects.using(db).bulk_update(batch, ['digest'])
+            batch = []
+    Quote.objects.using(db).bulk_update(batch, ['digest'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0013_flipoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quote',
+            name='digest',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=16),
+        ),
+        migrations.RunPython(backfill_digests, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def baseline_snapshot(apps, schema_editor):
+    # Flips and points from before the event table existed, as the starting point for replays
+    GridFlipLog = apps.get_model('game', 'GridFlipLog')
+    Group = apps.get_model('game', 'Group')
+    GroupPointShard = apps.get_model('game', 'GroupPointShard')
+    FlipSnapshot = apps.get_model('game', 'FlipSnapshot')
+    db = schema_editor.connection.alias
+
+    flips = [
+        list(row) for row in GridFlipLog.objects.using(db).filter(is_status=True)
+        .order_by('flip_number').values_list('flip_number', 'player1', 'player2')
+    ]
+    points = {str(group_id): total for group_id, total in Group.objects.using(db).values_list('id', 'points')}
+    shards = GroupPointShard.objects.using(db).values('group_id').annotate(total=Sum('points'))
+    for row in shards:
+        points[str(row['group_id'])] = points.get(str(row['group_id']), 0) + row['total']
+    FlipSnapshot.objects.using(db).create(last_event=0, flips=flips, points=points)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0014_quote_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlipSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_event', models.BigIntegerField()),
+                ('flips', models.JSONField(default=list)),
+                ('points', models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PairingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('flip_number', models.IntegerField()),
+                ('player1', models.CharField(max_length=50)),
+                ('player2', models.CharField(max_length=50)),
+                ('points1', models.SmallIntegerField(default=0)),
+                ('points2', models.SmallIntegerField(default=0)),
+                ('group1', models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='game.group')),
+                ('group2', models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='game.group')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['occurred_at'], name='pairingevent_time_idx')],
+            },
+        ),
+        migrations.RunPython(baseline_snapshot, migrations.RunPython.noop),
+    ]
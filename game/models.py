@@ -1,7 +1,21 @@
+import hashlib
+import re
+
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 
+
+def quote_digest(part_a, part_b):
+    """
+    16-hex-digit digest of a quote's two halves, ignoring case and spacing.
+    Quote rows with equal digests hold the same halves, so a player holding
+    A of one and a player holding B of the other are a valid pair.
+    """
+    normalized = "\x1f".join(re.sub(r"\s+", " ", part).strip().casefold() for part in (part_a, part_b))
+    return hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
+
 class Group(models.Model):
     name = models.CharField(max_length=100, unique=True)
     points = models.IntegerField(default=0)
@@ -9,10 +23,36 @@ class Group(models.Model):
     def __str__(self):
         return self.name
 
+class GroupPointShard(models.Model):
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name="point_shards")
+    shard = models.PositiveSmallIntegerField()
+    points = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["group", "shard"], name="unique_group_point_shard"),
+        ]
+
+    def __str__(self):
+        return f"{self.group_id}/{self.shard}: {self.points}"
+
 class Quote(models.Model):
     text = models.TextField()
     part_a = models.CharField(max_length=255)
     part_b = models.CharField(max_length=255)
+    # quote_digest(part_a, part_b); set by save(), bulk loaders set it themselves
+    digest = models.CharField(max_length=16, db_index=True, blank=True, default="")
+    # Watermark the quote pool re-checks (see game/quote_pool.py); bulk_update() leaves it to the caller
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def save(self, *args, **kwargs):
+        self.digest = quote_digest(self.part_a, self.part_b)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "updated_at"}
+            if {"part_a", "part_b"} & set(update_fields):
+                kwargs["update_fields"].add("digest")
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Quote #{self.id}: {self.text[:50]}"
@@ -56,12 +96,82 @@ class GridFlipLog(models.Model):
     player2 = models.CharField(max_length=50)
     flip_number = models.IntegerField()
     is_status = models.BooleanField(default=False)
+    # Bumped from a sequence whenever the row changes; drives active-flips?since=
+    version = models.BigIntegerField(default=0, db_index=True)
+
+    class Meta:
+        indexes = [
+            # "first free slot" in claim_flip_slot
+            models.Index(fields=["flip_number"], condition=models.Q(is_status=False), name="gridfliplog_free_slot_idx"),
+            # "is either player already paired" among active flips
+            models.Index(fields=["player1"], condition=models.Q(is_status=True), name="gridfliplog_active_p1_idx"),
+            models.Index(fields=["player2"], condition=models.Q(is_status=True), name="gridfliplog_active_p2_idx"),
+        ]
  #flipped_at = models.DateTimeField(auto_now_add=True)
 
     # def __str__(self):
     #     return f"Flip #{self.flip_number} at {self.flipped_at.strftime('%Y-%m-%d %H:%M:%S')}"
     
     
+class PairingEvent(models.Model):
+    """
+    Append-only history of flip claims, written in the claiming transaction
+    (see game/history.py). points1/points2 are the points awarded to
+    group1/group2; a same-group pair has all of them on points1.
+    """
+    occurred_at = models.DateTimeField(default=timezone.now)
+    flip_number = models.IntegerField()
+    player1 = models.CharField(max_length=50)
+    player2 = models.CharField(max_length=50)
+    # No FK constraint or cascade: history outlives a deleted group
+    group1 = models.ForeignKey(
+        Group, null=True, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name="+"
+    )
+    group2 = models.ForeignKey(
+        Group, null=True, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name="+"
+    )
+    points1 = models.SmallIntegerField(default=0)
+    points2 = models.SmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Time-windowed stats are a range scan of this; per-group breakdowns
+            # aggregate the window's rows rather than walk a per-group index
+            models.Index(fields=["occurred_at"], name="pairingevent_time_idx"),
+        ]
+
+    def __str__(self):
+        return f"Event #{self.id}: flip {self.flip_number} {self.player1} + {self.player2}"
+
+
+class FlipSnapshot(models.Model):
+    """
+    The grid and group points after every PairingEvent up to last_event, so a
+    replay only folds in the events after it.
+    """
+    taken_at = models.DateTimeField(default=timezone.now)
+    last_event = models.BigIntegerField()
+    flips = models.JSONField(default=list)  # [[flip_number, player1, player2], ...]
+    points = models.JSONField(default=dict)  # {group_id: points}
+
+    def __str__(self):
+        return f"Snapshot #{self.id} at event {self.last_event}"
+
+
+class FlipOutbox(models.Model):
+    """Flip claims waiting to be copied to the replica database (see game/replication.py)."""
+    flip_number = models.IntegerField()
+    player1 = models.CharField(max_length=50)
+    player2 = models.CharField(max_length=50)
+    is_status = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Outbox #{self.id}: flip {self.flip_number}"
+
+
 # DB model only for frontend
 # models_frontend.py
 class FrontendQuotePair(models.Model):
@@ -0,0 +1,260 @@
+import threading
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Max
+
+from .assignment import OTHER_PART
+from .models import GridFlipLog, Player, quote_digest
+from .quote_pool import quote_pool
+
+CATCH_UP_BATCH = 5000
+PLAYER_COLUMNS = ("id", "diary_id", "quote_id", "quote_part", "quote__digest")
+
+
+def half_key(quote_id, digest, part):
+    """
+    A quote half as (quote, part), where quotes with equal digests are one
+    quote, as for halves_match(). A quote without a digest is its id.
+    """
+    return (digest or quote_id, part)
+
+
+class PartnerIndex:
+    """
+    Unpaired players by the half they hold, so a player's partners are found
+    with two dict lookups instead of a query.
+
+    Every half (see half_key) maps to the unpaired diaries holding it, in
+    registration order. Halves are filed by quote digest, so holders of
+    duplicate catalogue rows are offered to each other just as
+    verify-quote-pair accepts them. This process keeps the index exact
+    through the Player signals, register_players() and pairing_completed.
+    Registrations and pairings made by other workers come in by refresh(), at
+    most every GAME_PARTNER_INDEX_POLL seconds. It reads Player rows past the
+    highest id seen and flips past the highest GridFlipLog.version seen,
+    which are both index range scans. Flip versions become visible in commit
+    order (see flips.stamp_version), but Player ids do not: an id skipped by
+    the cursor may belong to a registration still in flight, so skipped ids
+    are looked up again on each catch-up until they show up or are
+    GAME_PARTNER_INDEX_GAP_TIMEOUT seconds old.
+
+    Player is read in full only on first use. When the quote pool's
+    generation changes, the remembered digests are dropped and recomputed
+    from the pool; players whose quote was edited are re-filed as they are
+    looked up or offered as partners.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._halves = {}  # diary_id -> (quote_id, part)
+        self._keys = {}  # diary_id -> half_key it is filed under
+        self._waiting = {}  # half_key -> {unpaired diary_id: None}, oldest first
+        self._digests = {}  # quote_id -> digest, for the current pool generation
+        self._paired = set()
+        self._player_cursor = 0
+        self._player_gaps = {}  # Player id skipped by the cursor -> monotonic time it was skipped
+        self._flip_cursor = 0
+        self._pool_generation = None
+        self._refreshed_at = None
+
+    def load_rows(self, players, paired=()):
+        """Reset to (diary_id, quote_id, part, digest) rows and the diaries holding an active flip."""
+        with self._lock:
+            self._halves, self._keys, self._waiting, self._digests = {}, {}, {}, {}
+            self._paired = set(paired)
+            for diary_id, quote_id, part, digest in players:
+                self.add(diary_id, quote_id, part, digest)
+
+    def load(self):
+        generation = quote_pool.generation()
+        with self._lock:
+            # Cursor first: flips claimed while loading are replayed by the next catch-up
+            flip_cursor = GridFlipLog.objects.aggregate(version=Max("version"))["version"] or 0
+            paired = set()
+            for player1, player2 in GridFlipLog.objects.filter(is_status=True).values_list("player1", "player2"):
+                paired.update((player1, player2))
+
+            rows = []
+            self._player_cursor, self._player_gaps = 0, {}
+            players = Player.objects.order_by("id").values_list(*PLAYER_COLUMNS)
+            for player_id, diary_id, quote_id, part, digest in players.iterator(chunk_size=CATCH_UP_BATCH):
+                rows.append((diary_id, quote_id, part, digest))
+                self._advance_player_cursor(player_id)
+
+            self.load_rows(rows, paired)
+            self._flip_cursor = flip_cursor
+            self._pool_generation = generation
+            self._refreshed_at = time.monotonic()
+
+    def refresh(self):
+        """Load on first use, else catch up on other workers' changes."""
+        if self._refreshed_at is None:
+            with self._lock:
+                if self._refreshed_at is None:
+                    self.load()
+                    return
+        generation = quote_pool.generation()
+        if generation != self._pool_generation:
+            with self._lock:
+                self._digests = {}
+                self._pool_generation = generation
+        poll = getattr(settings, "GAME_PARTNER_INDEX_POLL", 1)
+        refreshed_at = self._refreshed_at
+        if refreshed_at is not None and time.monotonic() - refreshed_at < poll:
+            return
+        with self._lock:
+            if self._refreshed_at is None:
+                self.load()
+            elif time.monotonic() - self._refreshed_at >= poll:
+                self._catch_up()
+                self._refreshed_at = time.monotonic()
+
+    def _advance_player_cursor(self, player_id):
+        # A jump wider than a batch is a sequence gap, not registrations in flight
+        if player_id - self._player_cursor <= CATCH_UP_BATCH:
+            skipped_at = time.monotonic()
+            for missing in range(self._player_cursor + 1, player_id):
+                self._player_gaps[missing] = skipped_at
+        self._player_cursor = player_id
+
+    def _catch_up(self):
+        if self._player_gaps:
+            late = Player.objects.filter(id__in=list(self._player_gaps)).values_list(*PLAYER_COLUMNS)
+            for player_id, diary_id, quote_id, part, digest in late:
+                self.add(diary_id, quote_id, part, digest)
+                del self._player_gaps[player_id]
+            # Rolled back, or lost to a conflict in bulk_create(ignore_conflicts=True)
+            expired = time.monotonic() - getattr(settings, "GAME_PARTNER_INDEX_GAP_TIMEOUT", 60)
+            self._player_gaps = {
+                player_id: skipped_at for player_id, skipped_at in self._player_gaps.items() if skipped_at > expired
+            }
+
+        while True:
+            batch = list(
+                Player.objects.filter(id__gt=self._player_cursor)
+                .order_by("id")
+                .values_list(*PLAYER_COLUMNS)[:CATCH_UP_BATCH]
+            )
+            for player_id, diary_id, quote_id, part, digest in batch:
+                self.add(diary_id, quote_id, part, digest)
+                self._advance_player_cursor(player_id)
+            if len(batch) < CATCH_UP_BATCH:
+                break
+
+        while True:
+            batch = list(
+                GridFlipLog.objects.filter(version__gt=self._flip_cursor)
+                .order_by("version")
+                .values_list("player1", "player2", "is_status", "version")[:CATCH_UP_BATCH]
+            )
+            for player1, player2, is_status, version in batch:
+                if is_status:
+                    self.mark_paired((player1, player2))
+                else:
+                    self.mark_unpaired((player1, player2))
+                self._flip_cursor = version
+            if len(batch) < CATCH_UP_BATCH:
+                break
+
+    def _digest(self, quote_id):
+        digest = self._digests.get(quote_id)
+        if digest is None:
+            row = quote_pool.get(quote_id)
+            digest = self._digests[quote_id] = quote_digest(row[2], row[3]) if row is not None else ""
+        return digest
+
+    def _file(self, diary_id):
+        """File a player under its half's current key and return the key."""
+        quote_id, part = self._halves[diary_id]
+        key = half_key(quote_id, self._digest(quote_id), part)
+        old = self._keys.get(diary_id)
+        if old != key:
+            if old is not None:
+                self._unwait(old, diary_id)
+            self._keys[diary_id] = key
+            if diary_id not in self._paired:
+                self._waiting.setdefault(key, {})[diary_id] = None
+        return key
+
+    def add(self, diary_id, quote_id, part, digest=None):
+        """Record (or move) a player's half; idempotent. `digest` is the quote's stored digest, if known."""
+        with self._lock:
+            if digest is not None:
+                self._digests[quote_id] = digest
+            self._halves[diary_id] = (quote_id, part)
+            self._file(diary_id)
+
+    def _unwait(self, key, diary_id):
+        waiting = self._waiting.get(key)
+        if waiting is not None and diary_id in waiting:
+            del waiting[diary_id]
+            if not waiting:
+                del self._waiting[key]
+
+    def remove(self, diary_id):
+        with self._lock:
+            self._halves.pop(diary_id, None)
+            key = self._keys.pop(diary_id, None)
+            if key is not None:
+                self._unwait(key, diary_id)
+            self._paired.discard(diary_id)
+
+    def mark_paired(self, diary_ids):
+        with self._lock:
+            for diary_id in diary_ids:
+                if not diary_id:
+                    continue
+                self._paired.add(diary_id)
+                key = self._keys.get(diary_id)
+                if key is not None:
+                    self._unwait(key, diary_id)
+
+    def mark_unpaired(self, diary_ids):
+        with self._lock:
+            for diary_id in diary_ids:
+                if diary_id not in self._paired:
+                    continue
+                self._paired.discard(diary_id)
+                key = self._keys.get(diary_id)
+                if key is not None:
+                    self._waiting.setdefault(key, {})[diary_id] = None
+
+    def lookup(self, diary_id, limit=10):
+        """
+        (quote_id, part, paired, partners) for a known diary, or None.
+        partners are up to `limit` unpaired holders of the other half, oldest first.
+        """
+        with self._lock:
+            if diary_id not in self._halves:
+                return None
+            quote_id, part = self._halves[diary_id]
+            key = self._file(diary_id)
+            if diary_id in self._paired:
+                return quote_id, part, True, []
+            other = (key[0], OTHER_PART[part])
+            partners = []
+            waiting = self._waiting.get(other, {})
+            while len(partners) < limit:
+                # The partners found so far lead the dict; candidates re-filed
+                # elsewhere (their quote was edited since) have left it.
+                candidates = list(islice(waiting, len(partners), limit))
+                if not candidates:
+                    break
+                partners.extend(candidate for candidate in candidates if self._file(candidate) == other)
+            return quote_id, part, False, partners
+
+    def stats(self):
+        with self._lock:
+            return {
+                "players": len(self._halves),
+                "paired": len(self._paired),
+                "waiting": sum(len(diaries) for diaries in self._waiting.values()),
+            }
+
+    def invalidate(self):
+        self._refreshed_at = None
+
+
+partner_index = PartnerIndex()
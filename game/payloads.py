@@ -0,0 +1,46 @@
+"""
+Pre-encoded JSON for the quote fields every hot response repeats.
+
+A quote's strings are JSON-encoded once, when the quote pool loads it, and
+responses are assembled by splicing those bytes; only the per-request values
+(diary number, part type, group name) are encoded per call. The output is
+the same compact JSON DRF's JSONRenderer produces.
+"""
+import json
+
+
+def encode(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class QuotePayload:
+    __slots__ = ("id", "text", "part_a", "part_b", "public")
+
+    def __init__(self, quote_id, text, part_a, part_b):
+        self.id = encode(quote_id)
+        self.text = encode(text)
+        self.part_a = encode(part_a)
+        self.part_b = encode(part_b)
+        # Same document QuoteSerializer renders
+        self.public = b'{"id":%s,"text":%s,"part_a":%s,"part_b":%s}' % (self.id, self.text, self.part_a, self.part_b)
+
+    def part(self, part_type):
+        return self.part_b if part_type == "B" else self.part_a
+
+
+def quote_part_body(diary_number, payload, part_type):
+    """get_quote_part response."""
+    return (
+        b'{"diary_number":%s,"quote_id":%s,"quote_text":%s,"quote_part":%s,'
+        b'"part_text":%s,"part_a":%s,"part_b":%s}'
+        % (encode(diary_number), payload.id, payload.text, encode(part_type),
+           payload.part(part_type), payload.part_a, payload.part_b)
+    )
+
+
+def registration_body(diary_number, payload, part_type, group_name):
+    """DiaryEntryView response."""
+    return (
+        b'{"diary_number":%s,"part":%s,"quote":%s,"part_type":%s,"group":%s}'
+        % (encode(diary_number), payload.part(part_type), payload.text, encode(part_type), encode(group_name))
+    )
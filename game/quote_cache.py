@@ -0,0 +1,146 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+DEFAULT_SETTINGS = {
+    "BACKEND": "game.quote_cache.LocalLRUBackend",
+    "OPTIONS": {"max_entries": 50_000},
+}
+
+
+class LocalLRUBackend:
+    """Per-process LRU. Fastest, but only consistent within one worker process."""
+
+    def __init__(self, max_entries=50_000):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aset(self, key, value):
+        self.set(key, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SharedCacheBackend:
+    """
+    Stores entries in a Django cache alias (e.g. Redis or Memcached) so every
+    worker sees the same invalidations. Bounding is left to the cache server.
+    clear() bumps a generation that is part of every key.
+    """
+
+    def __init__(self, alias="default", prefix="game:quote_part", timeout=None):
+        self._cache = caches[alias]
+        self._prefix = prefix
+        self._timeout = timeout
+
+    def _generation(self):
+        generation = self._cache.get(f"{self._prefix}:generation")
+        if generation is None:
+            self._cache.add(f"{self._prefix}:generation", 1, timeout=None)
+            generation = self._cache.get(f"{self._prefix}:generation", 1)
+        return generation
+
+    async def _ageneration(self):
+        generation = await self._cache.aget(f"{self._prefix}:generation")
+        if generation is None:
+            await self._cache.aadd(f"{self._prefix}:generation", 1, timeout=None)
+            generation = await self._cache.aget(f"{self._prefix}:generation", 1)
+        return generation
+
+    def _key(self, key):
+        return f"{self._prefix}:{self._generation()}:{key}"
+
+    def get(self, key):
+        return self._cache.get(self._key(key))
+
+    def set(self, key, value):
+        self._cache.set(self._key(key), value, timeout=self._timeout)
+
+    async def aget(self, key):
+        return await self._cache.aget(f"{self._prefix}:{await self._ageneration()}:{key}")
+
+    async def aset(self, key, value):
+        await self._cache.aset(f"{self._prefix}:{await self._ageneration()}:{key}", value, timeout=self._timeout)
+
+    def delete(self, key):
+        self._cache.delete(self._key(key))
+
+    def clear(self):
+        try:
+            self._cache.incr(f"{self._prefix}:generation")
+        except ValueError:
+            self._cache.add(f"{self._prefix}:generation", 1, timeout=None)
+
+
+class QuotePartCache:
+    """
+    Read-through cache of rendered get_quote_part bodies keyed by diary id.
+
+    A player's half never changes after registration, so entries only go away
+    on Player saves/deletes and Quote edits (see game/signals.py). The backend
+    is chosen with settings.GAME_QUOTE_PART_CACHE.
+    """
+
+    def __init__(self):
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            config = getattr(settings, "GAME_QUOTE_PART_CACHE", DEFAULT_SETTINGS)
+            self._backend = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+        return self._backend
+
+    def get_or_load(self, diary_id, loader):
+        """Return the cached body, or call loader() and cache its result unless it is None."""
+        body = self.backend.get(diary_id)
+        if body is None:
+            body = loader()
+            if body is not None:
+                self.backend.set(diary_id, body)
+        return body
+
+    async def aget_or_load(self, diary_id, loader):
+        """get_or_load() for async views; loader is a coroutine function."""
+        body = await self.backend.aget(diary_id)
+        if body is None:
+            body = await loader()
+            if body is not None:
+                await self.backend.aset(diary_id, body)
+        return body
+
+    def invalidate(self, diary_id):
+        self.backend.delete(diary_id)
+
+    def clear(self):
+        self.backend.clear()
+
+
+quote_part_cache = QuotePartCache()
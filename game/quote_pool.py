@@ -0,0 +1,150 @@
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .generations import cache_is_local, needs_recheck
+from .models import Quote
+from .payloads import QuotePayload
+
+GENERATION_KEY = "game:quote_pool:generation"
+
+
+class QuotePool:
+    """
+    Process-level snapshot of the quote catalogue.
+
+    Only the columns the registration response needs are kept, as plain
+    (id, text, part_a, part_b) tuples, so picking a quote never builds model
+    instances or hits the DB once the pool is warm. Pre-encoded JSON for each
+    quote (see game/payloads.py) lives in the same snapshot, so it is
+    refreshed together with the rows. The Quote signals in
+    game/signals.py (and bulk loaders such as provision_grid) bump a
+    generation counter in the Django cache; any process that sees a newer
+    generation reloads on next use. A quote written without a bump (a
+    bulk_create, another worker racing the bump) is read from the database
+    on first lookup and added to the snapshot. With a per-process cache (see
+    game/generations.py) a change marker (row count, highest id and latest
+    updated_at, one aggregate over indexes) is also re-checked on a timer;
+    when it moved, the catalogue is re-read and the generation bumped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._generation = None
+        self._loaded_at = None
+        self._marker = None
+
+    def generation(self):
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            cache.add(GENERATION_KEY, 1, timeout=None)
+            generation = cache.get(GENERATION_KEY, 1)
+        return generation
+
+    # The snapshot is shared by every request of the process, writers included,
+    # so it is always read from the primary, never from a lagging replica.
+    def _rows(self):
+        return list(Quote.objects.using("default").order_by("id").values_list("id", "text", "part_a", "part_b"))
+
+    def _read_marker(self):
+        marker = Quote.objects.using("default").aggregate(count=Count("id"), last_id=Max("id"), updated_at=Max("updated_at"))
+        return marker["count"], marker["last_id"], marker["updated_at"]
+
+    def _load(self, generation):
+        with self._lock:
+            if self._snapshot is None or self._generation != generation:
+                # Marker first: a change made while the rows are read moves it again
+                marker = self._read_marker() if cache_is_local() else None
+                self._install(self._rows(), generation, marker)
+            return self._snapshot
+
+    def _install(self, rows, generation, marker):
+        self._snapshot = (rows, {row[0]: row for row in rows}, {})
+        self._generation = generation
+        self._marker = marker
+        self._loaded_at = time.monotonic()
+
+    def _recheck(self):
+        with self._lock:
+            if not needs_recheck(self._loaded_at):
+                return self._snapshot
+            marker = self._read_marker()
+            if marker == self._marker:
+                self._loaded_at = time.monotonic()
+            else:
+                # Changed in another process; the bump makes this process's dependents reload too
+                self._install(self._rows(), self._bump(), marker)
+            return self._snapshot
+
+    def _current(self):
+        generation = self.generation()
+        snapshot = self._snapshot
+        if snapshot is None or self._generation != generation:
+            snapshot = self._load(generation)
+        elif needs_recheck(self._loaded_at):
+            snapshot = self._recheck()
+        return snapshot
+
+    def all(self):
+        return self._current()[0]
+
+    def get(self, quote_id):
+        snapshot = self._current()
+        row = snapshot[1].get(quote_id)
+        return row if row is not None else self._fetch(snapshot, quote_id)
+
+    def payload(self, quote_id):
+        """Pre-encoded QuotePayload for a quote, built on first use per snapshot."""
+        snapshot = self._current()
+        payload = self._payload(snapshot, quote_id)
+        if payload is None and self._fetch(snapshot, quote_id) is not None:
+            payload = self._payload(snapshot, quote_id)
+        return payload
+
+    async def apayload(self, quote_id):
+        """payload() for async views; a stale snapshot or a missing quote is loaded in a worker thread."""
+        generation = await cache.aget(GENERATION_KEY)
+        snapshot = self._snapshot
+        if (generation is None or snapshot is None or self._generation != generation
+                or needs_recheck(self._loaded_at)):
+            snapshot = await sync_to_async(self._current)()
+        payload = self._payload(snapshot, quote_id)
+        if payload is None and await sync_to_async(self._fetch)(snapshot, quote_id) is not None:
+            payload = self._payload(snapshot, quote_id)
+        return payload
+
+    def _fetch(self, snapshot, quote_id):
+        # Not added to all(): the assignment engine picks new quotes up on the next bump
+        row = Quote.objects.using("default").filter(pk=quote_id).values_list("id", "text", "part_a", "part_b").first()
+        if row is not None:
+            snapshot[1][row[0]] = row
+        return row
+
+    def _payload(self, snapshot, quote_id):
+        _, by_id, payloads = snapshot
+        payload = payloads.get(quote_id)
+        if payload is None:
+            row = by_id.get(quote_id)
+            if row is None:
+                return None
+            payload = payloads[quote_id] = QuotePayload(*row)
+        return payload
+
+    def _bump(self):
+        try:
+            return cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.add(GENERATION_KEY, 1, timeout=None)
+            return cache.get(GENERATION_KEY, 1)
+
+    def invalidate(self):
+        self._bump()
+        with self._lock:
+            self._snapshot = None
+
+
+quote_pool = QuotePool()
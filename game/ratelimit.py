@@ -0,0 +1,212 @@
+"""
+Token-bucket rate limits per diary id and per client IP.
+
+Limits are set per endpoint in GAME_RATE_LIMITS as (requests per second,
+burst) for the "diary" and "ip" scopes. Each bucket is kept as a single
+timestamp, the time at which it would be full again (GCRA, which admits
+exactly what a token bucket of that rate and size admits). That keeps
+GAME_RATE_LIMIT_STORE's shared backend to one cache value per key. A
+request is admitted only when every bucket it names has room, and only then
+are its tokens taken, so a refused request costs the client nothing. The
+rate_limited decorator goes outermost on a view, so refused requests are
+answered with 429 and Retry-After before any ORM work.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+
+DEFAULT_STORE = {
+    "BACKEND": "game.ratelimit.LocalBucketStore",
+    "OPTIONS": {"max_keys": 100_000},
+}
+
+
+def admit(full_at, now, rate, burst):
+    """
+    (new full_at, retry_after) for one request against a bucket that is full
+    again at full_at (None for a new or full bucket); retry_after is 0 when
+    the request is admitted.
+    """
+    interval = 1 / rate
+    new_full_at = max(full_at or now, now) + interval
+    excess = new_full_at - now - burst * interval
+    if excess > 0:
+        return full_at, excess
+    return new_full_at, 0.0
+
+
+def admit_all(stored, buckets, now):
+    """
+    Run admit() for (key, rate, burst) buckets against `stored` (key ->
+    full_at) as one request: ({key: new full_at}, 0) when every bucket admits
+    it, else ({}, the longest retry_after).
+    """
+    updates, retry_after = {}, 0.0
+    for key, rate, burst in buckets:
+        full_at = updates[key] if key in updates else stored.get(key)
+        new_full_at, wait = admit(full_at, now, rate, burst)
+        if wait:
+            retry_after = max(retry_after, wait)
+        else:
+            updates[key] = new_full_at
+    return ({}, retry_after) if retry_after else (updates, 0.0)
+
+
+class LocalBucketStore:
+    """Per-process buckets; the least recently used are dropped (i.e. refilled) past max_keys."""
+
+    def __init__(self, max_keys=100_000):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # key -> full_at
+        self._max_keys = max_keys
+
+    def take(self, buckets):
+        now = time.monotonic()
+        with self._lock:
+            updates, retry_after = admit_all(self._buckets, buckets, now)
+            for key, full_at in updates.items():
+                self._buckets[key] = full_at
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+    async def atake(self, buckets):
+        return self.take(buckets)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    Buckets in a Django cache alias, shared by every worker. The read and
+    write are not atomic, so workers racing on one key can admit a few
+    requests over the limit; that is the price of not needing a script-capable
+    cache.
+    """
+
+    def __init__(self, alias="default", prefix="game:ratelimit"):
+        self._cache = caches[alias]
+        self._prefix = prefix
+
+    def _prefixed(self, buckets):
+        return [(f"{self._prefix}:{key}", rate, burst) for key, rate, burst in buckets]
+
+    @staticmethod
+    def _timeout(updates, now):
+        # Buckets expire once full; one timeout covers all of a request's keys
+        return math.ceil(max(updates.values()) - now) + 1
+
+    def take(self, buckets):
+        buckets = self._prefixed(buckets)
+        now = time.time()
+        stored = self._cache.get_many([key for key, _, _ in buckets])
+        updates, retry_after = admit_all(stored, buckets, now)
+        if updates:
+            self._cache.set_many(updates, timeout=self._timeout(updates, now))
+        return retry_after
+
+    async def atake(self, buckets):
+        buckets = self._prefixed(buckets)
+        now = time.time()
+        stored = await self._cache.aget_many([key for key, _, _ in buckets])
+        updates, retry_after = admit_all(stored, buckets, now)
+        if updates:
+            await self._cache.aset_many(updates, timeout=self._timeout(updates, now))
+        return retry_after
+
+    def clear(self):
+        # Buckets expire once full; there is no prefix delete in the cache API
+        pass
+
+
+def client_ip(request):
+    # Behind a proxy, GAME_CLIENT_IP_HEADER names the META key it sets (e.g.
+    # HTTP_X_FORWARDED_FOR); the proxy appends the address it saw last
+    header = getattr(settings, "GAME_CLIENT_IP_HEADER", None)
+    if header and request.META.get(header):
+        return request.META[header].rsplit(",", 1)[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+class RateLimiter:
+    def __init__(self):
+        self._store = None
+
+    @property
+    def store(self):
+        if self._store is None:
+            config = getattr(settings, "GAME_RATE_LIMIT_STORE", DEFAULT_STORE)
+            self._store = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+        return self._store
+
+    def buckets(self, name, request, diary_ids):
+        """The (key, rate, burst) buckets a request to endpoint `name` takes a token from."""
+        limits = getattr(settings, "GAME_RATE_LIMITS", {}).get(name)
+        if not limits:
+            return []
+        buckets = []
+        if "ip" in limits:
+            buckets.append((f"{name}:ip:{client_ip(request)}", *limits["ip"]))
+        if "diary" in limits and diary_ids is not None:
+            for diary_id in diary_ids(request):
+                if diary_id:
+                    buckets.append((f"{name}:diary:{diary_id}", *limits["diary"]))
+        return buckets
+
+    def check(self, name, request, diary_ids=None):
+        """Seconds until the request would be admitted, or 0 if it is (and its tokens are taken)."""
+        buckets = self.buckets(name, request, diary_ids)
+        return self.store.take(buckets) if buckets else 0
+
+    async def acheck(self, name, request, diary_ids=None):
+        buckets = self.buckets(name, request, diary_ids)
+        return await self.store.atake(buckets) if buckets else 0
+
+    def clear(self):
+        self.store.clear()
+
+
+rate_limiter = RateLimiter()
+
+
+def too_many_requests(retry_after):
+    response = JsonResponse({"error": "Too many requests."}, status=429)
+    response["Retry-After"] = str(math.ceil(retry_after))
+    return response
+
+
+def rate_limited(name, diary_ids=None):
+    """
+    Apply GAME_RATE_LIMITS[name] to a sync or async view (or an APIView's
+    dispatch). diary_ids(request) returns the diary ids the request names.
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapped(request, *args, **kwargs):
+                retry_after = await rate_limiter.acheck(name, request, diary_ids)
+                if retry_after:
+                    return too_many_requests(retry_after)
+                return await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def wrapped(request, *args, **kwargs):
+                retry_after = rate_limiter.check(name, request, diary_ids)
+                if retry_after:
+                    return too_many_requests(retry_after)
+                return view(request, *args, **kwargs)
+        return wrapped
+
+    return decorator
@@ -0,0 +1,105 @@
+from .assignment import assignment_engine
+from .models import Group, Player
+from .partners import partner_index
+from .quote_pool import quote_pool
+
+
+def registration_payload(diary_number, quote_id, part_type, group_name):
+    """The body DiaryEntryView returns for one registered diary, or None if its quote has been deleted."""
+    row = quote_pool.get(quote_id)
+    if row is None:
+        return None
+    _, quote_text, part_a, part_b = row
+    return {
+        "diary_number": diary_number,
+        "part": part_b if part_type == "B" else part_a,
+        "quote": quote_text,
+        "part_type": part_type,
+        "group": group_name,
+    }
+
+
+def register_players(entries):
+    """
+    Register many (diary_number, group_name) entries with a fixed number of queries.
+
+    Groups are resolved in one query, already registered diaries in another,
+    and new players go in with a single bulk_create(ignore_conflicts=True).
+    A diary registered concurrently by someone else is reported as existing
+    and its assigned half is handed back to the assignment engine.
+
+    Returns one result dict per distinct diary, in input order, each with a
+    "status" of "created", "existing" or "error". A diary whose row or quote
+    is deleted while it is being registered is reported as an error.
+    """
+
+    def registered(diary_number, quote_id, part_type, group_name, status):
+        payload = registration_payload(diary_number, quote_id, part_type, group_name)
+        if payload is None:
+            return {"diary_number": diary_number, "status": "error", "error": "The assigned quote no longer exists."}
+        return dict(payload, status=status)
+
+    results = {}
+    wanted = {}
+    for index, (diary_number, group_name) in enumerate(entries):
+        diary_number = str(diary_number or "").strip()
+        group_name = str(group_name or "").strip()
+        if not diary_number or not group_name:
+            results[("invalid", index)] = {"diary_number": diary_number, "status": "error",
+                                           "error": "diary_number and group_name are required."}
+            continue
+        if diary_number not in results:
+            results[diary_number] = None
+            wanted[diary_number] = group_name
+
+    groups = Group.objects.in_bulk(set(wanted.values()), field_name="name")
+
+    existing = Player.objects.filter(diary_id__in=wanted).values_list("diary_id", "quote_id", "quote_part", "group__name")
+    for diary_number, quote_id, part_type, group_name in existing:
+        results[diary_number] = registered(diary_number, quote_id, part_type, group_name, "existing")
+        del wanted[diary_number]
+
+    new_players = []
+    for diary_number, group_name in wanted.items():
+        group = groups.get(group_name)
+        if group is None:
+            results[diary_number] = {"diary_number": diary_number, "status": "error",
+                                     "error": "Group does not exist. Please check the group name."}
+            continue
+        assignment = assignment_engine.assign()
+        if assignment is None:
+            results[diary_number] = {"diary_number": diary_number, "status": "error", "error": "No quotes available."}
+            continue
+        quote_id, part_type = assignment
+        new_players.append(Player(
+            diary_id=diary_number, quote_id=quote_id, quote_part=part_type, has_registered=True, group=group
+        ))
+
+    if new_players:
+        Player.objects.bulk_create(new_players, ignore_conflicts=True)
+
+        # ignore_conflicts does not say which rows went in; read back what is stored.
+        stored = {
+            diary_id: (quote_id, part_type, group_name)
+            for diary_id, quote_id, part_type, group_name in Player.objects.filter(
+                diary_id__in=[player.diary_id for player in new_players]
+            ).values_list("diary_id", "quote_id", "quote_part", "group__name")
+        }
+        for player in new_players:
+            if player.diary_id not in stored:
+                # Deleted (directly or with its quote) between the insert and the read-back.
+                # The half is not released here: the deletion's post_delete did.
+                results[player.diary_id] = {"diary_number": player.diary_id, "status": "error",
+                                            "error": "The registration was removed while it was being made."}
+                continue
+            quote_id, part_type, group_name = stored[player.diary_id]
+            status = "created"
+            if (quote_id, part_type) != (player.quote_id, player.quote_part):
+                assignment_engine.release(player.quote_id, player.quote_part)
+                status = "existing"
+            else:
+                # bulk_create sends no post_save
+                partner_index.add(player.diary_id, quote_id, part_type)
+            results[player.diary_id] = registered(player.diary_id, quote_id, part_type, group_name, status)
+
+    return list(results.values())
@@ -0,0 +1,90 @@
+import logging
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .models import FlipOutbox, GridFlipLog
+
+logger = logging.getLogger(__name__)
+
+
+def replica_database():
+    """Alias flips are mirrored to, or None when replication is off."""
+    return getattr(settings, "GAME_REPLICA_DATABASE", None)
+
+
+def enqueue_flip(flip_number, player1, player2, using="default"):
+    """Record a claim for the replica. Call inside the claiming transaction."""
+    if replica_database():
+        FlipOutbox.objects.using(using).create(flip_number=flip_number, player1=player1, player2=player2)
+
+
+def outbox_lag(using="default"):
+    """(pending rows, seconds since the oldest pending claim)."""
+    pending = FlipOutbox.objects.using(using).aggregate(count=Count("id"), oldest=Min("created_at"))
+    oldest = pending["oldest"]
+    return pending["count"], (timezone.now() - oldest).total_seconds() if oldest else 0.0
+
+
+def drain_outbox(batch_size=500, using="default", replica=None):
+    """
+    Copy the oldest batch of outbox rows to the replica and delete them.
+
+    Rows are applied in claim order, later rows for the same flip winning, in
+    one replica transaction. The batch is locked with SKIP LOCKED where
+    supported so two workers never ship the same rows. If the replica write
+    fails the rows stay queued with attempts/last_error updated, and the
+    error is re-raised for the caller to back off. Returns the rows shipped.
+    """
+    replica = replica or replica_database()
+    outbox = FlipOutbox.objects.using(using).order_by("id")
+    error = None
+
+    with transaction.atomic(using=using):
+        if connections[using].features.has_select_for_update_skip_locked:
+            outbox = outbox.select_for_update(skip_locked=True)
+        rows = list(outbox[:batch_size])
+        if not rows:
+            return 0
+
+        shipped = FlipOutbox.objects.using(using).filter(id__in=[row.id for row in rows])
+        try:
+            apply_to_replica(rows, replica)
+        except Exception as exc:
+            error = exc
+            shipped.update(attempts=F("attempts") + 1, last_error=str(exc)[:1000])
+        else:
+            shipped.delete()
+
+    if error is not None:
+        raise error
+
+    logger.debug("Replicated %d flip claims to %s", len(rows), replica)
+    return len(rows)
+
+
+def apply_to_replica(rows, replica):
+    latest = {}
+    for row in rows:
+        latest[row.flip_number] = row
+
+    with transaction.atomic(using=replica):
+        mirrored = {}
+        for flip in GridFlipLog.objects.using(replica).filter(flip_number__in=latest).order_by("id"):
+            mirrored.setdefault(flip.flip_number, flip)
+
+        updated, created = [], []
+        for flip_number, row in latest.items():
+            flip = mirrored.get(flip_number)
+            if flip is None:
+                created.append(GridFlipLog(
+                    flip_number=flip_number, player1=row.player1, player2=row.player2, is_status=row.is_status
+                ))
+            else:
+                flip.player1, flip.player2, flip.is_status = row.player1, row.player2, row.is_status
+                updated.append(flip)
+
+        GridFlipLog.objects.using(replica).bulk_update(updated, ["player1", "player2", "is_status"])
+        GridFlipLog.objects.using(replica).bulk_create(created)
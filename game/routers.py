@@ -0,0 +1,104 @@
+import contextvars
+import itertools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Per-request routing state, set by game.middleware.ReplicaRoutingMiddleware
+_routing = contextvars.ContextVar("game_db_routing", default=None)
+
+
+class RoutingState:
+    __slots__ = ("replica_ok", "wrote")
+
+    def __init__(self):
+        self.replica_ok = False
+        self.wrote = False
+
+
+def begin_request():
+    return _routing.set(RoutingState())
+
+
+def end_request(token):
+    _routing.reset(token)
+
+
+def allow_replica_reads():
+    state = _routing.get()
+    if state is not None:
+        state.replica_ok = True
+
+
+class ReplicaSet:
+    """
+    Round-robin over settings.GAME_READ_REPLICAS, skipping replicas whose
+    last health check failed. A replica is re-checked at most every
+    GAME_REPLICA_HEALTH_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._health = {}  # alias -> (healthy, checked_at)
+
+    def _healthy(self, alias):
+        interval = getattr(settings, "GAME_REPLICA_HEALTH_INTERVAL", 5)
+        healthy, checked_at = self._health.get(alias, (True, None))
+        now = time.monotonic()
+        if checked_at is not None and now - checked_at < interval:
+            return healthy
+
+        try:
+            connection = connections[alias]
+            connection.ensure_connection()
+            healthy = connection.is_usable()
+        except DatabaseError:
+            healthy = False
+        if not healthy:
+            logger.warning("Read replica %s failed its health check; reading from the primary", alias)
+        with self._lock:
+            self._health[alias] = (healthy, now)
+        return healthy
+
+    def pick(self):
+        replicas = getattr(settings, "GAME_READ_REPLICAS", [])
+        if not replicas:
+            return None
+        start = next(self._counter)
+        for offset in range(len(replicas)):
+            alias = replicas[(start + offset) % len(replicas)]
+            if self._healthy(alias):
+                return alias
+        return None
+
+
+replica_set = ReplicaSet()
+
+
+class ReadReplicaRouter:
+    """
+    Sends reads of read-only endpoints to a healthy replica.
+
+    Only requests ReplicaRoutingMiddleware marked as replica-safe are routed;
+    everything else, and any read after the request has written, stays on the
+    primary so a request always sees its own writes. Returning None leaves the
+    decision to Django, i.e. "default".
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or not state.replica_ok or state.wrote:
+            return None
+        return replica_set.pick()
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return None
@@ -0,0 +1,67 @@
+import random
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Group, GroupPointShard
+
+
+def point_shards():
+    """Number of counter shards per group; 0 or 1 scores straight onto Group.points."""
+    return getattr(settings, "GAME_POINT_SHARDS", 0)
+
+
+def pair_points(group1_id, group2_id):
+    """Points a completed pair earns, as {group_id: points}."""
+    if not group1_id or not group2_id:
+        return {}
+    if group1_id == group2_id:
+        return {group1_id: 2}
+    return {group1_id: 1, group2_id: 1}
+
+
+def award_points(deltas, using="default"):
+    """
+    Add points with UPDATE ... SET points = points + n, never read-modify-write.
+
+    With GAME_POINT_SHARDS > 1 each award lands on a random GroupPointShard row
+    of the group, so pairs finishing in the same large group stop queueing on
+    one Group row lock. Totals are Group.points plus the sum of its shards.
+    """
+    shards = point_shards()
+    # Fixed order so two transactions touching the same groups cannot deadlock
+    for group_id, points in sorted(deltas.items()):
+        if shards <= 1:
+            Group.objects.using(using).filter(pk=group_id).update(points=F("points") + points)
+            continue
+
+        shard = random.randrange(shards)
+        counter = GroupPointShard.objects.using(using).filter(group_id=group_id, shard=shard)
+        if counter.update(points=F("points") + points):
+            continue
+        try:
+            with transaction.atomic(using=using):
+                GroupPointShard.objects.using(using).create(group_id=group_id, shard=shard, points=points)
+        except IntegrityError:
+            # Another request created this shard first
+            counter.update(points=F("points") + points)
+
+
+def group_totals_by_id(using="default", group_ids=None):
+    """(id, name, points) per group, or per group in `group_ids`, in id order with shard counters folded in."""
+    groups = Group.objects.using(using)
+    if group_ids is not None:
+        groups = groups.filter(pk__in=list(group_ids))
+    return list(
+        groups
+        .annotate(total=F("points") + Coalesce(Sum("point_shards__points"), Value(0)))
+        .order_by("id")
+        .values_list("id", "name", "total")
+    )
+
+
+def group_totals(using="default"):
+    """[{"name": ..., "points": ...}] with shard counters folded in."""
+    return [{"name": name, "points": total} for _, name, total in group_totals_by_id(using)]
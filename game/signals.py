@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .assignment import assignment_engine
+from .events import publish_pairing
+from .leaderboard import leaderboard
+from .metrics import record_query
+from .models import Group, Player, Quote
+from .partners import partner_index
+from .quote_cache import quote_part_cache
+from .quote_pool import quote_pool
+
+# Sent once a pairing transaction has committed, with flip_number,
+# diary_ids (the two players) and deltas ({group_id: points awarded}).
+pairing_completed = Signal()
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # Feeds the per-request query count and DB time to MetricsMiddleware
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# Caches are invalidated once the write has committed: a reader that reloaded
+# between an inline invalidation and the commit would cache the old rows
+# under the new generation, and with a shared cache nothing re-checks them.
+
+def invalidate_quote_caches():
+    quote_pool.invalidate()
+    quote_part_cache.clear()
+
+
+@receiver(post_save, sender=Quote)
+@receiver(post_delete, sender=Quote)
+def invalidate_quote_pool(sender, using, **kwargs):
+    transaction.on_commit(invalidate_quote_caches, using=using)
+
+
+@receiver(post_delete, sender=Player)
+def release_assignment(sender, instance, **kwargs):
+    assignment_engine.release(instance.quote_id, instance.quote_part)
+
+
+@receiver(post_save, sender=Player)
+@receiver(post_delete, sender=Player)
+def invalidate_quote_part(sender, instance, using, **kwargs):
+    diary_id = instance.diary_id
+    transaction.on_commit(lambda: quote_part_cache.invalidate(diary_id), using=using)
+
+
+@receiver(post_save, sender=Player)
+def index_player(sender, instance, **kwargs):
+    partner_index.add(instance.diary_id, instance.quote_id, instance.quote_part)
+
+
+@receiver(post_delete, sender=Player)
+def unindex_player(sender, instance, **kwargs):
+    partner_index.remove(instance.diary_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_leaderboard(sender, using, **kwargs):
+    transaction.on_commit(leaderboard.invalidate, using=using)
+
+
+@receiver(pairing_completed)
+def broadcast_pairing(sender, flip_number, diary_ids, deltas, **kwargs):
+    leaderboard.apply(deltas)
+    publish_pairing(flip_number, diary_ids, deltas)
+
+
+@receiver(pairing_completed)
+def index_pairing(sender, diary_ids, **kwargs):
+    partner_index.mark_paired(diary_ids)
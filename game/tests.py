@@ -1,3 +1,1089 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import runpy
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .assignment import AssignmentEngine, PlayerAssignmentEngine, assignment_engine
+from .events import broadcaster
+from .flips import claim_flip_slot
+from .generations import PROCESS_TOKEN
+from .history import flips_per_minute, group_activity, rebuild, replay, take_snapshot
+from .idempotency import AsyncSingleFlight, SingleFlight, idempotency_store
+from .leaderboard import GENERATION_KEY, leaderboard
+from .metrics import metrics
+from .models import FlipOutbox, FlipSnapshot, GridFlipLog, Group, GroupPointShard, PairingEvent, Player, Quote, quote_digest
+from .partners import partner_index
+from .quote_pool import quote_pool
+from .ratelimit import rate_limiter
+from .replication import drain_outbox, enqueue_flip, outbox_lag
+from .routers import allow_replica_reads, begin_request, end_request
+from .scoring import award_points, group_totals
+
+
+class ConcurrentPairingTests(TransactionTestCase):
+    def setUp(self):
+        group = Group.objects.create(name="Red")
+        quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+        for i in range(40):
+            Player.objects.create(
+                diary_id=f"D{i}", quote=quote, quote_part="AB"[i % 2], has_registered=True, group=group
+            )
+        # A second holder of B, so D0 has two valid partners
+        Player.objects.create(diary_id="D40", quote=quote, quote_part="B", has_registered=True, group=group)
+        GridFlipLog.objects.bulk_create(
+            GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, 31)
+        )
+
+    def post_concurrently(self, payloads, workers=8):
+        lock = threading.Lock()
+        pending = list(payloads)
+        responses = []
+
+        def worker():
+            client = Client()
+            try:
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        payload = pending.pop()
+                    response = client.post("/game/verify-quote-pair", payload, content_type="application/json")
+                    with lock:
+                        responses.append(response)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_concurrent_pairs_get_distinct_flips(self):
+        # Every pair is sent twice, and D0 is also offered to D40. Whichever of
+        # D0's pairs wins, exactly 20 pairings succeed.
+        pairs = [(f"D{2 * i}", f"D{2 * i + 1}") for i in range(20)]
+        payloads = [{"diary_id_1": a, "diary_id_2": b} for a, b in pairs] * 2
+        payloads.append({"diary_id_1": "D0", "diary_id_2": "D40"})
+
+        responses = self.post_concurrently(payloads)
+
+        # Duplicates in flight together share the first one's response
+        codes = Counter(response.status_code for response in responses if not response.has_header("Idempotent-Replayed"))
+        self.assertEqual(codes[201], 20)
+        self.assertEqual(codes[500], 0)
+
+        active = list(GridFlipLog.objects.filter(is_status=True))
+        flip_numbers = [flip.flip_number for flip in active]
+        self.assertEqual(len(flip_numbers), len(set(flip_numbers)))
+
+        diaries = [flip.player1 for flip in active] + [flip.player2 for flip in active]
+        self.assertEqual(len(diaries), len(set(diaries)))
+        self.assertEqual(len(active), 20)
+        self.assertEqual(Group.objects.get(name="Red").points, 40)
+
+    def test_claim_waits_for_rebuild(self):
+        # A phantom claim for the rebuild to clear
+        GridFlipLog.objects.filter(flip_number=30).update(player1="X1", player2="X2", is_status=True)
+        replaying, release = threading.Event(), threading.Event()
+        summaries = []
+
+        def paused_replay(*args, **kwargs):
+            state = replay(*args, **kwargs)
+            replaying.set()
+            release.wait(5)
+            return state
+
+        def run_rebuild():
+            try:
+                with mock.patch("game.history.replay", paused_replay):
+                    summaries.append(rebuild())
+            finally:
+                connection.close()
+
+        rebuilder = threading.Thread(target=run_rebuild)
+        rebuilder.start()
+        self.assertTrue(replaying.wait(5))
+
+        responses = []
+        claimer = threading.Thread(target=lambda: responses.extend(self.post_concurrently(
+            [{"diary_id_1": "D0", "diary_id_2": "D1"}], workers=1
+        )))
+        claimer.start()
+        claimer.join(0.3)
+        # Held back while the rebuild compares the grid with the replay
+        self.assertTrue(claimer.is_alive())
+
+        release.set()
+        rebuilder.join()
+        claimer.join()
+        self.assertEqual(summaries[0]["flips_changed"], 1)
+        self.assertEqual(responses[0].status_code, 201)
+        self.assertEqual(GridFlipLog.objects.get(is_status=True).player1, "D0")
+
+    def test_active_flips_cursor_survives_out_of_order_commits(self):
+        claimed, release = threading.Event(), threading.Event()
+
+        def slow_enqueue(flip_number, *diary_ids):
+            # D0/D1 claims its slot first but commits after D2/D3
+            if "D0" in diary_ids:
+                claimed.set()
+                release.wait(5)
+            return enqueue_flip(flip_number, *diary_ids)
+
+        with mock.patch("game.views.enqueue_flip", slow_enqueue):
+            first = threading.Thread(target=self.post_concurrently, args=([{"diary_id_1": "D0", "diary_id_2": "D1"}], 1))
+            first.start()
+            self.assertTrue(claimed.wait(5))
+            second = threading.Thread(target=self.post_concurrently, args=([{"diary_id_1": "D2", "diary_id_2": "D3"}], 1))
+            second.start()
+            second.join(0.5)
+
+            seen = self.client.get("/game/active-flips?since=0").json()
+            release.set()
+            first.join()
+            second.join()
+
+        later = self.client.get(f"/game/active-flips?since={seen['cursor']}").json()
+        polled = {flip["player1"] for flip in seen["flips"] + later["flips"] if flip["is_status"]}
+        self.assertEqual(polled, {"D0", "D2"})
+
+    def test_no_free_slot(self):
+        GridFlipLog.objects.update(is_status=True)
+        response = self.client.post(
+            "/game/verify-quote-pair", {"diary_id_1": "D0", "diary_id_2": "D1"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 410)
+
+
+class GroupPointsTests(TestCase):
+    def setUp(self):
+        self.red = Group.objects.create(name="Red")
+        self.blue = Group.objects.create(name="Blue")
+        quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+        Player.objects.create(diary_id="R1", quote=quote, quote_part="A", group=self.red)
+        Player.objects.create(diary_id="R2", quote=quote, quote_part="B", group=self.red)
+        GridFlipLog.objects.create(flip_number=1, player1="", player2="")
+
+    def test_etag_changes_after_pairing(self):
+        response = self.client.get("/game/group-points")
+        etag = response["ETag"]
+        self.assertEqual(self.client.get("/game/group-points", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/game/verify-quote-pair", {"diary_id_1": "R1", "diary_id_2": "R2"}, content_type="application/json"
+            )
+
+        response = self.client.get("/game/group-points", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{"name": "Red", "points": 2}, {"name": "Blue", "points": 0}])
+        self.assertEqual(self.client.get("/game/group-points?group=Blue").json()["rank"], 2)
+        self.assertEqual(self.client.get("/game/group-points?top=1").json(), [{"name": "Red", "points": 2}])
+
+    def test_reload_between_commit_and_apply_counts_the_award_once(self):
+        leaderboard.all()
+        # The award commits, then another worker's bump makes this process
+        # reload before the pairing's on-commit apply() runs
+        award_points({self.red.id: 2})
+        cache.incr(GENERATION_KEY)
+        self.assertEqual(leaderboard.rank("Red"), (2, 1))
+
+        leaderboard.apply({self.red.id: 2})
+        with self.assertNumQueries(0):
+            self.assertEqual(leaderboard.all(), [{"name": "Red", "points": 2}, {"name": "Blue", "points": 0}])
+
+    @override_settings(GAME_LOCAL_CACHE_RECHECK=0)
+    def test_local_cache_rechecks_changes_from_other_processes(self):
+        response = self.client.get("/game/group-points")
+        etag = response["ETag"]
+        # A per-process cache cannot vouch for other workers' ETags
+        self.assertIn(PROCESS_TOKEN, etag)
+        self.assertEqual(self.client.get("/game/group-points", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Written without signals or generation bumps, as another worker's cache would see it
+        Group.objects.filter(pk=self.blue.pk).update(points=5)
+        response = self.client.get("/game/group-points", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0], {"name": "Blue", "points": 5})
+
+        quote = Quote.objects.get()
+        self.assertEqual(quote_pool.get(quote.pk)[1], "Hello world")
+        # An unchanged catalogue costs one aggregate, not a re-read
+        with self.assertNumQueries(1):
+            quote_pool.get(quote.pk)
+        generation = quote_pool.generation()
+        Quote.objects.filter(pk=quote.pk).update(text="Hello there", updated_at=timezone.now())
+        self.assertEqual(quote_pool.get(quote.pk)[1], "Hello there")
+        self.assertGreater(quote_pool.generation(), generation)
+
+
+@override_settings(GAME_POINT_SHARDS=4)
+class ShardedScoringTests(TestCase):
+    def setUp(self):
+        self.red = Group.objects.create(name="Red", points=10)
+        self.blue = Group.objects.create(name="Blue")
+
+    def shards(self, group):
+        return dict(GroupPointShard.objects.filter(group=group).values_list("shard", "points"))
+
+    def test_awards_create_and_fill_shards(self):
+        with mock.patch("game.scoring.random.randrange", side_effect=[0, 2, 0, 1]):
+            award_points({self.red.id: 2})
+            award_points({self.red.id: 2})
+            award_points({self.red.id: 1, self.blue.id: 1})
+        self.assertEqual(self.shards(self.red), {0: 3, 2: 2})
+        self.assertEqual(self.shards(self.blue), {1: 1})
+        # Group.points is left alone; totals fold the shards in
+        self.assertEqual(Group.objects.get(pk=self.red.pk).points, 10)
+        self.assertEqual(group_totals(), [{"name": "Red", "points": 15}, {"name": "Blue", "points": 1}])
+
+    def test_shard_created_concurrently_is_updated(self):
+        update, raced = QuerySet.update, []
+
+        def update_missing_a_racing_insert(queryset, **kwargs):
+            if queryset.model is GroupPointShard and not raced:
+                # Another request inserts the shard after this one's UPDATE found nothing
+                raced.append(True)
+                GroupPointShard.objects.bulk_create([GroupPointShard(group=self.red, shard=3, points=5)])
+                return 0
+            return update(queryset, **kwargs)
+
+        with mock.patch("game.scoring.random.randrange", return_value=3):
+            with mock.patch.object(QuerySet, "update", update_missing_a_racing_insert):
+                award_points({self.red.id: 2})
+        self.assertEqual(self.shards(self.red), {3: 7})
+
+    def test_group_points_view_sums_shards(self):
+        quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+        for n in range(6):
+            Player.objects.create(diary_id=f"S{n}", quote=quote, quote_part="AB"[n % 2], group=self.blue)
+        GridFlipLog.objects.bulk_create(GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, 4))
+
+        for n in range(0, 6, 2):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    "/game/verify-quote-pair", {"diary_id_1": f"S{n}", "diary_id_2": f"S{n + 1}"},
+                    content_type="application/json",
+                )
+        self.assertEqual(sum(self.shards(self.blue).values()), 6)
+        self.assertEqual(
+            self.client.get("/game/group-points").json(), [{"name": "Red", "points": 10}, {"name": "Blue", "points": 6}]
+        )
+        self.assertEqual(self.client.get("/game/group-points?group=Blue").json()["points"], 6)
+
+
+class QuotePartCacheTests(TestCase):
+    def setUp(self):
+        quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+        self.player = Player.objects.create(diary_id="C1", quote=quote, quote_part="B")
+
+    def test_warm_calls_skip_the_database(self):
+        self.assertEqual(self.client.get("/game/get-quote-part?diary_number=C1").json()["part_text"], "world")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/game/get-quote-part?diary_number=C1").status_code, 200)
+
+        self.player.quote_part = "A"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.player.save()
+            # Not dropped until the write commits
+            self.assertEqual(self.client.get("/game/get-quote-part?diary_number=C1").json()["part_text"], "world")
+        self.assertEqual(self.client.get("/game/get-quote-part?diary_number=C1").json()["part_text"], "Hello")
+
+    async def test_quote_added_without_a_pool_bump(self):
+        await self.async_client.get("/game/async/get-quote-part", {"diary_number": "C1"})
+        # bulk_create sends no signal, so the warm pool has not seen this quote
+        quote, = await Quote.objects.abulk_create([Quote(text="Good night", part_a="Good", part_b="night")])
+        group = await Group.objects.acreate(name="Red")
+        for diary_id in ("N1", "N2", "N3"):
+            await Player.objects.acreate(diary_id=diary_id, quote=quote, quote_part="B", group=group)
+
+        response = await self.async_client.get("/game/async/get-quote-part", {"diary_number": "N1"})
+        self.assertEqual(response.json()["part_text"], "night")
+        response = await self.async_client.get("/game/get-quote-part", {"diary_number": "N2"})
+        self.assertEqual(response.json()["part_text"], "night")
+        response = await self.async_client.post(
+            "/game/diary-entry", {"diary_number": "N3", "group_name": "Red"}, content_type="application/json"
+        )
+        self.assertEqual((response.status_code, response.json()["quote"]), (200, "Good night"))
+
+
+class AssignmentEngineTests(SimpleTestCase):
+    def engine(self, quote_ids, assigned=()):
+        engine = AssignmentEngine()
+        engine.load(quote_ids, assigned)
+        return engine
+
+    def test_open_halves_are_filled_first(self):
+        engine = self.engine([1, 2])
+        self.assertEqual([engine.assign() for _ in range(4)], [(1, "A"), (1, "B"), (2, "A"), (2, "B")])
+        self.assertEqual(engine.stats()["pairable_rate"], 1.0)
+
+    def test_least_used_quote_is_opened(self):
+        engine = self.engine([1, 2, 3], [(1, "A", 2), (1, "B", 2), (2, "A", 1), (2, "B", 1)])
+        self.assertEqual([engine.assign() for _ in range(3)], [(3, "A"), (3, "B"), (2, "A")])
+
+    def test_released_half_is_handed_out_again(self):
+        engine = self.engine([1, 2])
+        engine.assign(), engine.assign()
+        engine.release(1, "B")
+        # Halves that are not out are ignored
+        engine.release(2, "A")
+        self.assertEqual(engine.assign(), (1, "B"))
+        self.assertEqual(engine.assign(), (2, "A"))
+
+    def test_no_quotes(self):
+        self.assertIsNone(self.engine([]).assign())
+
+
+class PlayerAssignmentEngineTests(TestCase):
+    def test_reseeds_from_an_unbalanced_player_table(self):
+        group = Group.objects.create(name="Red")
+        with self.captureOnCommitCallbacks(execute=True):
+            lopsided = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+            fresh = Quote.objects.create(text="Good night", part_a="Good", part_b="night")
+        for n, part in enumerate("AAAB"):
+            Player.objects.create(diary_id=f"U{n}", quote=lopsided, quote_part=part, group=group)
+
+        engine = PlayerAssignmentEngine()
+        self.assertEqual(
+            [engine.assign() for _ in range(4)],
+            [(lopsided.id, "B"), (lopsided.id, "B"), (fresh.id, "A"), (fresh.id, "B")],
+        )
+
+
+    def test_resync_adds_halves_from_other_workers_and_keeps_its_own(self):
+        group = Group.objects.create(name="Red")
+        with self.captureOnCommitCallbacks(execute=True):
+            quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+        engine = PlayerAssignmentEngine()
+        self.assertEqual(engine.assign(), (quote.id, "A"))
+        Player.objects.create(diary_id="M1", quote=quote, quote_part="A", group=group)
+        # Another worker hands out and stores both halves
+        Player.objects.bulk_create([
+            Player(diary_id=f"W{n}", quote=quote, quote_part=part, group=group) for n, part in enumerate("AB")
+        ])
+
+        read = engine.assigned
+
+        def read_then_assign():
+            rows = list(read())
+            # A registration lands between the read and the update, before its row is stored
+            self.assertEqual(engine.assign(), (quote.id, "B"))
+            return rows
+
+        with mock.patch.object(engine, "assigned", read_then_assign):
+            engine.resync()
+        self.assertEqual(engine.snapshot(), {quote.id: (2, 2)})
+        self.assertEqual(engine.assign(), (quote.id, "A"))
+        self.assertEqual(engine.assign(), (quote.id, "B"))
+
+    def test_counts_follow_deletions_and_the_catalogue_without_reading_players(self):
+        group = Group.objects.create(name="Red")
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+        assignment_engine.invalidate()
+        self.assertEqual(assignment_engine.assign(), (first.id, "A"))
+        Player.objects.create(diary_id="F1", quote=first, quote_part="A", group=group).delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            second = Quote.objects.create(text="Good night", part_a="Good", part_b="night")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                [assignment_engine.assign() for _ in range(3)],
+                [(first.id, "A"), (first.id, "B"), (second.id, "A")],
+            )
+        self.assertFalse([query for query in queries if "game_player" in query["sql"]])
+
+
+class DiaryEntryBatchTests(TestCase):
+    def setUp(self):
+        Group.objects.create(name="Red")
+        with self.captureOnCommitCallbacks(execute=True):
+            Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+
+    def test_batch_registration(self):
+        self.client.post("/game/diary-entry", {"diary_number": "K1", "group_name": "Red"}, content_type="application/json")
+        entries = [
+            {"diary_number": "K1", "group_name": "Red"},
+            {"diary_number": "K2", "group_name": "Red"},
+            {"diary_number": "K3", "group_name": "Green"},
+            {"diary_number": "K2", "group_name": "Red"},
+        ]
+        response = self.client.post("/game/diary-entry/batch", {"entries": entries}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["created"], 1)
+        self.assertEqual([r["status"] for r in body["results"]], ["existing", "created", "error"])
+        # K1 and K2 hold the two halves of the only quote
+        self.assertEqual({r["part_type"] for r in body["results"][:2]}, {"A", "B"})
+
+    def test_existing_player_of_a_quote_the_pool_has_not_loaded(self):
+        self.client.post("/game/diary-entry", {"diary_number": "K1", "group_name": "Red"}, content_type="application/json")
+        quote, = Quote.objects.bulk_create([Quote(text="Good night", part_a="Good", part_b="night")])
+        Player.objects.create(diary_id="K9", quote=quote, quote_part="A", group=Group.objects.get(name="Red"))
+
+        entries = [{"diary_number": "K9", "group_name": "Red"}]
+        response = self.client.post("/game/diary-entry/batch", {"entries": entries}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["results"],
+            [{"diary_number": "K9", "part": "Good", "quote": "Good night", "part_type": "A", "group": "Red",
+              "status": "existing"}],
+        )
+
+
+    def test_rows_and_quotes_deleted_mid_registration(self):
+        bulk_create = QuerySet.bulk_create
+
+        def bulk_create_then_delete(queryset, objs, **kwargs):
+            created = bulk_create(queryset, objs, **kwargs)
+            if queryset.model is Player:
+                # A concurrent delete lands before the read-back
+                Player.objects.filter(diary_id="K2").delete()
+            return created
+
+        entries = [{"diary_number": "K1", "group_name": "Red"}, {"diary_number": "K2", "group_name": "Red"}]
+        with mock.patch.object(QuerySet, "bulk_create", bulk_create_then_delete):
+            response = self.client.post("/game/diary-entry/batch", {"entries": entries}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["status"] for r in response.json()["results"]], ["created", "error"])
+
+        with mock.patch.object(quote_pool, "get", return_value=None):
+            response = self.client.post("/game/diary-entry/batch", {"entries": entries[:1]}, content_type="application/json")
+        self.assertEqual(
+            response.json()["results"],
+            [{"diary_number": "K1", "status": "error", "error": "The assigned quote no longer exists."}],
+        )
+
+
+class ProvisionGridTests(TestCase):
+    def provision(self, rows, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "quotes.jsonl"
+            path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+            call_command("provision_grid", "--quotes", str(path), "--chunk-size", "2", *args, stdout=StringIO())
+
+    def test_load_in_chunks_and_upsert(self):
+        rows = [{"part_a": f"First {n}", "part_b": f"second {n}"} for n in range(5)]
+        rows.append({"id": 100, "text": "Keyed quote", "part_a": "Keyed", "part_b": "quote"})
+        self.provision(rows, "--slots", "5")
+        self.assertEqual(Quote.objects.count(), 6)
+        self.assertEqual(Quote.objects.get(part_a="First 3").digest, quote_digest("First 3", "second 3"))
+        self.assertEqual(sorted(GridFlipLog.objects.values_list("flip_number", flat=True)), [1, 2, 3, 4, 5])
+
+        # Re-run with edits: rows without an id are matched on their halves, not inserted again
+        rows[1]["text"] = "Edited"
+        rows[5]["text"] = "Edited keyed"
+        rows.append({"part_a": "New", "part_b": "quote"})
+        self.provision(rows, "--upsert", "--slots", "7")
+        self.assertEqual(Quote.objects.count(), 7)
+        self.assertEqual(Quote.objects.get(part_a="First 1").text, "Edited")
+        self.assertEqual(Quote.objects.get(id=100).text, "Edited keyed")
+        self.assertEqual(GridFlipLog.objects.count(), 7)
+        self.assertEqual(quote_pool.get(Quote.objects.get(part_a="New").id)[1], "New quote")
+
+
+class VerifyQuotePairQueryCountTests(TestCase):
+    def setUp(self):
+        red = Group.objects.create(name="Red")
+        blue = Group.objects.create(name="Blue")
+        quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+        Player.objects.create(diary_id="R1", quote=quote, quote_part="A", group=red)
+        Player.objects.create(diary_id="R2", quote=quote, quote_part="B", group=red)
+        Player.objects.create(diary_id="B1", quote=quote, quote_part="B", group=blue)
+        GridFlipLog.objects.bulk_create(
+            GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, 4)
+        )
+
+    def pair(self, diary_id_1, diary_id_2):
+        return self.client.post(
+            "/game/verify-quote-pair",
+            {"diary_id_1": diary_id_1, "diary_id_2": diary_id_2},
+            content_type="application/json",
+        )
+
+    def postgresql_locks(self, claimed=True):
+        # PostgreSQL also takes the shared claim lock and, for a claim, stamps its version
+        if connection.vendor != "postgresql":
+            return 0
+        return 2 if claimed else 1
+
+    def test_same_group_pairing(self):
+        # savepoint, players (+ lock), claim, score, event, outbox, release
+        with self.assertNumQueries(7 + self.postgresql_locks()):
+            self.assertEqual(self.pair("R1", "R2").status_code, 201)
+
+    def test_cross_group_pairing(self):
+        # savepoint, players (+ lock), claim, score x2, event, outbox, release
+        with self.assertNumQueries(8 + self.postgresql_locks()):
+            self.assertEqual(self.pair("R1", "B1").status_code, 201)
+
+    def test_repeat_pairing(self):
+        self.pair("R1", "R2")
+        # savepoint, players (+ lock), claim refused, release, existing flip
+        with self.assertNumQueries(5 + self.postgresql_locks(claimed=False)):
+            self.assertEqual(self.pair("R2", "R1").status_code, 200)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        red = Group.objects.create(name="Red")
+        with self.captureOnCommitCallbacks(execute=True):
+            quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+        Player.objects.create(diary_id="I1", quote=quote, quote_part="A", group=red)
+        Player.objects.create(diary_id="I2", quote=quote, quote_part="B", group=red)
+        GridFlipLog.objects.create(flip_number=1, player1="", player2="")
+        idempotency_store.clear()
+
+    def post(self, path, data, key):
+        return self.client.post(path, data, content_type="application/json", headers={"Idempotency-Key": key})
+
+    def test_repeats_are_replayed_without_queries(self):
+        pair = {"diary_id_1": "I1", "diary_id_2": "I2"}
+        first = self.post("/game/verify-quote-pair", pair, "scan-1")
+        self.assertEqual(first.status_code, 201)
+
+        with self.assertNumQueries(0):
+            repeat = self.post("/game/verify-quote-pair", pair, "scan-1")
+        self.assertEqual((repeat.status_code, repeat.content), (201, first.content))
+        self.assertEqual(repeat["Idempotent-Replayed"], "true")
+
+        # A new key runs the view again: already paired
+        self.assertEqual(self.post("/game/verify-quote-pair", pair, "scan-2").status_code, 200)
+
+    def test_key_reused_with_a_different_body(self):
+        self.assertEqual(self.post("/game/diary-entry", {"diary_number": "I3", "group_name": "Red"}, "k").status_code, 201)
+        self.assertEqual(self.post("/game/diary-entry", {"diary_number": "I4", "group_name": "Red"}, "k").status_code, 422)
+        self.assertFalse(Player.objects.filter(diary_id="I4").exists())
+
+    def test_single_flight_runs_once(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def work():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return "done"
+
+        leader = threading.Thread(target=lambda: results.append(flight.do("k", work)))
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=lambda: results.append(flight.do("k", work))) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        time.sleep(0.1)  # let the followers join the flight
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [("done", False)] + [("done", True)] * 3)
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+        Player.objects.create(diary_id="L1", quote=quote, quote_part="A")
+        Player.objects.create(diary_id="L2", quote=quote, quote_part="B")
+        rate_limiter.clear()
+        # Buckets drained under these tests' tight limits would refuse later tests
+        self.addCleanup(rate_limiter.clear)
+
+    @override_settings(GAME_RATE_LIMITS={"verify-quote-pair": {"diary": (0.1, 2)}})
+    def test_diary_bucket_refuses_before_the_database(self):
+        for partner in ["X1", "X2"]:
+            response = self.client.post(
+                "/game/verify-quote-pair", {"diary_id_1": "L1", "diary_id_2": partner}, content_type="application/json"
+            )
+            self.assertEqual(response.status_code, 404)
+
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                "/game/verify-quote-pair", {"diary_id_1": "L1", "diary_id_2": "X3"}, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "10")
+
+    @override_settings(GAME_RATE_LIMITS={"verify-quote-pair": {"ip": (0.1, 2), "diary": (0.1, 1)}})
+    def test_refused_request_takes_no_tokens(self):
+        def pair(diary_id_1, diary_id_2):
+            return self.client.post(
+                "/game/verify-quote-pair", {"diary_id_1": diary_id_1, "diary_id_2": diary_id_2},
+                content_type="application/json",
+            ).status_code
+
+        self.assertEqual(pair("L1", "X1"), 404)
+        # L1's bucket refuses; the IP bucket keeps the token this request would have taken
+        self.assertEqual(pair("L1", "X2"), 429)
+        self.assertEqual(pair("X3", "X4"), 404)
+        self.assertEqual(pair("X5", "X6"), 429)
+
+    @override_settings(GAME_RATE_LIMITS={"get-quote-part": {"ip": (0.1, 1)}})
+    def test_ip_bucket(self):
+        self.assertEqual(self.client.get("/game/get-quote-part?diary_number=L1").status_code, 200)
+        self.assertEqual(self.client.get("/game/get-quote-part?diary_number=L2").status_code, 429)
+        response = self.client.get("/game/get-quote-part?diary_number=L2", REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(GAME_RATE_LIMITS={"get-quote-part": {"diary": (0.1, 1)}})
+    async def test_async_views_share_the_buckets(self):
+        self.assertEqual((await self.async_client.get("/game/async/get-quote-part?diary_number=L1")).status_code, 200)
+        self.assertEqual((await self.async_client.get("/game/get-quote-part?diary_number=L1")).status_code, 429)
+
+
+class PairingHistoryTests(TestCase):
+    def setUp(self):
+        self.red = Group.objects.create(name="Red")
+        self.blue = Group.objects.create(name="Blue")
+        quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+        for diary_id, part, group in [
+            ("R1", "A", self.red), ("R2", "B", self.red), ("R3", "A", self.red), ("B1", "B", self.blue),
+        ]:
+            Player.objects.create(diary_id=diary_id, quote=quote, quote_part=part, group=group)
+        GridFlipLog.objects.bulk_create(
+            GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, 4)
+        )
+        for pair in [("R1", "R2"), ("R3", "B1")]:
+            self.client.post(
+                "/game/verify-quote-pair", dict(zip(["diary_id_1", "diary_id_2"], pair)), content_type="application/json"
+            )
+
+    def test_events_are_written_with_the_claim(self):
+        events = list(PairingEvent.objects.order_by("id").values_list("flip_number", "player1", "points1", "points2"))
+        self.assertEqual(events, [(1, "R1", 2, 0), (2, "R3", 1, 1)])
+
+        since = timezone.now() - timedelta(minutes=5)
+        self.assertEqual(sum(flips for _, flips in flips_per_minute(since)), 2)
+        self.assertEqual(
+            group_activity(since),
+            {self.red.id: {"flips": 2, "points": 3}, self.blue.id: {"flips": 1, "points": 1}},
+        )
+        stats = self.client.get("/game/flip-stats?minutes=5").json()
+        self.assertEqual(stats["groups"][0], {"name": "Red", "flips": 2, "points": 3})
+
+    def test_rebuild_repairs_the_grid_and_points(self):
+        take_snapshot(settle=0)
+        self.assertEqual(FlipSnapshot.objects.latest("last_event").flips, [[1, "R1", "R2"], [2, "R3", "B1"]])
+
+        # Damage: a lost claim, a phantom claim, and drifted totals
+        GridFlipLog.objects.filter(flip_number=1).update(player1="", player2="", is_status=False)
+        GridFlipLog.objects.filter(flip_number=3).update(player1="X1", player2="X2", is_status=True)
+        Group.objects.filter(pk=self.red.pk).update(points=50)
+        GroupPointShard.objects.create(group=self.blue, shard=0, points=7)
+
+        self.assertEqual(rebuild(dry_run=True)["flips_changed"], 2)
+        summary = rebuild()
+        self.assertEqual((summary["flips_changed"], summary["groups_changed"]), (2, 2))
+
+        active = GridFlipLog.objects.filter(is_status=True).order_by("flip_number")
+        self.assertEqual([(flip.flip_number, flip.player1) for flip in active], [(1, "R1"), (2, "R3")])
+        self.assertEqual(dict(Group.objects.values_list("name", "points")), {"Red": 3, "Blue": 1})
+        self.assertFalse(GroupPointShard.objects.exists())
+        self.assertEqual(rebuild()["flips_changed"], 0)
+
+
+class FindPartnerTests(TestCase):
+    def setUp(self):
+        red = Group.objects.create(name="Red")
+        self.quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+        for diary_id, part in [("A1", "A"), ("B1", "B"), ("B2", "B")]:
+            Player.objects.create(diary_id=diary_id, quote=self.quote, quote_part=part, group=red)
+        GridFlipLog.objects.bulk_create(
+            GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, 3)
+        )
+        # Earlier tests' diaries hold the same halves; start from this test's rows
+        partner_index.invalidate()
+
+    def find(self, diary_id):
+        return self.client.get("/game/find-partner", {"diary_number": diary_id}).json()
+
+    def test_partners_until_paired(self):
+        self.assertEqual(self.find("A1")["partners"], ["B1", "B2"])
+        with self.settings(GAME_PARTNER_INDEX_POLL=60), self.assertNumQueries(0):
+            self.assertEqual(self.find("B2")["partners"], ["A1"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/game/verify-quote-pair", {"diary_id_1": "A1", "diary_id_2": "B1"}, content_type="application/json"
+            )
+        self.assertEqual(self.find("A1"), {"diary_number": "A1", "paired": True, "flip_number": 1, "paired_with": "B1"})
+        self.assertEqual(self.find("B2")["partners"], [])
+
+    def test_catches_up_on_other_workers(self):
+        self.find("A1")
+        # Rows written without this process's signals, as another worker would
+        Player.objects.bulk_create([Player(diary_id="A2", quote=self.quote, quote_part="A")])
+        claim_flip_slot("A1", "B1")
+        with self.settings(GAME_PARTNER_INDEX_POLL=0):
+            self.assertEqual(self.find("B2")["partners"], ["A2"])
+
+    def test_catches_up_on_registrations_committed_out_of_order(self):
+        self.find("A1")
+        last = Player.objects.latest("id").id
+        # The later id commits first; the earlier one is still in flight when the index catches up
+        Player.objects.bulk_create([Player(id=last + 2, diary_id="A3", quote=self.quote, quote_part="A")])
+        with self.settings(GAME_PARTNER_INDEX_POLL=0):
+            self.assertEqual(self.find("B2")["partners"], ["A1", "A3"])
+            Player.objects.bulk_create([Player(id=last + 1, diary_id="A2", quote=self.quote, quote_part="A")])
+            self.assertEqual(self.find("B2")["partners"], ["A1", "A3", "A2"])
+
+
+    def test_duplicate_catalogue_rows_are_partners_without_reloading_players(self):
+        self.find("A1")
+        with self.settings(GAME_PARTNER_INDEX_POLL=60):
+            # The same quote loaded twice; the new row bumps the quote pool's generation
+            with self.captureOnCommitCallbacks(execute=True):
+                duplicate = Quote.objects.create(text="hello  World", part_a="hello ", part_b="World")
+            Player.objects.create(diary_id="D1", quote=duplicate, quote_part="A", group=Group.objects.get())
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.find("B1")["partners"], ["A1", "D1"])
+            self.assertFalse([query for query in queries if "game_player" in query["sql"]])
+
+            duplicate.part_b = "there"
+            with self.captureOnCommitCallbacks(execute=True):
+                duplicate.save()
+            self.assertEqual(self.find("B1")["partners"], ["A1"])
+
+
+class QuotePairValidationTests(TestCase):
+    def setUp(self):
+        red = Group.objects.create(name="Red")
+        hello = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+        # The same quote loaded twice, with different spacing and case
+        duplicate = Quote.objects.create(text="hello  World", part_a="hello ", part_b="World")
+        other = Quote.objects.create(text="Good night", part_a="Good", part_b="night")
+        for diary_id, quote, part in [
+            ("H1", hello, "A"), ("H2", hello, "A"), ("D1", duplicate, "B"), ("O1", other, "B"),
+        ]:
+            Player.objects.create(diary_id=diary_id, quote=quote, quote_part=part, group=red)
+        GridFlipLog.objects.bulk_create(
+            GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, 3)
+        )
+
+    def pair(self, diary_id_1, diary_id_2):
+        return self.client.post(
+            "/game/verify-quote-pair",
+            {"diary_id_1": diary_id_1, "diary_id_2": diary_id_2},
+            content_type="application/json",
+        )
+
+    def test_rejects_halves_that_do_not_match(self):
+        # savepoint, players (+ digests), release
+        with self.assertNumQueries(3):
+            self.assertEqual(self.pair("H1", "H2").status_code, 400)
+        self.assertEqual(self.pair("H1", "O1").status_code, 400)
+        self.assertFalse(GridFlipLog.objects.filter(is_status=True).exists())
+
+    def test_duplicate_catalogue_rows_match_by_digest(self):
+        self.assertEqual(self.pair("H1", "D1").status_code, 201)
+
+    def test_digest_follows_edits(self):
+        quote = Quote.objects.get(text="Good night")
+        quote.part_b = "morning"
+        quote.save(update_fields=["part_b"])
+        quote.refresh_from_db()
+        self.assertEqual(quote.digest, quote_digest("Good", "morning"))
+
+
+class ActiveFlipsTests(TestCase):
+    def setUp(self):
+        GridFlipLog.objects.bulk_create(
+            GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, 4)
+        )
+
+    def test_since_returns_only_changes(self):
+        claim_flip_slot("D1", "D2")
+        first = self.client.get("/game/active-flips?since=0").json()
+        self.assertEqual([flip["flip_number"] for flip in first["flips"]], [1])
+
+        self.assertEqual(self.client.get(f"/game/active-flips?since={first['cursor']}").json()["flips"], [])
+
+        claim_flip_slot("D3", "D4")
+        second = self.client.get(f"/game/active-flips?since={first['cursor']}").json()
+        self.assertEqual([flip["flip_number"] for flip in second["flips"]], [2])
+        self.assertGreater(second["cursor"], first["cursor"])
+
+
+class AsyncViewsTests(TestCase):
+    def setUp(self):
+        red = Group.objects.create(name="Red")
+        quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+        Player.objects.create(diary_id="R1", quote=quote, quote_part="A", group=red)
+        Player.objects.create(diary_id="R2", quote=quote, quote_part="B", group=red)
+        GridFlipLog.objects.bulk_create(
+            GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, 3)
+        )
+
+    async def test_async_endpoints(self):
+        response = await self.async_client.get("/game/async/get-quote-part", {"diary_number": "R2"})
+        self.assertEqual(response.json()["part_text"], "world")
+
+        pair = {"diary_id_1": "R1", "diary_id_2": "R2"}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = await self.async_client.post("/game/async/verify-quote-pair", pair, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["flip_number"], 1)
+        response = await self.async_client.post("/game/async/verify-quote-pair", pair, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+
+        flips = (await self.async_client.get("/game/async/active-flips")).json()
+        self.assertEqual([(flip["flip_number"], flip["player1"]) for flip in flips], [(1, "R1")])
+
+        response = await self.async_client.get("/game/async/group-points")
+        self.assertEqual(response.json(), [{"name": "Red", "points": 2}])
+        response = await self.async_client.get("/game/async/group-points", headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_verify_replays_and_coalesces_duplicates(self):
+        idempotency_store.clear()
+        path = "/game/async/verify-quote-pair"
+        pair = {"diary_id_1": "R1", "diary_id_2": "R2"}
+        first = await self.async_client.post(path, pair, content_type="application/json",
+                                             headers={"Idempotency-Key": "k1"})
+        self.assertEqual(first.status_code, 201)
+        retry = await self.async_client.post(path, pair, content_type="application/json",
+                                             headers={"Idempotency-Key": "k1"})
+        self.assertEqual((retry.status_code, retry["Idempotent-Replayed"]), (201, "true"))
+        self.assertEqual(retry.json(), first.json())
+        reused = await self.async_client.post(path, {"diary_id_1": "R2", "diary_id_2": "R1"},
+                                              content_type="application/json", headers={"Idempotency-Key": "k1"})
+        self.assertEqual(reused.status_code, 422)
+        self.assertEqual(await PairingEvent.objects.acount(), 1)
+
+        # Duplicates in flight together share one run, keyed on the diary pair. The
+        # test client runs every sync_to_async call on one thread, so the first run
+        # is held back until the other two have joined instead of racing them there.
+        await PairingEvent.objects.all().adelete()
+        await GridFlipLog.objects.filter(flip_number=1).aupdate(player1="", player2="", is_status=False)
+        joined, all_joined = [], asyncio.Event()
+
+        class GatedFlight(AsyncSingleFlight):
+            async def do(self, key, func, timeout=None):
+                joined.append(key)
+                if len(joined) == 3:
+                    all_joined.set()
+
+                async def gated():
+                    await all_joined.wait()
+                    return await func()
+
+                return await super().do(key, gated, timeout)
+
+        with mock.patch("game.idempotency.async_single_flight", GatedFlight()):
+            responses = await asyncio.wait_for(asyncio.gather(*(
+                self.async_client.post(path, pair, content_type="application/json") for _ in range(3)
+            )), 5)
+        self.assertEqual([response.status_code for response in responses], [201] * 3)
+        self.assertEqual(sorted(response.has_header("Idempotent-Replayed") for response in responses),
+                         [False, True, True])
+        self.assertEqual(await PairingEvent.objects.acount(), 1)
+
+    async def test_event_stream_sends_snapshot_then_deltas(self):
+        response = await self.async_client.get("/game/events")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        received = asyncio.Queue()
+
+        async def read():
+            async for chunk in response.streaming_content:
+                await received.put(chunk)
+
+        reader = asyncio.create_task(read())
+        snapshot = await asyncio.wait_for(received.get(), 5)
+        self.assertTrue(snapshot.startswith(b"event: snapshot\n"))
+        self.assertIn(b'"flips":[]', snapshot)
+
+        def pair():
+            # on_commit callbacks are captured on the connection the pairing used
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    "/game/verify-quote-pair", {"diary_id_1": "R1", "diary_id_2": "R2"}, content_type="application/json"
+                )
+
+        await sync_to_async(pair)()
+        delta = await asyncio.wait_for(received.get(), 5)
+        self.assertEqual(delta, b'event: flip\ndata: {"flip_number":1,"players":["R1","R2"]}\n\n')
+
+        # The ASGI handler cancels the streaming task when the client goes away
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertEqual(broadcaster.connections(), 0)
+
+    def test_event_stream_needs_asgi(self):
+        response = self.client.get("/game/events")
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(broadcaster.connections(), 0)
+
+
+class ReplicationTests(TestCase):
+    databases = {"default", "lap1end"}
+
+    def setUp(self):
+        GridFlipLog.objects.bulk_create(
+            GridFlipLog(flip_number=n, player1="", player2="") for n in range(1, 4)
+        )
+        GridFlipLog.objects.using("lap1end").create(flip_number=1, player1="", player2="")
+
+    def test_drain_outbox_mirrors_claims_in_order(self):
+        for diary_ids in [("D1", "D2"), ("D3", "D4")]:
+            with transaction.atomic():
+                enqueue_flip(claim_flip_slot(*diary_ids), *diary_ids)
+        self.assertEqual(outbox_lag()[0], 2)
+
+        self.assertEqual(drain_outbox(using="default", replica="lap1end"), 2)
+        self.assertEqual(drain_outbox(using="default", replica="lap1end"), 0)
+
+        mirrored = GridFlipLog.objects.using("lap1end").order_by("flip_number")
+        self.assertEqual(
+            [(flip.flip_number, flip.player1, flip.is_status) for flip in mirrored],
+            [(1, "D1", True), (2, "D3", True)],
+        )
+        self.assertEqual(outbox_lag(), (0, 0.0))
+
+    def test_failed_batch_stays_queued(self):
+        with transaction.atomic():
+            enqueue_flip(claim_flip_slot("D1", "D2"), "D1", "D2")
+
+        with self.assertRaises(Exception):
+            drain_outbox(using="default", replica="missing")
+
+        row = FlipOutbox.objects.get()
+        self.assertEqual(row.attempts, 1)
+        self.assertTrue(row.last_error)
+
+
+class ReadReplicaRouterTests(TestCase):
+    databases = {"default", "lap1end"}
+
+    def setUp(self):
+        GridFlipLog.objects.using("lap1end").create(flip_number=7, player1="D1", player2="D2", is_status=True)
+
+    @override_settings(GAME_READ_REPLICAS=["lap1end"])
+    def test_read_only_endpoint_uses_replica(self):
+        self.assertEqual([flip["flip_number"] for flip in self.client.get("/game/active-flips").json()], [7])
+
+    @override_settings(GAME_READ_REPLICAS=["lap1end"])
+    def test_reads_after_a_write_stay_on_primary(self):
+        token = begin_request()
+        try:
+            allow_replica_reads()
+            self.assertEqual(GridFlipLog.objects.count(), 1)
+            Group.objects.create(name="Red")
+            self.assertEqual(GridFlipLog.objects.count(), 0)
+        finally:
+            end_request(token)
+
+    def test_without_replicas_reads_use_primary(self):
+        self.assertEqual(self.client.get("/game/active-flips").json(), [])
+
+    @override_settings(GAME_READ_REPLICAS=["lap1end"])
+    def test_process_caches_load_from_primary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            red = Group.objects.create(name="Red", points=3)
+            quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+            Player.objects.create(diary_id="P1", quote=quote, quote_part="A", group=red)
+        # A replica lagging behind every write above
+        Group.objects.using("lap1end").create(name="Stale", points=9)
+
+        self.assertEqual(self.client.get("/game/group-points").json(), [{"name": "Red", "points": 3}])
+        self.assertEqual(self.client.get("/game/get-quote-part?diary_number=P1").json()["part_text"], "Hello")
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        quote = Quote.objects.create(text="Hello world", part_a="Hello", part_b="world")
+        Player.objects.create(diary_id="M1", quote=quote, quote_part="A")
+        metrics.reset()
+
+    def test_per_view_histograms(self):
+        self.client.get("/game/get-quote-part?diary_number=M1")
+        self.client.get("/game/get-quote-part?diary_number=M1")
+        self.client.get("/game/get-quote-part")
+
+        body = self.client.get("/game/metrics").content.decode()
+        self.assertIn('game_request_seconds_count{view="get-quote-part"} 3', body)
+        self.assertIn('game_responses_total{view="get-quote-part",status="200"} 2', body)
+        self.assertIn('game_responses_total{view="get-quote-part",status="400"} 1', body)
+        # Only the cold call queried; the warm one and the 400 did not
+        self.assertIn('game_request_queries_bucket{view="get-quote-part",le="0"} 2', body)
+        self.assertNotIn('game_request_queries_sum{view="get-quote-part"} 0', body)
+
+    def test_slow_request_profiles_are_written(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(
+                GAME_METRICS_PROFILE_RATE=1, GAME_METRICS_PROFILE_THRESHOLD=0, GAME_METRICS_PROFILE_DIR=directory
+            ), self.assertLogs("game.metrics", "WARNING"):
+                self.client.get("/game/get-quote-part?diary_number=M1")
+            self.assertEqual(len(list(Path(directory).glob("get-quote-part-*.prof"))), 1)
+
+
+class EventDayBenchTests(TransactionTestCase):
+    def run_event_day(self, *args):
+        out = StringIO()
+        call_command(
+            "bench_event_day", "--no-scratch", "--players", "6", "--screens", "1", "--groups", "2",
+            "--concurrency", "4", "--poll-interval", "0.01", "--wrong-partner-rate", "0", *args, stdout=out,
+        )
+        return out.getvalue()
+
+    def test_small_event_day(self):
+        report = self.run_event_day()
+        self.assertIn("6 players, 1 screens, wsgi / sync views", report)
+        self.assertIn("3 flips claimed", report)
+        self.assertIn("diary-entry: 201: 6", report)
+        self.assertEqual(GridFlipLog.objects.filter(is_status=True).count(), 3)
+
+    def test_small_event_day_on_async_views(self):
+        report = self.run_event_day("--server", "asgi", "--async-views")
+        self.assertIn("6 players, 1 screens, asgi / async views", report)
+        self.assertIn("3 flips claimed", report)
+
+
+class ProductionSettingsTests(SimpleTestCase):
+    def test_secret_key_is_required(self):
+        with mock.patch.dict(os.environ, {"DJANGO_SECRET_KEY": ""}):
+            with self.assertRaises(ImproperlyConfigured):
+                runpy.run_module("quote_game.settings_production")
+        with mock.patch.dict(os.environ, {"DJANGO_SECRET_KEY": "from-the-environment"}):
+            self.assertEqual(runpy.run_module("quote_game.settings_production")["SECRET_KEY"], "from-the-environment")
+
+    def test_pooled_connections_are_checked_by_the_pool(self):
+        from psycopg_pool import ConnectionPool
+
+        environ = {"DJANGO_SECRET_KEY": "from-the-environment", "DB_POOL": "1", "DB_POOL_MAX_SIZE": "8"}
+        with mock.patch.dict(os.environ, environ):
+            databases = runpy.run_module("quote_game.settings_production")["DATABASES"]
+        for alias in ("default", "lap1end"):
+            self.assertEqual(
+                databases[alias]["OPTIONS"]["pool"],
+                {"min_size": 2, "max_size": 8, "timeout": 10, "max_idle": 300, "max_lifetime": 1800,
+                 "check": ConnectionPool.check_connection},
+            )
+            self.assertEqual((databases[alias]["CONN_MAX_AGE"], databases[alias]["CONN_HEALTH_CHECKS"]), (0, False))
+
+        with mock.patch.dict(os.environ, dict(environ, DB_POOL="0")):
+            databases = runpy.run_module("quote_game.settings_production")["DATABASES"]
+        self.assertNotIn("pool", databases["default"]["OPTIONS"])
+        self.assertEqual((databases["default"]["CONN_MAX_AGE"], databases["default"]["CONN_HEALTH_CHECKS"]), (600, True))
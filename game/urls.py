@@ -1,10 +1,15 @@
 from django.urls import path
-from .views import DiaryEntryView,GroupPointsView, get_quote_part,get_active_flips,VerifyQuotePairView
+from .views import DiaryEntryView,DiaryEntryBatchView,GroupPointsView, get_quote_part,get_active_flips,VerifyQuotePairView,event_stream,prometheus_metrics,find_partner,flip_stats
 
 urlpatterns = [
     path('diary-entry', DiaryEntryView.as_view(), name='diary-entry'),
+    path('diary-entry/batch', DiaryEntryBatchView.as_view(), name='diary-entry-batch'),
     path('get-quote-part', get_quote_part, name='get-quote-part'),
+    path('find-partner', find_partner, name='find-partner'),
     path('verify-quote-pair', VerifyQuotePairView.as_view(), name='verify-quote-pair'),
     path('active-flips', get_active_flips, name='active-flips'),
+    path('flip-stats', flip_stats, name='flip-stats'),
     path('group-points', GroupPointsView.as_view(), name='group-points'),
+    path('events', event_stream, name='events'),
+    path('metrics', prometheus_metrics, name='metrics'),
 ]
\ No newline at end of file
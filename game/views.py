@@ -2,17 +2,140 @@ from rest_framework.decorators import api_view
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Quote, Player, Group, GridFlipLog
-from django.http import JsonResponse
-from django.db import transaction, connections
-from django.db.models import Q, F
-import random
+from .models import Player, Group, GridFlipLog
+from .assignment import assignment_engine
+from .events import broadcaster, encode_event, snapshot, stream_events
+from .history import flips_per_minute, group_activity, record_pairing
+from .idempotency import idempotent
+from .flips import claim_flip_slot, find_active_flip, halves_match, pairing_transaction, stamp_version
+from .payloads import quote_part_body, registration_body
+from .quote_pool import quote_pool
+from .ratelimit import rate_limited
+from .registration import register_players
+from .replication import enqueue_flip
+from .leaderboard import leaderboard
+from .metrics import metrics
+from .partners import partner_index
+from .quote_cache import quote_part_cache
+from .scoring import award_points, pair_points
+from .signals import pairing_completed
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from datetime import timedelta
+import json
+
+ACTIVE_FLIPS_PAGE_SIZE = 500
+DIARY_BATCH_LIMIT = 500
+PARTNER_LIMIT = 10
+FLIP_STATS_MAX_MINUTES = 24 * 60
+
+
+async def event_stream(request):
+    # Under WSGI the stream would tie up a worker thread forever and never
+    # notice the client leaving, so /events is served only by the ASGI app
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Event stream requires the ASGI server (quote_game.asgi)."}, status=501)
+
+    subscription = broadcaster.subscribe()
+    try:
+        initial = encode_event("snapshot", await sync_to_async(snapshot)())
+    except Exception:
+        broadcaster.unsubscribe(subscription)
+        raise
+
+    response = StreamingHttpResponse(stream_events(subscription, initial), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def request_data(request):
+    """JSON or form body, like DRF's request.data for the content types the game uses."""
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+def registration_key(request):
+    data = request_data(request)
+    diary_number = data and data.get("diary_number")
+    return f"diary:{diary_number}" if diary_number else None
+
+
+def pair_diaries(request):
+    data = request_data(request)
+    if not data:
+        return ()
+    return [str(diary_id) for diary_id in (data.get("diary_id_1"), data.get("diary_id_2")) if diary_id]
+
+
+def quote_part_diaries(request):
+    return (request.GET.get("diary_number"),)
+
+
+def pair_key(request):
+    # Either scan order of the same two diaries coalesces
+    diary_ids = pair_diaries(request)
+    if len(diary_ids) != 2:
+        return None
+    return "pair:{}:{}".format(*sorted(diary_ids))
+
+
+def prometheus_metrics(request):
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 def get_active_flips(request):
-    data = GridFlipLog.objects.filter(is_status=True).values()
-    return JsonResponse(list(data), safe=False)
+    since = request.GET.get("since")
+    if since is None:
+        data = GridFlipLog.objects.filter(is_status=True).values()
+        return JsonResponse(list(data), safe=False)
+
+    # Delta mode: only flips changed after the client's cursor, oldest first
+    if not since.isdigit():
+        return JsonResponse({"error": "since must be a non-negative integer"}, status=400)
+
+    cursor = int(since)
+    flips = list(
+        GridFlipLog.objects.filter(version__gt=cursor)
+        .order_by("version")
+        .values()[:ACTIVE_FLIPS_PAGE_SIZE]
+    )
+    if flips:
+        cursor = flips[-1]["version"]
+
+    return JsonResponse({"flips": flips, "cursor": cursor})
+
+
+def flip_stats(request):
+    # Answered from the PairingEvent time index, not the live grid
+    minutes = request.GET.get("minutes", "60")
+    if not minutes.isdigit() or not 0 < int(minutes) <= FLIP_STATS_MAX_MINUTES:
+        return JsonResponse({"error": f"minutes must be between 1 and {FLIP_STATS_MAX_MINUTES}"}, status=400)
+
+    since = timezone.now() - timedelta(minutes=int(minutes))
+    activity = group_activity(since)
+    names = dict(Group.objects.filter(id__in=activity).values_list("id", "name"))
+    groups = sorted(
+        ({"name": names.get(group_id), "flips": totals["flips"], "points": totals["points"]}
+         for group_id, totals in activity.items()),
+        key=lambda group: (-group["flips"], group["name"] or ""),
+    )
+    return JsonResponse({
+        "since": since.isoformat(),
+        "per_minute": [{"minute": minute.isoformat(), "flips": flips} for minute, flips in flips_per_minute(since)],
+        "groups": groups,
+    })
  
+@rate_limited("get-quote-part", quote_part_diaries)
 @api_view(['GET'])
 def get_quote_part(request):
     if request.method != "GET":
@@ -23,23 +146,67 @@ def get_quote_part(request):
     if not diary_number:
         return JsonResponse({"error": "Missing diary_number"}, status=400)
 
-    try:
-        player = Player.objects.get(diary_id=diary_number)
-    except Player.DoesNotExist:
+    def load():
+        # The body is cached for every later request, so it is not built from a replica
+        player = (
+            Player.objects.using("default").filter(diary_id=diary_number).values_list("quote_id", "quote_part").first()
+        )
+        if player is None:
+            return None
+
+        quote_id, part_type = player
+        return quote_part_body(diary_number, quote_pool.payload(quote_id), part_type)
+
+    # Warm calls are served from the cache without touching the database
+    body = quote_part_cache.get_or_load(diary_number, load)
+    if body is None:
         return JsonResponse({"error": "Player not found"}, status=404)
 
-    part_text = player.quote.part_a if player.quote_part == "A" else player.quote.part_b
+    return HttpResponse(body, content_type="application/json")
+
+@api_view(['GET'])
+def find_partner(request):
+    diary_number = request.GET.get("diary_number")
+
+    if not diary_number:
+        return JsonResponse({"error": "Missing diary_number"}, status=400)
+
+    # Answered from the in-process index; the database is only read for a
+    # diary this worker has not seen yet, or to report an existing pairing
+    partner_index.refresh()
+    entry = partner_index.lookup(diary_number, limit=PARTNER_LIMIT)
+    if entry is None:
+        player = (
+            Player.objects.filter(diary_id=diary_number).values_list("quote_id", "quote_part", "quote__digest").first()
+        )
+        if player is None:
+            return JsonResponse({"error": "Player not found"}, status=404)
+        partner_index.add(diary_number, *player)
+        entry = partner_index.lookup(diary_number, limit=PARTNER_LIMIT)
+
+    quote_id, part_type, paired, partners = entry
+    if paired:
+        flip = find_active_flip(diary_number)
+        if flip is not None:
+            return JsonResponse({
+                "diary_number": diary_number,
+                "paired": True,
+                "flip_number": flip.flip_number,
+                "paired_with": flip.player2 if flip.player1 == diary_number else flip.player1,
+            })
+        # The flip was released since the index saw it
+        partner_index.mark_unpaired([diary_number])
+        quote_id, part_type, paired, partners = partner_index.lookup(diary_number, limit=PARTNER_LIMIT)
 
     return JsonResponse({
         "diary_number": diary_number,
-        "quote_id": player.quote.id,
-        "quote_text": player.quote.text,
-        "quote_part": player.quote_part,
-        "part_text": part_text,  
-        "part_a": player.quote.part_a,
-        "part_b": player.quote.part_b
+        "paired": False,
+        "quote_id": quote_id,
+        "part_type": part_type,
+        "partners": partners,
     })
 
+@method_decorator(idempotent(registration_key), name="dispatch")
 class DiaryEntryView(APIView):
     def post(self, request):
         diary_number = request.data.get("diary_number")
@@ -58,148 +225,148 @@ class DiaryEntryView(APIView):
             return Response({"error": "Group does not exist. Please check the group name."}, status=status.HTTP_400_BAD_REQUEST)
 
         # If player already registered, return the existing data
-        existing_player = Player.objects.select_related('quote', 'group').filter(diary_id=diary_number).first()
+        existing_player = (
+            Player.objects.filter(diary_id=diary_number)
+            .values_list("quote_id", "quote_part", "group__name")
+            .first()
+        )
         if existing_player:
-            part_text = (
-                existing_player.quote.part_b if existing_player.quote_part == "B" 
-                else existing_player.quote.part_a
-            )
-            return Response({
-                "diary_number": diary_number,
-                "part": part_text,
-                "quote": existing_player.quote.text,
-                "part_type": existing_player.quote_part,
-                "group": existing_player.group.name
-            }, status=status.HTTP_200_OK)
-
-        # Get available quotes
-        quotes = list(Quote.objects.all())
-        if not quotes:
-            return Response({"error": "No quotes available."}, status=status.HTTP_404_NOT_FOUND)
+            quote_id, part_type, existing_group = existing_player
+            body = registration_body(diary_number, quote_pool.payload(quote_id), part_type, existing_group)
+            return HttpResponse(body, status=status.HTTP_200_OK, content_type="application/json")
 
-        quote = random.choice(quotes)
+        # Hand out the open half that keeps every quote pairable
+        assignment = assignment_engine.assign()
+        if assignment is None:
+            return Response({"error": "No quotes available."}, status=status.HTTP_404_NOT_FOUND)
 
-        # Determine part type
-        last_digit = int(diary_number[-1]) if diary_number[-1].isdigit() else random.randint(0, 9)
-        part_type = "B" if last_digit % 2 == 0 else "A"
-        part_text = quote.part_b if part_type == "B" else quote.part_a
+        quote_id, part_type = assignment
 
         # Create new player
-        player = Player.objects.create(
-            diary_id=diary_number,
-            quote=quote,
-            quote_part=part_type,
-            has_registered=True,
-            group=group
-        )
+        try:
+            Player.objects.create(
+                diary_id=diary_number,
+                quote_id=quote_id,
+                quote_part=part_type,
+                has_registered=True,
+                group=group
+            )
+        except IntegrityError:
+            assignment_engine.release(quote_id, part_type)
+            return Response({"error": "Diary is already being registered."}, status=status.HTTP_409_CONFLICT)
 
-        return Response({
-            "diary_number": diary_number,
-            "part": part_text,
-            "quote": quote.text,
-            "part_type": part_type,
-            "group": group.name
-        }, status=status.HTTP_201_CREATED)
-        
+        body = registration_body(diary_number, quote_pool.payload(quote_id), part_type, group.name)
+        return HttpResponse(body, status=status.HTTP_201_CREATED, content_type="application/json")
 
-class VerifyQuotePairView(APIView):
 
+class DiaryEntryBatchView(APIView):
     def post(self, request):
-        diary_id_1 = request.data.get("diary_id_1")
-        diary_id_2 = request.data.get("diary_id_2")
+        entries = request.data.get("entries")
 
-        if not diary_id_1 or not diary_id_2:
-            return Response({"error": "Both diary IDs are required."}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(entries, list) or not entries:
+            return Response({"error": "entries must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Prevent self-pairing
-        if diary_id_1 == diary_id_2:
-            return Response({"error": "Cannot pair a player with themselves."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(entries) > DIARY_BATCH_LIMIT:
+            return Response({"error": f"At most {DIARY_BATCH_LIMIT} entries per batch."}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            player1 = Player.objects.get(diary_id=diary_id_1)
-            player2 = Player.objects.get(diary_id=diary_id_2)
-        except Player.DoesNotExist:
-            return Response({"error": "One or both players not found."}, status=status.HTTP_404_NOT_FOUND)
-
-        print(f"Player 1: {player1.diary_id}")
-        print(f"Player 2: {player2.diary_id}")
-        
-             # Check if already paired
-        existing_flip = GridFlipLog.objects.filter(
-            Q(player1=player1) | Q(player2=player1) |
-            Q(player1=player2) | Q(player2=player2),
-            is_status=True
-        ).first()
+        if not all(isinstance(entry, dict) for entry in entries):
+            return Response({"error": "Each entry must be an object."}, status=status.HTTP_400_BAD_REQUEST)
 
+        results = register_players(
+            (entry.get("diary_number"), entry.get("group_name")) for entry in entries
+        )
+        created = sum(1 for result in results if result["status"] == "created")
+
+        return Response({"created": created, "results": results}, status=status.HTTP_200_OK)
+
+
+def pair_players(diary_id_1, diary_id_2, sender=None):
+    """
+    Pair two players and score the flip. Returns (data, status) so the sync
+    and async verify-quote-pair views can render it their own way; it runs
+    the ORM and a transaction, so async callers wrap it in sync_to_async.
+    """
+    if not diary_id_1 or not diary_id_2:
+        return {"error": "Both diary IDs are required."}, status.HTTP_400_BAD_REQUEST
+
+    diary_id_1, diary_id_2 = str(diary_id_1), str(diary_id_2)
+
+    # Prevent self-pairing
+    if diary_id_1 == diary_id_2:
+        return {"error": "Cannot pair a player with themselves."}, status.HTTP_400_BAD_REQUEST
+
+    # Fetch (and lock) both players, claim a free slot and score it in one transaction
+    with pairing_transaction(diary_id_1, diary_id_2) as players:
+        if len(players) != 2:
+            return {"error": "One or both players not found."}, status.HTTP_404_NOT_FOUND
+        player1, player2 = players[diary_id_1], players[diary_id_2]
+
+        if not halves_match(player1, player2):
+            return {"error": "These players do not hold the two halves of the same quote."}, status.HTTP_400_BAD_REQUEST
+
+        flip_number = claim_flip_slot(diary_id_1, diary_id_2)
+
+        if flip_number is not None:
+            deltas = pair_points(player1.group_id, player2.group_id)
+            award_points(deltas)
+            record_pairing(flip_number, player1, player2, deltas)
+            # Mirrored to the replica by the replicate_flips worker, never inline
+            enqueue_flip(flip_number, diary_id_1, diary_id_2)
+            # Last, so active-flips cursors only ever see versions in commit order
+            stamp_version(flip_number)
+            transaction.on_commit(lambda: pairing_completed.send(
+                sender=sender,
+                flip_number=flip_number,
+                diary_ids=(diary_id_1, diary_id_2),
+                deltas=deltas,
+            ))
+
+    if flip_number is None:
+        # Already paired (possibly by a concurrent request), or the grid is full
+        existing_flip = find_active_flip(player1.diary_id, player2.diary_id)
         if existing_flip:
-            if (existing_flip.player1 == player1 and existing_flip.player2 == player2) or \
-               (existing_flip.player1 == player2 and existing_flip.player2 == player1):
-                return Response({
-                    "flip_number": existing_flip.flip_number,
-                    "message": "You are already paired together.",
-                    "paired_with": player2.diary_id if existing_flip.player1 == player1 else player1.diary_id
-                }, status=status.HTTP_200_OK)
-
-            if existing_flip.player1 == player1 or existing_flip.player2 == player1:
-                paired_with = existing_flip.player2 if existing_flip.player1 == player1 else existing_flip.player1
-                return Response({
-                    "error": f"You are already paired with {paired_with.diary_id}.",
-                    "flip_number": existing_flip.flip_number
-                }, status=status.HTTP_409_CONFLICT)
-            else:
-                paired_with = existing_flip.player2 if existing_flip.player1 == player2 else existing_flip.player1
-                return Response({
-                    "error": f"{player2.diary_id} is already paired with {paired_with.diary_id}.",
-                    "flip_number": existing_flip.flip_number
-                }, status=status.HTTP_409_CONFLICT)
-
-        # Assign a new flip
-        available_flip = GridFlipLog.objects.filter(is_status=False).first()
-        print(available_flip)
-        if not available_flip:
-            return Response({"error": "No available flip numbers."}, status=status.HTTP_410_GONE)
-
-        available_flip.player1 = player1.diary_id
-        available_flip.player2 = player2.diary_id
-        available_flip.is_status = True
-        available_flip.save()
-
-
-        flip_number = available_flip.flip_number
-
-        # Update default DB
-        available_flip.player1 = player1
-        available_flip.player2 = player2
-        available_flip.is_status = True
-        print(available_flip)
-        group1 = player1.group
-        group2 = player2.group
-
-        if group1 and group2:
-            if group1 == group2:
-                group1.points += 2
-                group1.save(using='default')
-            else:
-                group1.points += 1
-                group2.points += 1
-                group1.save(using='default')
-                group2.save(using='default')
-
-        # # Update same flip_number in lap1end DB
-        # try:
-        #     flip_lap1end = GridFlipLog.objects.using('lap1end').get(flip_number=flip_number)
-        #     flip_lap1end.player1 = player1
-        #     flip_lap1end.player2 = player2
-        #     flip_lap1end.is_status = True
-        #     flip_lap1end.save(using='lap1end')
-        # except GridFlipLog.DoesNotExist:
-        #     return Response({"error": "Flip not found in lap1end DB."}, status=status.HTTP_404_NOT_FOUND)
-
-        return Response({
-            "message": "Pairing successful.",
-            "flip_number": available_flip.flip_number,
-            "paired": [player1.diary_id, player2.diary_id]
-        }, status=status.HTTP_201_CREATED)
+            return already_paired(existing_flip, player1, player2)
+        return {"error": "No available flip numbers."}, status.HTTP_410_GONE
+
+    return {
+        "message": "Pairing successful.",
+        "flip_number": flip_number,
+        "paired": [player1.diary_id, player2.diary_id]
+    }, status.HTTP_201_CREATED
+
+
+def already_paired(existing_flip, player1, player2):
+    pair = {existing_flip.player1, existing_flip.player2}
+    if pair == {player1.diary_id, player2.diary_id}:
+        return {
+            "flip_number": existing_flip.flip_number,
+            "message": "You are already paired together.",
+            "paired_with": player2.diary_id
+        }, status.HTTP_200_OK
+
+    if player1.diary_id in pair:
+        paired_with = existing_flip.player2 if existing_flip.player1 == player1.diary_id else existing_flip.player1
+        return {
+            "error": f"You are already paired with {paired_with}.",
+            "flip_number": existing_flip.flip_number
+        }, status.HTTP_409_CONFLICT
+
+    paired_with = existing_flip.player2 if existing_flip.player1 == player2.diary_id else existing_flip.player1
+    return {
+        "error": f"{player2.diary_id} is already paired with {paired_with}.",
+        "flip_number": existing_flip.flip_number
+    }, status.HTTP_409_CONFLICT
+
+
+@method_decorator(rate_limited("verify-quote-pair", pair_diaries), name="dispatch")
+@method_decorator(idempotent(pair_key), name="dispatch")
+class VerifyQuotePairView(APIView):
+
+    def post(self, request):
+        data, code = pair_players(
+            request.data.get("diary_id_1"), request.data.get("diary_id_2"), sender=self.__class__
+        )
+        return Response(data, status=code)
 
 
 
@@ -376,5 +543,28 @@ class VerifyQuotePairView(APIView):
     
 class GroupPointsView(APIView):
     def get(self, request):
-        groups = Group.objects.all().values("name", "points")
-        return Response(list(groups), status=status.HTTP_200_OK)
\ No newline at end of file
+        etag = leaderboard.etag()
+        if request.headers.get("If-None-Match") == etag:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response["ETag"] = etag
+            return response
+
+        group_name = request.GET.get("group")
+        top = request.GET.get("top")
+
+        if group_name:
+            standing = leaderboard.rank(group_name)
+            if standing is None:
+                return Response({"error": "Group not found."}, status=status.HTTP_404_NOT_FOUND)
+            points, rank = standing
+            data = {"name": group_name, "points": points, "rank": rank}
+        elif top:
+            if not top.isdigit():
+                return Response({"error": "top must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
+            data = leaderboard.top(int(top))
+        else:
+            data = leaderboard.all()
+
+        response = Response(data, status=status.HTTP_200_OK)
+        response["ETag"] = etag
+        return response
\ No newline at end of file
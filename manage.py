@@ -3,10 +3,12 @@
 import os
 import sys
 
+from quote_game import default_settings_module
+
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quote_game.settings')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default_settings_module())
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -0,0 +1,8 @@
+import os
+
+
+def default_settings_module():
+    """quote_game.settings_production when DJANGO_ENV=production, otherwise quote_game.settings."""
+    if os.environ.get('DJANGO_ENV') == 'production':
+        return 'quote_game.settings_production'
+    return 'quote_game.settings'
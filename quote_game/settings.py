@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -20,10 +21,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-8r@02m-sf2b&no0c71lm0b^f3t1n_(=7tin+kd#+pt=mhxk2#!'
+SECRET_KEY = os.environ.get(
+    'DJANGO_SECRET_KEY', 'django-insecure-8r@02m-sf2b&no0c71lm0b^f3t1n_(=7tin+kd#+pt=mhxk2#!'
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DJANGO_DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = [
     "localhost",
@@ -42,12 +45,13 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'corsheaders',
     'rest_framework',
-    'debug_toolbar',
     'game',
 ]
 
 MIDDLEWARE = [
+    'game.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'game.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,9 +59,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+# debug_toolbar records every SQL query and template render, so it is only
+# loaded for DEBUG runs
+if DEBUG:
+    INSTALLED_APPS.insert(INSTALLED_APPS.index('game'), 'debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'quote_game.urls'
 
 TEMPLATES = [
@@ -99,6 +108,8 @@ DATABASES = {
         'PORT': '5432', 
     }
 }
+
+DATABASE_ROUTERS = ['game.routers.ReadReplicaRouter']
  
 
 # Password validation
@@ -150,3 +161,79 @@ INTERNAL_IPS = [
 
 # cors settings
 CORS_ALLOW_ALL_ORIGINS = True
+
+# game settings
+# Spread group scoring over this many counter rows per group (0 = score on Group.points)
+GAME_POINT_SHARDS = 0
+
+# Seconds between re-syncs of the quote half assignment counts with halves
+# handed out by other worker processes
+GAME_ASSIGNMENT_RESYNC_SECONDS = 30
+
+# The leaderboard and quote pool follow changes made by other processes
+# through generation counters in the default cache. With no CACHES configured
+# every process has its own LocMemCache, so they also re-read the database
+# every GAME_LOCAL_CACHE_RECHECK seconds. settings_production shares a Redis
+# cache between processes when DJANGO_REDIS_URL is set.
+GAME_LOCAL_CACHE_RECHECK = 5
+
+# Rendered get_quote_part responses. LocalLRUBackend is per process; use
+# "game.quote_cache.SharedCacheBackend" (OPTIONS: alias) when running several workers.
+GAME_QUOTE_PART_CACHE = {
+    "BACKEND": "game.quote_cache.LocalLRUBackend",
+    "OPTIONS": {"max_entries": 50000},
+}
+
+# Database flip claims are mirrored to by `manage.py replicate_flips` (None disables the outbox)
+GAME_REPLICA_DATABASE = 'lap1end'
+
+# Streaming replicas of `default` that read-only endpoints may read from, round-robin
+# with health checks and fallback to the primary. lap1end is not a full replica
+# (it only receives flips), so it does not belong here.
+GAME_READ_REPLICAS = []
+GAME_REPLICA_READ_VIEWS = ['active-flips', 'group-points', 'get-quote-part']
+GAME_REPLICA_HEALTH_INTERVAL = 5
+
+# Seconds between find-partner catching up on registrations and pairings
+# made by other worker processes
+GAME_PARTNER_INDEX_POLL = 1
+# Seconds a Player id skipped by the catch-up cursor is looked for again, in
+# case its registration was still uncommitted (ids do not commit in order)
+GAME_PARTNER_INDEX_GAP_TIMEOUT = 60
+
+# Per-view latency, DB time, query count and response size are served at
+# /game/metrics. A GAME_METRICS_PROFILE_RATE share of sync requests is run
+# under cProfile (0 = off); profiles of requests slower than the threshold
+# (seconds) are logged, or written to GAME_METRICS_PROFILE_DIR when set.
+GAME_METRICS_PROFILE_RATE = 0
+GAME_METRICS_PROFILE_THRESHOLD = 0.25
+GAME_METRICS_PROFILE_DIR = None
+
+# Responses to diary-entry and verify-quote-pair requests (sync and async) sent
+# with an Idempotency-Key header are replayed for repeats of the key within ttl
+# seconds. LocalTTLStore is per process; use "game.idempotency.CacheStore"
+# (OPTIONS: alias, ttl) when running several workers. Concurrent duplicates wait
+# up to GAME_SINGLE_FLIGHT_TIMEOUT seconds for the first one's response; they are
+# coalesced per process, and per event loop for the async view.
+GAME_IDEMPOTENCY_STORE = {
+    "BACKEND": "game.idempotency.LocalTTLStore",
+    "OPTIONS": {"max_entries": 100000, "ttl": 600},
+}
+GAME_SINGLE_FLIGHT_TIMEOUT = 10
+
+# Token-bucket limits as (requests per second, burst), per diary id named in
+# the request and per client IP. Players at a venue can share one NAT address,
+# so the IP limits are loose; they are there to stop scraping and brute-force
+# pairing. Excess requests get 429 with Retry-After. LocalBucketStore is per
+# process; use "game.ratelimit.CacheBucketStore" (OPTIONS: alias) to share the
+# buckets between workers. Behind a proxy, set GAME_CLIENT_IP_HEADER to the
+# META key it sets, e.g. 'HTTP_X_FORWARDED_FOR'.
+GAME_RATE_LIMITS = {
+    'get-quote-part': {'diary': (1, 30), 'ip': (50, 500)},
+    'verify-quote-pair': {'diary': (1, 30), 'ip': (50, 500)},
+}
+GAME_RATE_LIMIT_STORE = {
+    "BACKEND": "game.ratelimit.LocalBucketStore",
+    "OPTIONS": {"max_keys": 100000},
+}
+GAME_CLIENT_IP_HEADER = None
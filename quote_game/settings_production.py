@@ -0,0 +1,123 @@
+"""
+Production settings for quote_game.
+
+Use with DJANGO_ENV=production (or DJANGO_SETTINGS_MODULE=quote_game.settings_production).
+Everything not overridden here comes from quote_game/settings.py.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import ALLOWED_HOSTS, DATABASES
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+DEBUG = os.environ.get('DJANGO_DEBUG', '0') == '1'
+
+# settings.py falls back to a key that is committed to the repository
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('DJANGO_SECRET_KEY must be set for production settings.')
+
+if os.environ.get('DJANGO_ALLOWED_HOSTS'):
+    ALLOWED_HOSTS = os.environ['DJANGO_ALLOWED_HOSTS'].split(',')
+
+# The game is a JSON API with no logins: admin, auth, sessions, messages,
+# static files and debug_toolbar are not loaded, and the middleware stack is
+# only what the API needs.
+INSTALLED_APPS = [
+    'corsheaders',
+    'rest_framework',
+    'game',
+]
+
+MIDDLEWARE = [
+    'game.middleware.MetricsMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'game.middleware.ReplicaRoutingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {'context_processors': []},
+    },
+]
+
+AUTH_PASSWORD_VALIDATORS = []
+
+# Without django.contrib.auth DRF must not build AnonymousUser or run
+# session/basic authentication, and the browsable API is not served.
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': [],
+    'UNAUTHENTICATED_USER': None,
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}
+
+
+# Cache
+# The leaderboard, quote pool, partner index and SharedCacheBackend caches
+# coordinate worker processes (and management commands such as
+# provision_grid) through counters in the default cache, which needs an
+# atomic incr shared by every process. Without DJANGO_REDIS_URL each process
+# keeps a LocMemCache and falls back to re-reading the database every
+# GAME_LOCAL_CACHE_RECHECK seconds.
+if os.environ.get('DJANGO_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['DJANGO_REDIS_URL'],
+        },
+    }
+
+
+# Database connections
+# With DB_POOL=1 (the default) each process keeps a psycopg 3 connection pool
+# per database; requests borrow a connection and return it when they finish.
+# The pool's "check" callback pings a connection before handing it out, so a
+# connection the server or a proxy dropped is replaced instead of failing the
+# request (Django's CONN_HEALTH_CHECKS does not apply to pooled connections).
+# With DB_POOL=0, connections are kept open per thread for DB_CONN_MAX_AGE
+# seconds instead, and CONN_HEALTH_CHECKS checks them on reuse.
+DB_POOL = os.environ.get("DB_POOL", "1") == "1"
+
+DB_POOL_OPTIONS = {
+    "min_size": env_int("DB_POOL_MIN_SIZE", 2),
+    "max_size": env_int("DB_POOL_MAX_SIZE", 20),
+    # Seconds a request waits for a free connection before failing
+    "timeout": env_int("DB_POOL_TIMEOUT", 10),
+    # Seconds an idle connection above min_size is kept
+    "max_idle": env_int("DB_POOL_MAX_IDLE", 300),
+    # Seconds before a connection is replaced, so server-side state does not pile up
+    "max_lifetime": env_int("DB_POOL_MAX_LIFETIME", 1800),
+}
+
+if DB_POOL:
+    from psycopg_pool import ConnectionPool
+
+    DB_POOL_OPTIONS["check"] = ConnectionPool.check_connection
+
+DATABASES = dict(DATABASES)  # leave quote_game.settings' dict as it was
+for alias in ("default", "lap1end"):
+    options = dict(DATABASES[alias].get("OPTIONS", {}))
+    if DB_POOL:
+        options["pool"] = dict(DB_POOL_OPTIONS)
+        conn_max_age = 0  # the pool owns connection lifetime
+    else:
+        conn_max_age = env_int("DB_CONN_MAX_AGE", 600)
+    DATABASES[alias] = {
+        **DATABASES[alias],
+        "OPTIONS": options,
+        "CONN_MAX_AGE": conn_max_age,
+        "CONN_HEALTH_CHECKS": not DB_POOL,
+    }
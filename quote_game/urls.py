@@ -14,13 +14,21 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
-from game import views as game_views
-import debug_toolbar
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    path('game/async/', include('game.async_urls')),
     path('game/', include('game.urls')),
-    path('__debug__/', include(debug_toolbar.urls)),
 ]
+
+# The production profile leaves admin and debug_toolbar out of INSTALLED_APPS
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.append(path('admin/', admin.site.urls))
+
+if apps.is_installed('debug_toolbar'):
+    import debug_toolbar
+
+    urlpatterns.append(path('__debug__/', include(debug_toolbar.urls)))
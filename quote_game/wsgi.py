@@ -11,6 +11,8 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quote_game.settings')
+from quote_game import default_settings_module
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', default_settings_module())
 
 application = get_wsgi_application()